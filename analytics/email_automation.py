@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from django.core.mail import send_mail, EmailMultiAlternatives
 from django.template import Template, Context
 from django.conf import settings
@@ -16,6 +17,20 @@ from .models import (
 
 logger = logging.getLogger(__name__)
 
+ACTIVE_EMAIL_TEMPLATES_CACHE_KEY = 'email_templates:active_list'
+ACTIVE_EMAIL_TEMPLATES_CACHE_TIMEOUT = 60
+
+
+def active_email_templates() -> List[Dict[str, Any]]:
+    """Summary rows for active email templates (cleared by analytics.signals on template changes)"""
+    return cache.get_or_set(
+        ACTIVE_EMAIL_TEMPLATES_CACHE_KEY,
+        lambda: list(
+            EmailTemplate.objects.filter(is_active=True).values('id', 'name', 'subject', 'created_at')
+        ),
+        ACTIVE_EMAIL_TEMPLATES_CACHE_TIMEOUT
+    )
+
 
 class EmailTemplateProcessor:
     """Process email templates with variable substitution"""
@@ -226,15 +241,15 @@ class EmailAutomationEngine:
         
         deliveries = []
         
-        # Get sequence steps
-        steps = sequence.steps.all().order_by('step_number')
+        # Get sequence steps in one query, templates included
+        steps = list(sequence.steps.select_related('template').order_by('step_number'))
         
-        if not steps.exists():
+        if not steps:
             logger.warning(f"No steps found for sequence {sequence.name}")
             return []
         
         # Send first step immediately
-        first_step = steps.first()
+        first_step = steps[0]
         try:
             delivery = EmailAutomationEngine.send_template_email(
                 customer=customer,
@@ -268,7 +283,7 @@ class EmailAutomationEngine:
             metadata={
                 'sequence_id': sequence.pk,
                 'sequence_name': sequence.name,
-                'steps_count': steps.count(),
+                'steps_count': len(steps),
             }
         )
         
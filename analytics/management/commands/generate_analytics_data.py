@@ -99,11 +99,9 @@ class Command(BaseCommand):
         
         # Calculate metrics for all customers
         self.stdout.write('Calculating customer metrics...')
-        metrics_updated = 0
-        
-        for customer in customers:
-            AnalyticsCalculator.calculate_customer_metrics(customer)
-            metrics_updated += 1
+        metrics_updated = AnalyticsCalculator.recalculate_all_metrics(
+            Customer.objects.filter(pk__in=[customer.pk for customer in customers])
+        )
         
         self.stdout.write(f'Updated metrics for {metrics_updated} customers')
         
@@ -44,10 +44,11 @@ class Command(BaseCommand):
             else:
                 # Show what would be processed in dry run
                 from analytics.models import EmailDelivery
-                scheduled_emails = EmailDelivery.objects.filter(status='scheduled')
+                scheduled_emails = EmailDelivery.objects.filter(status='scheduled').select_related('customer')
+                scheduled_count = scheduled_emails.count()
                 
                 self.stdout.write(
-                    f'Would process {scheduled_emails.count()} scheduled emails:'
+                    f'Would process {scheduled_count} scheduled emails:'
                 )
                 
                 for delivery in scheduled_emails[:10]:  # Show first 10
@@ -55,8 +56,8 @@ class Command(BaseCommand):
                         f'  - {delivery.customer.email}: {delivery.subject}'
                     )
                 
-                if scheduled_emails.count() > 10:
-                    self.stdout.write(f'  ... and {scheduled_emails.count() - 10} more')
+                if scheduled_count > 10:
+                    self.stdout.write(f'  ... and {scheduled_count - 10} more')
         
         except Exception as e:
             self.stdout.write(
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from analytics.task_automation import WorkflowEngine
+
+
+class Command(BaseCommand):
+    help = 'Resume workflow executions whose delayed actions are now due'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be resumed without running any actions',
+        )
+    
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Starting workflow processing at {timezone.now()}')
+        )
+        
+        if dry_run:
+            self.stdout.write(
+                self.style.WARNING('DRY RUN MODE - No actions will be run')
+            )
+        
+        try:
+            if not dry_run:
+                resumed_count = WorkflowEngine.process_due_executions()
+                
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f'Successfully resumed {resumed_count} workflow executions'
+                    )
+                )
+            else:
+                # Show what would be resumed in dry run
+                from analytics.models import WorkflowExecution
+                due_executions = WorkflowExecution.objects.filter(
+                    status='running',
+                    next_action_at__lte=timezone.now()
+                ).select_related('workflow', 'customer')
+                due_count = due_executions.count()
+                
+                self.stdout.write(
+                    f'Would resume {due_count} workflow executions:'
+                )
+                
+                for execution in due_executions[:10]:  # Show first 10
+                    self.stdout.write(
+                        f'  - {execution.workflow.name}: {execution.customer.email} (step {execution.current_action})'
+                    )
+                
+                if due_count > 10:
+                    self.stdout.write(f'  ... and {due_count - 10} more')
+        
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'Error processing workflows: {str(e)}')
+            )
+            raise
+        
+        self.stdout.write(
+            self.style.SUCCESS('Workflow processing completed')
+        )
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from customers.models import Customer
+from analytics.utils import AnalyticsCalculator
+
+
+class Command(BaseCommand):
+    help = 'Recalculate stored metrics for all active customers in bulk'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale',
+            action='store_true',
+            help='Only recalculate customers with events newer than their stored metrics'
+        )
+    
+    def handle(self, *args, **options):
+        self.stdout.write(
+            self.style.SUCCESS(f'Recalculating customer metrics at {timezone.now()}')
+        )
+        
+        if options['stale']:
+            customers = AnalyticsCalculator.stale_metrics_customers()
+        else:
+            customers = Customer.objects.filter(is_active=True)
+        
+        try:
+            updated = AnalyticsCalculator.recalculate_all_metrics(customers)
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'Error recalculating customer metrics: {str(e)}')
+            )
+            raise
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Recalculated metrics for {updated} customers')
+        )
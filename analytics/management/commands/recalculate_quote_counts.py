@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from analytics.signals import recount_approved_quote_counts
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized approved quote counters on customers from their quotes'
+    
+    def handle(self, *args, **options):
+        self.stdout.write(
+            self.style.SUCCESS(f'Recounting approved quotes at {timezone.now()}')
+        )
+        
+        try:
+            updated = recount_approved_quote_counts()
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'Error recounting approved quotes: {str(e)}')
+            )
+            raise
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Recounted approved quotes for {updated} customers')
+        )
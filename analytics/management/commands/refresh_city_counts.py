@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from analytics.utils import CITY_COUNTS_CACHE_TIMEOUT, refresh_city_counts
+
+
+class Command(BaseCommand):
+    help = 'Recompute the cached customer counts per city used by the analytics dashboard'
+    
+    def handle(self, *args, **options):
+        self.stdout.write(
+            self.style.SUCCESS(f'Refreshing city counts at {timezone.now()}')
+        )
+        
+        try:
+            counts = refresh_city_counts()
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'Error refreshing city counts: {str(e)}')
+            )
+            raise
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Cached {len(counts)} cities for {CITY_COUNTS_CACHE_TIMEOUT} seconds')
+        )
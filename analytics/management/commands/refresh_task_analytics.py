@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from analytics.simple_task_views import TASK_BREAKDOWN_CACHE_TIMEOUT, refresh_task_breakdown_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the cached task breakdowns shown on the task analytics page'
+    
+    def handle(self, *args, **options):
+        self.stdout.write(
+            self.style.SUCCESS(f'Refreshing task analytics at {timezone.now()}')
+        )
+        
+        try:
+            stats = refresh_task_breakdown_stats()
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'Error refreshing task analytics: {str(e)}')
+            )
+            raise
+        
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Cached {len(stats['priority_stats'])} priority and {len(stats['user_stats'])} assignee rows "
+                f'for {TASK_BREAKDOWN_CACHE_TIMEOUT} seconds'
+            )
+        )
@@ -0,0 +1,27 @@
+from django.db import migrations
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_approved_quote_count(apps, schema_editor):
+    Customer = apps.get_model("customers", "Customer")
+    QuoteRequest = apps.get_model("analytics", "QuoteRequest")
+    approved = (
+        QuoteRequest.objects.filter(customer=OuterRef("pk"), status="approved")
+        .order_by()
+        .values("customer")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    Customer.objects.update(approved_quote_count=Coalesce(Subquery(approved), 0))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analytics", "0005_alter_analyticsevent_event_type"),
+        ("customers", "0006_customer_approved_quote_count"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_approved_quote_count, migrations.RunPython.noop),
+    ]
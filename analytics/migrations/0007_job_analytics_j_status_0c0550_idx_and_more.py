@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-16 23:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0006_backfill_customer_approved_quote_count'),
+        ('customers', '0006_customer_approved_quote_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['status', 'created_at'], name='analytics_j_status_0c0550_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['status', 'completed_date'], name='analytics_j_status_95d60b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reminder',
+            index=models.Index(fields=['is_sent', 'remind_at'], name='analytics_r_is_sent_2b507e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', 'completed_at'], name='analytics_t_status_f2e3f0_idx'),
+        ),
+    ]
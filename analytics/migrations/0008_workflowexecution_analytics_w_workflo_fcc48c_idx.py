@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-16 23:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0007_job_analytics_j_status_0c0550_idx_and_more'),
+        ('customers', '0006_customer_approved_quote_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='workflowexecution',
+            index=models.Index(fields=['workflow', 'customer', 'status'], name='analytics_w_workflo_fcc48c_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-16 23:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0008_workflowexecution_analytics_w_workflo_fcc48c_idx'),
+        ('customers', '0006_customer_approved_quote_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workflowexecution',
+            name='next_action_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='workflowexecution',
+            index=models.Index(fields=['status', 'next_action_at'], name='analytics_w_status_9fee3f_idx'),
+        ),
+    ]
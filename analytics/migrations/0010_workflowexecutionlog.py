@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-16 23:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0009_workflowexecution_next_action_at_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkflowExecutionLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('action', models.CharField(max_length=50)),
+                ('message', models.TextField()),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('execution', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='log_entries', to='analytics.workflowexecution')),
+            ],
+            options={
+                'ordering': ['timestamp', 'id'],
+                'indexes': [models.Index(fields=['execution', 'timestamp'], name='analytics_w_executi_a092e6_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0010_workflowexecutionlog'),
+        ('customers', '0006_customer_approved_quote_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', 'due_date'], name='analytics_t_status_37f8ae_idx'),
+        ),
+    ]
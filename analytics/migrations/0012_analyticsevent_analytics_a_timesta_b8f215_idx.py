@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0011_task_analytics_t_status_37f8ae_idx'),
+        ('customers', '0007_customer_customers_c_is_acti_3160aa_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='analyticsevent',
+            index=models.Index(fields=['-timestamp'], name='analytics_a_timesta_b8f215_idx'),
+        ),
+    ]
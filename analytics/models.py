@@ -33,6 +33,7 @@ class AnalyticsEvent(models.Model):
             models.Index(fields=['customer', 'timestamp']),
             models.Index(fields=['event_type', 'timestamp']),
             models.Index(fields=['user', 'timestamp']),
+            models.Index(fields=['-timestamp']),
         ]
         ordering = ['-timestamp']
     
@@ -271,7 +272,7 @@ class WorkflowTemplate(models.Model):
     is_active = models.BooleanField(default=True)
     
     # Trigger configuration
-    trigger_type = models.CharField(max_length=50, choices=[
+    TRIGGER_TYPES = [
         ('customer_created', 'New Customer Created'),
         ('note_added', 'Note Added'),
         ('file_uploaded', 'File Uploaded'),
@@ -280,7 +281,9 @@ class WorkflowTemplate(models.Model):
         ('email_clicked', 'Email Clicked'),
         ('date_based', 'Date/Time Based'),
         ('manual', 'Manual Trigger'),
-    ], default='manual')
+    ]
+    
+    trigger_type = models.CharField(max_length=50, choices=TRIGGER_TYPES, default='manual')
     
     # Trigger conditions (JSON field for flexibility)
     trigger_conditions = models.JSONField(default=dict, blank=True)
@@ -388,8 +391,10 @@ class Task(models.Model):
             models.Index(fields=['customer', 'status']),
             models.Index(fields=['assigned_to', 'status']),
             models.Index(fields=['due_date', 'status']),
+            models.Index(fields=['status', 'due_date']),
             models.Index(fields=['priority', 'status']),
             models.Index(fields=['is_automated', 'created_at']),
+            models.Index(fields=['status', 'completed_at']),
         ]
     
     def __str__(self):
@@ -422,6 +427,7 @@ class WorkflowExecution(models.Model):
     
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     current_action = models.IntegerField(default=1)
+    next_action_at = models.DateTimeField(null=True, blank=True)
     
     # Results and context
     context_data = models.JSONField(default=dict, blank=True)
@@ -432,14 +438,34 @@ class WorkflowExecution(models.Model):
         ordering = ['-started_at']
         indexes = [
             models.Index(fields=['workflow', 'status']),
+            models.Index(fields=['workflow', 'customer', 'status']),
             models.Index(fields=['customer', 'started_at']),
             models.Index(fields=['status', 'started_at']),
+            models.Index(fields=['status', 'next_action_at']),
         ]
     
     def __str__(self):
         return f"{self.workflow.name} for {self.customer.first_name} {self.customer.last_name}"
 
 
+class WorkflowExecutionLog(models.Model):
+    """Append-only log entries for a workflow execution"""
+    execution = models.ForeignKey(WorkflowExecution, on_delete=models.CASCADE, related_name='log_entries')
+    timestamp = models.DateTimeField(default=timezone.now)
+    action = models.CharField(max_length=50)
+    message = models.TextField()
+    payload = models.JSONField(default=dict, blank=True)
+    
+    class Meta:
+        ordering = ['timestamp', 'id']
+        indexes = [
+            models.Index(fields=['execution', 'timestamp']),
+        ]
+    
+    def __str__(self):
+        return f"{self.action} - {self.execution}"
+
+
 class ActionExecution(models.Model):
     """Track individual action executions within workflows"""
     workflow_execution = models.ForeignKey(WorkflowExecution, on_delete=models.CASCADE, related_name='action_executions')
@@ -514,6 +540,7 @@ class Reminder(models.Model):
             models.Index(fields=['user', 'is_sent', 'remind_at']),
             models.Index(fields=['customer', 'remind_at']),
             models.Index(fields=['task', 'remind_at']),
+            models.Index(fields=['is_sent', 'remind_at']),
         ]
     
     def __str__(self):
@@ -954,6 +981,8 @@ class Job(models.Model):
             models.Index(fields=['status', 'due_date']),
             models.Index(fields=['assigned_to', 'status']),
             models.Index(fields=['service_type', 'priority']),
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['status', 'completed_date']),
         ]
     
     def __str__(self):
@@ -0,0 +1,74 @@
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db.models import Count, Window
+
+
+class PKPaginator(Paginator):
+    """Paginator that applies LIMIT/OFFSET to primary keys before loading full rows.
+
+    The offset is taken on a pk-only query, so deep pages do not materialise
+    (and discard) the joined columns of every skipped row. The page's rows are
+    then fetched by pk and returned in the original queryset order.
+    """
+    
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if top + self.orphans >= self.count:
+            top = self.count
+        
+        ids = list(self.object_list.values_list('pk', flat=True)[bottom:top])
+        return self._page_from_ids(ids, number)
+    
+    def _page_from_ids(self, ids, number):
+        rows = self.object_list.in_bulk(ids)
+        return self._get_page([rows[pk] for pk in ids if pk in rows], number, self)
+
+
+class WindowCountPaginator(PKPaginator):
+    """PKPaginator that reads the total row count from the page's pk query.
+
+    The pk slice is annotated with COUNT(*) OVER (), so the total arrives with
+    the page ids and the separate COUNT query is skipped. Requests past the
+    last page (where the slice comes back empty) fall back to a plain count.
+    """
+    
+    def get_page(self, number):
+        # Mirror Paginator.get_page without validating (and counting) up front
+        try:
+            return self.page(number)
+        except PageNotAnInteger:
+            return self.page(1)
+        except EmptyPage:
+            return self.page(self.num_pages)
+    
+    def page(self, number):
+        if 'count' in self.__dict__:
+            return super().page(number)
+        
+        # Parse and bound-check the number without touching self.count
+        if isinstance(number, float) and not number.is_integer():
+            return super().page(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            return super().page(number)
+        if number < 1:
+            return super().page(number)
+        
+        bottom = (number - 1) * self.per_page
+        rows = list(
+            self.object_list.annotate(window_total=Window(expression=Count('pk')))
+            .values_list('pk', 'window_total')[bottom:bottom + self.per_page + self.orphans]
+        )
+        if not rows:
+            return super().page(number)
+        
+        # Cache the total on the paginator's count property
+        self.__dict__['count'] = rows[0][1]
+        number = self.validate_number(number)
+        
+        top = bottom + self.per_page
+        if top + self.orphans >= self.count:
+            top = self.count
+        return self._page_from_ids([pk for pk, _ in rows[:top - bottom]], number)
@@ -2,6 +2,8 @@ from django.core.mail import send_mail
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Max
 from datetime import timedelta
 import re
 import logging
@@ -88,6 +90,32 @@ class QuoteJobAutomationEngine:
         
         return 'other'
     
+    @staticmethod
+    def get_or_create_email_customer(sender_email):
+        """Return the customer for an email address, creating a placeholder if needed"""
+        
+        # Existing senders are the common case; the unique email index serves this lookup
+        try:
+            return Customer.objects.get(email=sender_email)
+        except Customer.DoesNotExist:
+            pass
+        
+        try:
+            with transaction.atomic():
+                return Customer.objects.create(
+                    email=sender_email,
+                    first_name=sender_email.split('@')[0].title(),
+                    last_name='',
+                    mobile='',
+                    street_address='',
+                    suburb='',
+                    city='',
+                    postcode='0000',
+                )
+        except IntegrityError:
+            # Another request created the customer between our lookup and insert
+            return Customer.objects.get(email=sender_email)
+    
     @staticmethod
     def process_incoming_email(sender_email, subject, body, received_at=None):
         """Process incoming email and create quote request if applicable"""
@@ -97,18 +125,7 @@ class QuoteJobAutomationEngine:
         
         try:
             # Get or create customer
-            customer, created = Customer.objects.get_or_create(
-                email=sender_email,
-                defaults={
-                    'first_name': sender_email.split('@')[0].title(),
-                    'last_name': '',
-                    'mobile': '',
-                    'street_address': '',
-                    'suburb': '',
-                    'city': '',
-                    'postcode': '0000',
-                }
-            )
+            customer = QuoteJobAutomationEngine.get_or_create_email_customer(sender_email)
             
             # Detect if this is a quote request
             detection_result = QuoteJobAutomationEngine.detect_quote_request(subject, body, sender_email)
@@ -559,23 +576,26 @@ def check_job_deadlines():
 def auto_update_job_progress():
     """Automatically update job progress based on time elapsed"""
     
-    active_jobs = Job.objects.filter(
+    now = timezone.now()
+    
+    # Annotate each job with its latest update time rather than querying updates per job
+    weekly_jobs = Job.objects.filter(
         status='in_progress',
         start_date__isnull=False,
-        due_date__isnull=False
+        due_date__isnull=False,
+        update_frequency='weekly'
+    ).select_related('customer', 'assigned_to').annotate(
+        last_update_at=Max('updates__created_at')
     )
     
-    for job in active_jobs:
-        if job.update_frequency == 'weekly':
-            last_update = JobUpdate.objects.filter(job=job).order_by('-created_at').first()
-            
-            if not last_update or (timezone.now() - last_update.created_at).days >= 7:
-                # Send weekly progress update
-                progress = job.progress_percentage
-                update_text = f"Weekly progress update: {progress:.0f}% complete"
-                
-                QuoteJobAutomationEngine.send_job_progress_update(
-                    job=job,
-                    update_text=update_text,
-                    percentage_complete=int(progress)
-                )
\ No newline at end of file
+    for job in weekly_jobs:
+        if not job.last_update_at or (now - job.last_update_at).days >= 7:
+            # Send weekly progress update
+            progress = job.progress_percentage
+            update_text = f"Weekly progress update: {progress:.0f}% complete"
+            
+            QuoteJobAutomationEngine.send_job_progress_update(
+                job=job,
+                update_text=update_text,
+                percentage_complete=int(progress)
+            )
\ No newline at end of file
@@ -1,13 +1,15 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.core.cache import cache
 from django.core.paginator import Paginator
-from django.db.models import Q, Count, Avg, Sum
+from django.db.models import Q, Count, Avg, Sum, Prefetch
 from django.utils import timezone
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import require_http_methods, condition
 from django.views.decorators.csrf import csrf_exempt
 from datetime import timedelta
+import csv
 import json
 import logging
 
@@ -22,25 +24,89 @@ from .quote_job_forms import (
     BulkActionForm, EmailProcessingForm, CustomerCommunicationForm
 )
 from .quote_job_automation import QuoteJobAutomationEngine
+from .utils import json_loads, payload_etag, ORJSONResponse
 
 logger = logging.getLogger(__name__)
 
+# Fields matched by the free-text search box on the quote and job lists
+QUOTE_SEARCH_FIELDS = (
+    'title', 'customer__first_name', 'customer__last_name',
+    'customer__email', 'reference_number',
+)
+JOB_SEARCH_FIELDS = (
+    'title', 'customer__first_name', 'customer__last_name',
+    'customer__email', 'job_number',
+)
+
+
+def build_search_q(fields, search_query):
+    """OR together a case-insensitive contains lookup for each field"""
+    q = Q()
+    for field in fields:
+        q |= Q(**{f'{field}__icontains': search_query})
+    return q
+
+
+def quote_search_q(search_query):
+    """Search predicate for quote requests"""
+    return build_search_q(QUOTE_SEARCH_FIELDS, search_query)
+
+
+def job_search_q(search_query):
+    """Search predicate for jobs"""
+    return build_search_q(JOB_SEARCH_FIELDS, search_query)
+
+
+# Rows fetched per database round trip when streaming CSV exports
+EXPORT_CHUNK_SIZE = 2000
+
+# Seconds the quote/job stats API responses are served from cache
+STATS_API_CACHE_TIMEOUT = 300
+
+
+class Echo:
+    """File-like object whose write() hands the value back, for streaming csv.writer output"""
+    
+    def write(self, value):
+        return value
+
+
+def stream_csv_response(filename_prefix, header, rows):
+    """Build a StreamingHttpResponse that writes CSV rows as they are produced"""
+    
+    writer = csv.writer(Echo())
+    
+    def generate():
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+    
+    response = StreamingHttpResponse(generate(), content_type='text/csv')
+    timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
+    response['Content-Disposition'] = f'attachment; filename="{filename_prefix}_{timestamp}.csv"'
+    return response
+
 
 @login_required
 def quote_job_dashboard(request):
     """Main dashboard for quote and job management"""
     
+    now = timezone.now()
+    week_ago = now - timedelta(days=7)
+    week_ahead = now + timedelta(days=7)
+    thirty_days_ago = now - timedelta(days=30)
+    
     # Get quick stats
     stats = {
         'quotes_pending': QuoteRequest.objects.filter(status__in=['received', 'reviewing']).count(),
         'quotes_overdue': QuoteRequest.objects.filter(
             status='quoted',
-            quote_sent_at__lt=timezone.now() - timedelta(days=7)
+            quote_sent_at__lt=week_ago
         ).count(),
         'jobs_active': Job.objects.filter(status__in=['pending', 'in_progress']).count(),
         'jobs_overdue': Job.objects.filter(
             status__in=['pending', 'in_progress'],
-            due_date__lt=timezone.now()
+            due_date__lt=now
         ).count(),
     }
     
@@ -53,31 +119,32 @@ def quote_job_dashboard(request):
     # Upcoming deadlines
     upcoming_deadlines = Job.objects.filter(
         status__in=['pending', 'in_progress'],
-        due_date__gte=timezone.now(),
-        due_date__lte=timezone.now() + timedelta(days=7)
+        due_date__gte=now,
+        due_date__lte=week_ahead
     ).select_related('customer', 'assigned_to').order_by('due_date')[:5]
     
     # Charts data for the last 30 days
-    thirty_days_ago = timezone.now() - timedelta(days=30)
+    start_date = thirty_days_ago.date()
+    dates = [start_date + timedelta(days=i) for i in range(30)]
     
     quotes_chart_data = []
     jobs_chart_data = []
     
-    for i in range(30):
-        date = thirty_days_ago + timedelta(days=i)
+    for date in dates:
+        date_label = date.isoformat()
         quotes_count = QuoteRequest.objects.filter(
-            created_at__date=date.date()
+            created_at__date=date
         ).count()
         jobs_count = Job.objects.filter(
-            created_at__date=date.date()
+            created_at__date=date
         ).count()
         
         quotes_chart_data.append({
-            'date': date.strftime('%Y-%m-%d'),
+            'date': date_label,
             'count': quotes_count
         })
         jobs_chart_data.append({
-            'date': date.strftime('%Y-%m-%d'),
+            'date': date_label,
             'count': jobs_count
         })
     
@@ -93,9 +160,8 @@ def quote_job_dashboard(request):
     return render(request, 'analytics/quote_job_dashboard.html', context)
 
 
-@login_required
-def quote_list(request):
-    """List all quote requests with filtering"""
+def filter_quotes(request):
+    """Apply the quote list filter form and search box to the quote queryset"""
     
     quotes = QuoteRequest.objects.select_related('customer', 'assigned_to')
     filter_form = QuoteFilterForm(request.GET)
@@ -122,15 +188,16 @@ def quote_list(request):
     # Search functionality
     search_query = request.GET.get('search', '')
     if search_query:
-        quotes = quotes.filter(
-            Q(title__icontains=search_query) |
-            Q(customer__first_name__icontains=search_query) |
-            Q(customer__last_name__icontains=search_query) |
-            Q(customer__email__icontains=search_query) |
-            Q(reference_number__icontains=search_query)
-        )
+        quotes = quotes.filter(quote_search_q(search_query))
+    
+    return quotes.order_by('-created_at'), filter_form, search_query
+
+
+@login_required
+def quote_list(request):
+    """List all quote requests with filtering"""
     
-    quotes = quotes.order_by('-created_at')
+    quotes, filter_form, search_query = filter_quotes(request)
     
     # Pagination
     paginator = Paginator(quotes, 25)
@@ -147,37 +214,68 @@ def quote_list(request):
     return render(request, 'analytics/quote_list.html', context)
 
 
+@login_required
+def quote_export_csv(request):
+    """Stream the filtered quote list as CSV"""
+    
+    quotes, _, _ = filter_quotes(request)
+    
+    header = [
+        'Reference', 'Title', 'Customer', 'Email', 'Status', 'Priority',
+        'Service Type', 'Estimated Cost', 'Final Quote', 'Assigned To', 'Created At',
+    ]
+    rows = (
+        [
+            quote.reference_number,
+            quote.title,
+            quote.customer.full_name,
+            quote.customer.email,
+            quote.get_status_display(),
+            quote.get_priority_display(),
+            quote.get_service_type_display(),
+            quote.estimated_cost if quote.estimated_cost is not None else '',
+            quote.final_quote_amount if quote.final_quote_amount is not None else '',
+            quote.assigned_to.username if quote.assigned_to else '',
+            quote.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        ]
+        for quote in quotes.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    
+    return stream_csv_response('quotes_export', header, rows)
+
+
 @login_required
 def quote_detail(request, quote_id):
     """View quote request details"""
     
-    quote = get_object_or_404(QuoteRequest, pk=quote_id)
+    # Fetch the quote together with its customer's total quote count in one query;
+    # the approved count is kept on the customer row by analytics.signals
+    quote = get_object_or_404(
+        QuoteRequest.objects.select_related('customer', 'assigned_to', 'created_by').annotate(
+            customer_quotes_count=Count('customer__quote_requests')
+        ),
+        pk=quote_id
+    )
     
     # Get related events
     events = AnalyticsEvent.objects.filter(
         customer=quote.customer,
         metadata__quote_reference=quote.reference_number
-    ).order_by('-timestamp')
+    ).select_related('user').order_by('-timestamp')
     
     # Get email deliveries for this quote
     emails = EmailDelivery.objects.filter(
         customer=quote.customer
-    ).order_by('-sent_at')
-    
-    # Get approved quotes count for this customer
-    approved_quotes_count = QuoteRequest.objects.filter(
-        customer=quote.customer,
-        status='approved'
-    ).count()
+    ).select_related('customer').order_by('-sent_at')
     
     # Get all customers for the duplicate modal
-    all_customers = Customer.objects.all().order_by('first_name', 'last_name')
+    all_customers = Customer.objects.only('id', 'first_name', 'last_name').order_by('first_name', 'last_name')
     
     context = {
         'quote': quote,
         'events': events,
         'emails': emails,
-        'approved_quotes_count': approved_quotes_count,
+        'approved_quotes_count': quote.customer.approved_quote_count,
         'all_customers': all_customers,
     }
     
@@ -261,7 +359,7 @@ def quote_send(request, quote_id):
     if request.method == 'POST':
         # Update quote status to sent
         quote.status = 'sent'
-        quote.save()
+        quote.save(update_fields=['status', 'updated_at'])
         
         # Send quote email
         QuoteJobAutomationEngine.send_auto_response(quote, 'quote_sent')
@@ -606,9 +704,8 @@ def quote_duplicate(request, quote_id):
         return redirect('analytics:quote_detail', quote_id=quote_id)
 
 
-@login_required
-def job_list(request):
-    """List all jobs with filtering"""
+def filter_jobs(request):
+    """Apply the job list filter form and search box to the job queryset"""
     
     jobs = Job.objects.select_related('customer', 'assigned_to', 'quote_request')
     filter_form = JobFilterForm(request.GET)
@@ -635,15 +732,16 @@ def job_list(request):
     # Search functionality
     search_query = request.GET.get('search', '')
     if search_query:
-        jobs = jobs.filter(
-            Q(title__icontains=search_query) |
-            Q(customer__first_name__icontains=search_query) |
-            Q(customer__last_name__icontains=search_query) |
-            Q(customer__email__icontains=search_query) |
-            Q(job_number__icontains=search_query)
-        )
+        jobs = jobs.filter(job_search_q(search_query))
+    
+    return jobs.order_by('-created_at'), filter_form, search_query
+
+
+@login_required
+def job_list(request):
+    """List all jobs with filtering"""
     
-    jobs = jobs.order_by('-created_at')
+    jobs, filter_form, search_query = filter_jobs(request)
     
     # Pagination
     paginator = Paginator(jobs, 25)
@@ -660,26 +758,64 @@ def job_list(request):
     return render(request, 'analytics/job_list.html', context)
 
 
+@login_required
+def job_export_csv(request):
+    """Stream the filtered job list as CSV"""
+    
+    jobs, _, _ = filter_jobs(request)
+    
+    header = [
+        'Job Number', 'Title', 'Customer', 'Email', 'Status', 'Priority',
+        'Service Type', 'Quote Reference', 'Quoted Amount', 'Final Amount',
+        'Assigned To', 'Due Date', 'Completed Date', 'Created At',
+    ]
+    rows = (
+        [
+            job.job_number,
+            job.title,
+            job.customer.full_name,
+            job.customer.email,
+            job.get_status_display(),
+            job.get_priority_display(),
+            job.get_service_type_display(),
+            job.quote_request.reference_number if job.quote_request else '',
+            job.quoted_amount if job.quoted_amount is not None else '',
+            job.final_amount if job.final_amount is not None else '',
+            job.assigned_to.username if job.assigned_to else '',
+            job.due_date.strftime('%Y-%m-%d %H:%M:%S') if job.due_date else '',
+            job.completed_date.strftime('%Y-%m-%d %H:%M:%S') if job.completed_date else '',
+            job.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        ]
+        for job in jobs.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    
+    return stream_csv_response('jobs_export', header, rows)
+
+
 @login_required
 def job_detail(request, job_id):
     """View job details"""
     
-    job = get_object_or_404(Job, pk=job_id)
+    job = get_object_or_404(
+        Job.objects.select_related('customer', 'assigned_to', 'quote_request').prefetch_related(
+            Prefetch('updates', queryset=JobUpdate.objects.select_related('created_by').order_by('-created_at'))
+        ),
+        pk=job_id
+    )
     
-    # Get job updates
-    updates = JobUpdate.objects.filter(job=job).order_by('-created_at')
+    # Get job updates (prefetched with their authors)
+    updates = job.updates.all()
     
     # Get related events
     events = AnalyticsEvent.objects.filter(
         customer=job.customer,
         metadata__job_number=job.job_number
-    ).order_by('-created_at')
+    ).select_related('user').order_by('-timestamp')
     
-    # Get email deliveries for this job
+    # Get email deliveries for this job's customer
     emails = EmailDelivery.objects.filter(
-        customer=job.customer,
-        metadata__job_number=job.job_number
-    ).order_by('-sent_at')
+        customer=job.customer
+    ).select_related('customer').order_by('-sent_at')
     
     context = {
         'job': job,
@@ -740,9 +876,11 @@ def job_update_status(request, job_id):
             notes = form.cleaned_data['notes']
             
             job.status = new_status
+            update_fields = ['status', 'updated_at']
             if new_status == 'completed':
                 job.completed_date = timezone.now()
-            job.save()
+                update_fields.append('completed_date')
+            job.save(update_fields=update_fields)
             
             # Create job update
             JobUpdate.objects.create(
@@ -826,17 +964,8 @@ def process_email(request):
                 return redirect('analytics:quote_detail', quote_id=result.pk)
             elif form.cleaned_data['force_create_quote']:
                 # Force create quote even with low confidence
-                customer, _ = Customer.objects.get_or_create(
-                    email=form.cleaned_data['sender_email'],
-                    defaults={
-                        'first_name': form.cleaned_data['sender_email'].split('@')[0].title(),
-                        'last_name': '',
-                        'mobile': '',
-                        'street_address': '',
-                        'suburb': '',
-                        'city': '',
-                        'postcode': '0000',
-                    }
+                customer = QuoteJobAutomationEngine.get_or_create_email_customer(
+                    form.cleaned_data['sender_email']
                 )
                 
                 quote = QuoteRequest.objects.create(
@@ -863,62 +992,83 @@ def process_email(request):
     return render(request, 'analytics/email_processing_form.html', context)
 
 
-@login_required
-@require_http_methods(["GET"])
-def quote_stats_api(request):
-    """API endpoint for quote statistics"""
+def quote_stats(days):
+    """Quote figures for the last `days` days, as served by quote_stats_api"""
     
-    # Get date range from query params
-    days = int(request.GET.get('days', 30))
     start_date = timezone.now() - timedelta(days=days)
     
+    totals = QuoteRequest.objects.aggregate(
+        total_quotes=Count('id', filter=Q(created_at__gte=start_date)),
+        pending_quotes=Count('id', filter=Q(status__in=['received', 'reviewing'])),
+        quoted_amount=Sum('final_quote_amount', filter=Q(status='quoted', created_at__gte=start_date)),
+        accepted_quotes=Count('id', filter=Q(status='accepted', created_at__gte=start_date)),
+    )
+    
     stats = {
-        'total_quotes': QuoteRequest.objects.filter(created_at__gte=start_date).count(),
-        'pending_quotes': QuoteRequest.objects.filter(status__in=['received', 'reviewing']).count(),
-        'quoted_amount': float(QuoteRequest.objects.filter(
-            status='quoted',
-            created_at__gte=start_date
-        ).aggregate(total=Sum('final_quote_amount'))['total'] or 0),
-        'accepted_quotes': QuoteRequest.objects.filter(
-            status='accepted',
-            created_at__gte=start_date
-        ).count(),
+        'total_quotes': totals['total_quotes'],
+        'pending_quotes': totals['pending_quotes'],
+        'quoted_amount': float(totals['quoted_amount'] or 0),
+        'accepted_quotes': totals['accepted_quotes'],
         'conversion_rate': 0,
     }
     
     if stats['total_quotes'] > 0:
         stats['conversion_rate'] = round((stats['accepted_quotes'] / stats['total_quotes']) * 100, 1)
     
-    return JsonResponse(stats)
+    return stats
+
+
+def job_stats(days):
+    """Job figures for the last `days` days, as served by job_stats_api"""
+    
+    now = timezone.now()
+    start_date = now - timedelta(days=days)
+    
+    active = Q(status__in=['pending', 'in_progress'])
+    completed_in_range = Q(status='completed', completed_date__gte=start_date)
+    totals = Job.objects.aggregate(
+        total_jobs=Count('id', filter=Q(created_at__gte=start_date)),
+        active_jobs=Count('id', filter=active),
+        completed_jobs=Count('id', filter=completed_in_range),
+        overdue_jobs=Count('id', filter=active & Q(due_date__lt=now)),
+        total_revenue=Sum('final_amount', filter=completed_in_range),
+    )
+    
+    return {
+        'total_jobs': totals['total_jobs'],
+        'active_jobs': totals['active_jobs'],
+        'completed_jobs': totals['completed_jobs'],
+        'overdue_jobs': totals['overdue_jobs'],
+        'total_revenue': float(totals['total_revenue'] or 0),
+    }
+
+
+def cached_quote_stats(request):
+    """quote_stats for the request's window, cached because dashboards poll it far more often than it changes"""
+    days = int(request.GET.get('days', 30))
+    return cache.get_or_set(f'quote_stats_api:{days}', lambda: quote_stats(days), STATS_API_CACHE_TIMEOUT)
+
+
+def cached_job_stats(request):
+    """job_stats for the request's window, cached because dashboards poll it far more often than it changes"""
+    days = int(request.GET.get('days', 30))
+    return cache.get_or_set(f'job_stats_api:{days}', lambda: job_stats(days), STATS_API_CACHE_TIMEOUT)
+
+
+@login_required
+@require_http_methods(["GET"])
+@condition(etag_func=lambda request: payload_etag(cached_quote_stats(request)))
+def quote_stats_api(request):
+    """API endpoint for quote statistics"""
+    return ORJSONResponse(cached_quote_stats(request))
 
 
 @login_required
 @require_http_methods(["GET"])
+@condition(etag_func=lambda request: payload_etag(cached_job_stats(request)))
 def job_stats_api(request):
     """API endpoint for job statistics"""
-    
-    # Get date range from query params
-    days = int(request.GET.get('days', 30))
-    start_date = timezone.now() - timedelta(days=days)
-    
-    stats = {
-        'total_jobs': Job.objects.filter(created_at__gte=start_date).count(),
-        'active_jobs': Job.objects.filter(status__in=['pending', 'in_progress']).count(),
-        'completed_jobs': Job.objects.filter(
-            status='completed',
-            completed_date__gte=start_date
-        ).count(),
-        'overdue_jobs': Job.objects.filter(
-            status__in=['pending', 'in_progress'],
-            due_date__lt=timezone.now()
-        ).count(),
-        'total_revenue': float(Job.objects.filter(
-            status='completed',
-            completed_date__gte=start_date
-        ).aggregate(total=Sum('final_amount'))['total'] or 0),
-    }
-    
-    return JsonResponse(stats)
+    return ORJSONResponse(cached_job_stats(request))
 
 
 @csrf_exempt
@@ -927,12 +1077,18 @@ def webhook_email_received(request):
     """Webhook endpoint for processing incoming emails"""
     
     try:
-        data = json.loads(request.body)
-        
+        data = json_loads(request.body)
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Invalid JSON payload'
+        }, status=400)
+    
+    try:
         # Extract email data (format depends on email service)
-        sender_email = data.get('from', {}).get('email', '')
+        sender_email = (data.get('from') or {}).get('email', '')
         subject = data.get('subject', '')
-        body = data.get('text', '') or data.get('html', '')
+        body = data.get('text') or data.get('html') or ''
         
         if sender_email and subject:
             result = QuoteJobAutomationEngine.process_incoming_email(
@@ -0,0 +1,86 @@
+from django.core.cache import cache
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from customers.models import Customer
+from .email_automation import ACTIVE_EMAIL_TEMPLATES_CACHE_KEY
+from .models import EmailTemplate, QuoteRequest, WorkflowTemplate
+from .task_automation import ACTIVE_TRIGGER_TYPES_CACHE_KEY
+
+
+def adjust_approved_quote_count(customer_id, delta):
+    """Shift a customer's denormalized approved quote counter in the database"""
+    if customer_id is None or delta == 0:
+        return
+    Customer.objects.filter(pk=customer_id).update(
+        approved_quote_count=F('approved_quote_count') + delta
+    )
+
+
+def recount_approved_quote_counts(customers=None):
+    """Rebuild approved quote counters from the quotes themselves
+
+    The receivers below only see per-instance saves and deletes; run the
+    recalculate_quote_counts command after QuoteRequest bulk_create or
+    queryset.update(status=...) writes.
+    """
+    if customers is None:
+        customers = Customer.objects.all()
+    approved = (
+        QuoteRequest.objects.filter(customer=OuterRef('pk'), status='approved')
+        .order_by()
+        .values('customer')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return customers.update(approved_quote_count=Coalesce(Subquery(approved), 0))
+
+
+@receiver(post_init, sender=QuoteRequest)
+def remember_quote_approval(sender, instance, **kwargs):
+    """Record the loaded status/customer so saves can detect approval transitions"""
+    instance._counted_approved = instance.status == 'approved'
+    instance._counted_customer_id = instance.customer_id
+
+
+@receiver(post_save, sender=QuoteRequest)
+def update_approved_quote_count(sender, instance, created, raw=False, **kwargs):
+    """Keep Customer.approved_quote_count in step with quote status changes"""
+    if raw:
+        return
+    
+    was_approved = False if created else instance._counted_approved
+    is_approved = instance.status == 'approved'
+    previous_customer_id = instance._counted_customer_id
+    
+    if previous_customer_id != instance.customer_id and was_approved:
+        adjust_approved_quote_count(previous_customer_id, -1)
+        was_approved = False
+    
+    adjust_approved_quote_count(instance.customer_id, int(is_approved) - int(was_approved))
+    
+    instance._counted_approved = is_approved
+    instance._counted_customer_id = instance.customer_id
+
+
+@receiver(post_delete, sender=QuoteRequest)
+def release_approved_quote_count(sender, instance, **kwargs):
+    """Drop a deleted approved quote from its customer's counter"""
+    if instance._counted_approved:
+        adjust_approved_quote_count(instance._counted_customer_id, -1)
+
+
+@receiver(post_save, sender=WorkflowTemplate)
+@receiver(post_delete, sender=WorkflowTemplate)
+def clear_active_trigger_types(sender, **kwargs):
+    """Forget the cached set of trigger types that have active workflows"""
+    cache.delete(ACTIVE_TRIGGER_TYPES_CACHE_KEY)
+
+
+@receiver(post_save, sender=EmailTemplate)
+@receiver(post_delete, sender=EmailTemplate)
+def clear_active_email_templates(sender, **kwargs):
+    """Forget the cached list of active email templates"""
+    cache.delete(ACTIVE_EMAIL_TEMPLATES_CACHE_KEY)
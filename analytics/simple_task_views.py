@@ -1,52 +1,123 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
 from django.contrib import messages
 from django.http import JsonResponse
 from django.utils import timezone
-from django.core.paginator import Paginator
-from django.db.models import Q, Count
-from datetime import timedelta
+from django.views.decorators.http import condition
+from django.views.decorators.cache import cache_control
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q, Count, Max, F, Case, When, Value, Window, Prefetch
+from django.db.models.functions import RowNumber
+from datetime import datetime, timedelta
+import json
 
 from customers.models import Customer
-from .models import WorkflowTemplate, WorkflowExecution, Task, Reminder
-from .task_automation import TaskManager
+from .models import (
+    WorkflowTemplate, WorkflowAction, WorkflowExecution, ActionExecution, Task, Reminder
+)
+from .task_automation import ACTIVE_TRIGGER_TYPES_CACHE_KEY, TaskManager, WorkflowEngine
+from .pagination import WindowCountPaginator
+from .utils import payload_etag, ORJSONResponse
+
+
+TASK_DASHBOARD_STATS_CACHE_KEY = 'task_dashboard:stats'
+TASK_DASHBOARD_STATS_CACHE_TIMEOUT = 30
+WORKFLOW_ANALYTICS_CACHE_TIMEOUT = 60
+# Browsers may reuse a polled workflow analytics response this long before revalidating
+WORKFLOW_ANALYTICS_MAX_AGE = 30
+# Kept warm by the refresh_task_analytics command so requests rarely scan the task table
+TASK_BREAKDOWN_CACHE_KEY = 'task_analytics:breakdown'
+TASK_BREAKDOWN_CACHE_TIMEOUT = 600
+CUSTOMER_SEARCH_LIMIT = 20
+
+
+def task_dashboard_stats(now):
+    """Task and workflow counters shown on the task dashboard"""
+    task_stats = Task.objects.aggregate(
+        total=Count('id'),
+        completed=Count('id', filter=Q(status='completed')),
+        overdue=Count('id', filter=Q(due_date__lt=now, status__in=['pending', 'in_progress'])),
+    )
+    execution_stats = WorkflowExecution.objects.aggregate(
+        total=Count('id'),
+        successful=Count('id', filter=Q(status='completed')),
+    )
+    return {
+        'total_tasks': task_stats['total'],
+        'completed_tasks': task_stats['completed'],
+        'overdue_count': task_stats['overdue'],
+        'active_workflows': WorkflowTemplate.objects.filter(is_active=True).count(),
+        'total_executions': execution_stats['total'],
+        'successful_executions': execution_stats['successful'],
+    }
+
+
+def task_breakdown_stats():
+    """Task counts grouped by priority and by the ten busiest assignees"""
+    return {
+        'priority_stats': list(Task.objects.values('priority').annotate(count=Count('id'))),
+        'user_stats': list(Task.objects.values('assigned_to__username').annotate(
+            count=Count('id')
+        ).order_by('-count')[:10]),
+    }
+
+
+def refresh_task_breakdown_stats():
+    """Recompute task_breakdown_stats and store it for the analytics pages"""
+    stats = task_breakdown_stats()
+    cache.set(TASK_BREAKDOWN_CACHE_KEY, stats, TASK_BREAKDOWN_CACHE_TIMEOUT)
+    return stats
+
+
+def cached_task_breakdown_stats():
+    """task_breakdown_stats from the cache, computed on the spot if it has expired"""
+    stats = cache.get(TASK_BREAKDOWN_CACHE_KEY)
+    if stats is None:
+        stats = refresh_task_breakdown_stats()
+    return stats
 
 
 @login_required
 def task_dashboard(request):
     """Simple task automation dashboard"""
+    now = timezone.now()
+    
     # Get user's assigned tasks
-    assigned_tasks = Task.objects.filter(assigned_to=request.user).order_by('-created_at')[:10]
+    assigned_tasks = Task.objects.filter(assigned_to=request.user).select_related('customer').order_by('-created_at')[:10]
     
     # Get recent workflow executions
-    recent_executions = WorkflowExecution.objects.order_by('-started_at')[:10]
-    
-    # Get overdue tasks
-    overdue_tasks = Task.objects.filter(
-        due_date__lt=timezone.now(),
-        status__in=['pending', 'in_progress']
-    ).order_by('due_date')[:5]
+    recent_executions = WorkflowExecution.objects.select_related('workflow', 'customer').order_by('-started_at')[:10]
     
-    # Get tasks due soon
-    due_soon = timezone.now() + timedelta(days=3)
-    upcoming_tasks = Task.objects.filter(
+    # Get overdue tasks and tasks due soon in one query, keeping the first five of each
+    due_soon = now + timedelta(days=3)
+    is_overdue = Case(When(due_date__lt=now, then=Value(True)), default=Value(False))
+    due_tasks = Task.objects.filter(
         due_date__lte=due_soon,
-        due_date__gte=timezone.now(),
         status__in=['pending', 'in_progress']
-    ).order_by('due_date')[:5]
-    
-    # Task statistics
-    total_tasks = Task.objects.count()
-    completed_tasks = Task.objects.filter(status='completed').count()
-    overdue_count = Task.objects.filter(
-        due_date__lt=timezone.now(),
-        status__in=['pending', 'in_progress']
-    ).count()
-    
-    # Workflow statistics
-    active_workflows = WorkflowTemplate.objects.filter(is_active=True).count()
-    total_executions = WorkflowExecution.objects.count()
-    successful_executions = WorkflowExecution.objects.filter(status='completed').count()
+    ).annotate(
+        overdue=is_overdue,
+        due_rank=Window(expression=RowNumber(), partition_by=[is_overdue], order_by=F('due_date').asc()),
+    ).filter(due_rank__lte=5).select_related('customer').order_by('due_date')
+    
+    overdue_tasks = []
+    upcoming_tasks = []
+    for task in due_tasks:
+        (overdue_tasks if task.overdue else upcoming_tasks).append(task)
+    
+    # Dashboard statistics tolerate a little staleness, so share them briefly across requests
+    stats = cache.get_or_set(
+        TASK_DASHBOARD_STATS_CACHE_KEY,
+        lambda: task_dashboard_stats(now),
+        TASK_DASHBOARD_STATS_CACHE_TIMEOUT
+    )
+    total_tasks = stats['total_tasks']
+    completed_tasks = stats['completed_tasks']
+    overdue_count = stats['overdue_count']
+    active_workflows = stats['active_workflows']
+    total_executions = stats['total_executions']
+    successful_executions = stats['successful_executions']
     
     context = {
         'assigned_tasks': assigned_tasks,
@@ -69,7 +140,12 @@ def task_dashboard(request):
 @login_required
 def task_list(request):
     """List all tasks"""
-    tasks = Task.objects.select_related('customer', 'assigned_to', 'created_by').order_by('-created_at')
+    tasks = Task.objects.select_related('customer', 'assigned_to', 'created_by').only(
+        'title', 'status', 'priority', 'due_date', 'completed_at', 'created_at', 'is_automated',
+        'customer__first_name', 'customer__last_name',
+        'assigned_to__username', 'assigned_to__first_name', 'assigned_to__last_name',
+        'created_by__username', 'created_by__first_name', 'created_by__last_name',
+    ).order_by('-created_at')
     
     # Simple filtering
     status_filter = request.GET.get('status')
@@ -80,7 +156,7 @@ def task_list(request):
     if priority_filter:
         tasks = tasks.filter(priority=priority_filter)
     
-    paginator = Paginator(tasks, 20)
+    paginator = WindowCountPaginator(tasks, 20)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
@@ -97,7 +173,10 @@ def task_list(request):
 @login_required
 def task_detail(request, pk):
     """Task detail view"""
-    task = get_object_or_404(Task, pk=pk)
+    task = get_object_or_404(
+        Task.objects.select_related('customer', 'assigned_to', 'created_by', 'workflow_execution'),
+        pk=pk
+    )
     
     context = {
         'task': task,
@@ -121,13 +200,11 @@ def task_create(request):
             customer = Customer.objects.get(pk=customer_id)
             assigned_to = None
             if assigned_to_id:
-                from django.contrib.auth.models import User
                 assigned_to = User.objects.get(pk=assigned_to_id)
             
             due_date = None
             if due_date_str:
-                from datetime import datetime
-                due_date = datetime.fromisoformat(due_date_str.replace('Z', '+00:00'))
+                due_date = datetime.fromisoformat(due_date_str)
             
             task = Task.objects.create(
                 title=title,
@@ -145,13 +222,12 @@ def task_create(request):
         except (Customer.DoesNotExist, ValueError) as e:
             messages.error(request, f'Error creating task: {str(e)}')
     
-    # Get customers and users for form
-    customers = Customer.objects.all().order_by('first_name', 'last_name')
-    from django.contrib.auth.models import User
-    users = User.objects.filter(is_active=True).order_by('first_name', 'last_name')
+    # Customers are looked up through customer_search as the user types
+    users = User.objects.filter(is_active=True).order_by('first_name', 'last_name').values(
+        'id', 'first_name', 'last_name', 'username'
+    )
     
     context = {
-        'customers': customers,
         'users': users,
     }
     
@@ -161,25 +237,32 @@ def task_create(request):
 @login_required
 def task_complete(request, pk):
     """Mark task as completed"""
-    task = get_object_or_404(Task, pk=pk)
+    title = get_object_or_404(Task.objects.values_list('title', flat=True), pk=pk)
     
-    if task.status != 'completed':
-        task.status = 'completed'
-        task.completed_at = timezone.now()
-        task.save()
-        messages.success(request, f'Task "{task.title}" marked as completed!')
+    now = timezone.now()
+    completed = Task.objects.filter(pk=pk).exclude(status='completed').update(
+        status='completed',
+        completed_at=now,
+        updated_at=now
+    )
+    
+    if completed:
+        messages.success(request, f'Task "{title}" marked as completed!')
     else:
         messages.info(request, 'Task is already completed.')
     
-    return redirect('analytics:task_detail', pk=task.pk)
+    return redirect('analytics:task_detail', pk=pk)
 
 
 @login_required
 def workflow_list(request):
     """List all workflow templates"""
-    workflows = WorkflowTemplate.objects.order_by('-created_at')
+    workflows = WorkflowTemplate.objects.select_related('created_by').only(
+        'name', 'description', 'trigger_type', 'is_active', 'created_at',
+        'created_by__username', 'created_by__first_name', 'created_by__last_name',
+    ).annotate(action_count=Count('actions')).order_by('-created_at')
     
-    paginator = Paginator(workflows, 20)
+    paginator = WindowCountPaginator(workflows, 20)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
@@ -194,19 +277,25 @@ def workflow_list(request):
 @login_required
 def workflow_detail(request, pk):
     """Workflow template detail view"""
-    workflow = get_object_or_404(WorkflowTemplate, pk=pk)
+    workflow = get_object_or_404(WorkflowTemplate.objects.select_related('created_by'), pk=pk)
     
     # Get workflow actions using direct query
-    from .models import WorkflowAction
     actions = WorkflowAction.objects.filter(workflow=workflow).order_by('action_order')
     
     # Get recent executions
-    executions = WorkflowExecution.objects.filter(workflow=workflow).order_by('-started_at')[:20]
+    executions = WorkflowExecution.objects.filter(workflow=workflow).select_related(
+        'customer', 'triggered_by'
+    ).order_by('-started_at')[:20]
     
     # Execution statistics
-    total_executions = WorkflowExecution.objects.filter(workflow=workflow).count()
-    successful_executions = WorkflowExecution.objects.filter(workflow=workflow, status='completed').count()
-    failed_executions = WorkflowExecution.objects.filter(workflow=workflow, status='failed').count()
+    execution_stats = WorkflowExecution.objects.filter(workflow=workflow).aggregate(
+        total=Count('id'),
+        successful=Count('id', filter=Q(status='completed')),
+        failed=Count('id', filter=Q(status='failed')),
+    )
+    total_executions = execution_stats['total']
+    successful_executions = execution_stats['successful']
+    failed_executions = execution_stats['failed']
     
     context = {
         'workflow': workflow,
@@ -241,7 +330,7 @@ def workflow_create(request):
         messages.success(request, f'Workflow "{workflow.name}" created successfully!')
         return redirect('analytics:workflow_detail', pk=workflow.pk)
     
-    trigger_choices = WorkflowTemplate._meta.get_field('trigger_type').choices
+    trigger_choices = WorkflowTemplate.TRIGGER_TYPES
     
     context = {
         'trigger_choices': trigger_choices,
@@ -265,7 +354,7 @@ def workflow_edit(request, pk):
         messages.success(request, f'Workflow "{workflow.name}" updated successfully!')
         return redirect('analytics:workflow_detail', pk=workflow.pk)
     
-    trigger_choices = WorkflowTemplate._meta.get_field('trigger_type').choices
+    trigger_choices = WorkflowTemplate.TRIGGER_TYPES
     
     context = {
         'workflow': workflow,
@@ -278,14 +367,17 @@ def workflow_edit(request, pk):
 @login_required
 def workflow_toggle_active(request, pk):
     """Toggle workflow active status"""
-    workflow = get_object_or_404(WorkflowTemplate, pk=pk)
-    workflow.is_active = not workflow.is_active
-    workflow.save()
+    with transaction.atomic():
+        WorkflowTemplate.objects.filter(pk=pk).update(is_active=~F('is_active'), updated_at=timezone.now())
+        name, is_active = get_object_or_404(WorkflowTemplate.objects.values_list('name', 'is_active'), pk=pk)
+    
+    # update() skips the post_save signal that normally drops this cache
+    cache.delete(ACTIVE_TRIGGER_TYPES_CACHE_KEY)
     
-    status = 'activated' if workflow.is_active else 'deactivated'
-    messages.success(request, f'Workflow "{workflow.name}" {status}!')
+    status = 'activated' if is_active else 'deactivated'
+    messages.success(request, f'Workflow "{name}" {status}!')
     
-    return redirect('analytics:workflow_detail', pk=workflow.pk)
+    return redirect('analytics:workflow_detail', pk=pk)
 
 
 @login_required
@@ -294,9 +386,6 @@ def workflow_action_create(request, workflow_pk):
     workflow = get_object_or_404(WorkflowTemplate, pk=workflow_pk)
     
     if request.method == 'POST':
-        from .models import WorkflowAction
-        import json
-        
         action_type = request.POST.get('action_type')
         action_config_json = request.POST.get('action_config', '{}')
         
@@ -305,22 +394,27 @@ def workflow_action_create(request, workflow_pk):
         except json.JSONDecodeError:
             action_config = {}
         
-        # Get next action order
-        last_action = WorkflowAction.objects.filter(workflow=workflow).order_by('-action_order').first()
-        action_order = (last_action.action_order + 1) if last_action else 1
-        
-        action = WorkflowAction.objects.create(
-            workflow=workflow,
-            action_type=action_type,
-            action_order=action_order,
-            action_config=action_config
-        )
+        with transaction.atomic():
+            # Lock the workflow so concurrent requests can't claim the same action order
+            WorkflowTemplate.objects.select_for_update().only('pk').get(pk=workflow.pk)
+            
+            # Get next action order
+            last_order = WorkflowAction.objects.filter(workflow=workflow).aggregate(
+                last_order=Max('action_order')
+            )['last_order']
+            action_order = (last_order or 0) + 1
+            
+            action = WorkflowAction.objects.create(
+                workflow=workflow,
+                action_type=action_type,
+                action_order=action_order,
+                action_config=action_config
+            )
         
         messages.success(request, 'Action added to workflow!')
         return redirect('analytics:workflow_detail', pk=workflow.pk)
     
-    from .models import WorkflowAction
-    action_choices = WorkflowAction._meta.get_field('action_type').choices
+    action_choices = WorkflowAction.ACTION_TYPES
     
     context = {
         'workflow': workflow,
@@ -330,6 +424,50 @@ def workflow_action_create(request, workflow_pk):
     return render(request, 'analytics/workflow_action_create.html', context)
 
 
+@login_required
+def workflow_action_reorder(request, workflow_pk):
+    """AJAX view to renumber a workflow's actions from a list of action ids in their new order"""
+    if request.method != 'POST':
+        return ORJSONResponse({'success': False, 'message': 'Invalid request!'})
+    
+    workflow = get_object_or_404(WorkflowTemplate, pk=workflow_pk)
+    try:
+        action_ids = [int(action_id) for action_id in request.POST.getlist('action_ids')]
+    except ValueError:
+        return ORJSONResponse({'success': False, 'message': 'Invalid action list!'})
+    
+    with transaction.atomic():
+        # Lock the workflow so reorders and new actions don't interleave
+        WorkflowTemplate.objects.select_for_update().only('pk').get(pk=workflow.pk)
+        
+        # Running executions track their next step by action_order, so renumbering
+        # under them would silently change which action runs next
+        if WorkflowExecution.objects.filter(workflow=workflow, status='running').exists():
+            return ORJSONResponse({
+                'success': False,
+                'message': 'Cannot reorder actions while this workflow has running executions!'
+            })
+        
+        actions = WorkflowAction.objects.filter(workflow=workflow)
+        current_orders = dict(actions.order_by().values_list('pk', 'action_order'))
+        if len(action_ids) != len(set(action_ids)) or set(action_ids) != set(current_orders):
+            return ORJSONResponse({'success': False, 'message': 'Action list does not match this workflow!'})
+        
+        if action_ids:
+            # Move every action clear of both the current orders and the final
+            # 1..n range first, since (workflow, action_order) is unique and is
+            # checked row by row (orders may be zero or negative)
+            orders = current_orders.values()
+            shift = max(max(orders), len(action_ids)) - min(orders) + 1
+            actions.update(action_order=F('action_order') + shift)
+            actions.update(action_order=Case(
+                *[When(pk=action_id, then=Value(order)) for order, action_id in enumerate(action_ids, start=1)],
+                default=F('action_order')
+            ))
+    
+    return ORJSONResponse({'success': True, 'message': 'Workflow actions reordered!'})
+
+
 @login_required
 def workflow_execute_manual(request, pk):
     """Manually execute workflow for a customer"""
@@ -339,7 +477,6 @@ def workflow_execute_manual(request, pk):
         customer_id = request.POST.get('customer_id')
         try:
             customer = Customer.objects.get(pk=customer_id)
-            from .task_automation import WorkflowEngine
             execution = WorkflowEngine.start_workflow_execution(
                 workflow=workflow,
                 customer=customer,
@@ -350,12 +487,9 @@ def workflow_execute_manual(request, pk):
         except Customer.DoesNotExist:
             messages.error(request, 'Customer not found!')
     
-    # Get recent customers for selection
-    customers = Customer.objects.order_by('-created_at')[:20]
-    
+    # Customers are picked on demand through the customer_search endpoint
     context = {
         'workflow': workflow,
-        'customers': customers,
     }
     
     return render(request, 'analytics/workflow_execute_manual.html', context)
@@ -364,11 +498,18 @@ def workflow_execute_manual(request, pk):
 @login_required
 def workflow_execution_detail(request, pk):
     """Workflow execution detail view"""
-    execution = get_object_or_404(WorkflowExecution, pk=pk)
+    execution = get_object_or_404(
+        WorkflowExecution.objects.select_related('workflow', 'customer', 'triggered_by').prefetch_related(
+            Prefetch(
+                'action_executions',
+                queryset=ActionExecution.objects.select_related('action').order_by('started_at')
+            )
+        ),
+        pk=pk
+    )
     
-    # Get action executions using direct query
-    from .models import ActionExecution
-    action_executions = ActionExecution.objects.filter(workflow_execution=execution).order_by('started_at')
+    # Action executions (and their actions) come from the prefetch above
+    action_executions = execution.action_executions.all()
     
     context = {
         'execution': execution,
@@ -381,18 +522,23 @@ def workflow_execution_detail(request, pk):
 @login_required
 def reminder_list(request):
     """List all reminders"""
-    reminders = Reminder.objects.select_related('customer', 'user').order_by('-remind_at')
+    now = timezone.now()
+    reminders = Reminder.objects.select_related('customer', 'user').only(
+        'title', 'description', 'remind_at', 'is_sent', 'sent_at', 'created_at',
+        'customer__first_name', 'customer__last_name',
+        'user__username', 'user__first_name', 'user__last_name',
+    ).order_by('-remind_at')
     
     # Filter options
     filter_type = request.GET.get('filter', 'all')
     if filter_type == 'pending':
-        reminders = reminders.filter(is_sent=False, remind_at__lte=timezone.now())
+        reminders = reminders.filter(is_sent=False, remind_at__lte=now)
     elif filter_type == 'upcoming':
-        reminders = reminders.filter(is_sent=False, remind_at__gt=timezone.now())
+        reminders = reminders.filter(is_sent=False, remind_at__gt=now)
     elif filter_type == 'sent':
         reminders = reminders.filter(is_sent=True)
     
-    paginator = Paginator(reminders, 20)
+    paginator = WindowCountPaginator(reminders, 20)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
@@ -416,8 +562,7 @@ def reminder_create(request):
         
         try:
             customer = Customer.objects.get(pk=customer_id)
-            from datetime import datetime
-            remind_at = datetime.fromisoformat(remind_at_str.replace('Z', '+00:00'))
+            remind_at = datetime.fromisoformat(remind_at_str)
             
             reminder = Reminder.objects.create(
                 title=title,
@@ -433,37 +578,31 @@ def reminder_create(request):
         except (Customer.DoesNotExist, ValueError) as e:
             messages.error(request, f'Error creating reminder: {str(e)}')
     
-    customers = Customer.objects.all().order_by('first_name', 'last_name')
-    
-    context = {
-        'customers': customers,
-    }
-    
-    return render(request, 'analytics/reminder_create.html', context)
+    # Customers are looked up through customer_search as the user types
+    return render(request, 'analytics/reminder_create.html')
 
 
 @login_required
 def task_analytics(request):
     """Task analytics and reporting"""
-    # Task completion analytics
-    total_tasks = Task.objects.count()
-    completed_tasks = Task.objects.filter(status='completed').count()
-    pending_tasks = Task.objects.filter(status='pending').count()
-    in_progress_tasks = Task.objects.filter(status='in_progress').count()
-    
-    # Overdue tasks
-    overdue_tasks = Task.objects.filter(
-        due_date__lt=timezone.now(),
-        status__in=['pending', 'in_progress']
-    ).count()
-    
-    # Task distribution by priority
-    priority_stats = list(Task.objects.values('priority').annotate(count=Count('id')))
-    
-    # Task distribution by assigned user
-    user_stats = list(Task.objects.values('assigned_to__username').annotate(
-        count=Count('id')
-    ).order_by('-count')[:10])
+    now = timezone.now()
+    
+    # Task completion analytics, including overdue tasks
+    task_stats = Task.objects.aggregate(
+        total=Count('id'),
+        completed=Count('id', filter=Q(status='completed')),
+        pending=Count('id', filter=Q(status='pending')),
+        in_progress=Count('id', filter=Q(status='in_progress')),
+        overdue=Count('id', filter=Q(due_date__lt=now, status__in=['pending', 'in_progress'])),
+    )
+    total_tasks = task_stats['total']
+    completed_tasks = task_stats['completed']
+    pending_tasks = task_stats['pending']
+    in_progress_tasks = task_stats['in_progress']
+    overdue_tasks = task_stats['overdue']
+    
+    # Task distribution by priority and by assigned user
+    breakdown = cached_task_breakdown_stats()
     
     context = {
         'total_tasks': total_tasks,
@@ -472,8 +611,8 @@ def task_analytics(request):
         'in_progress_tasks': in_progress_tasks,
         'overdue_tasks': overdue_tasks,
         'completion_rate': round((completed_tasks / total_tasks * 100) if total_tasks > 0 else 0, 1),
-        'priority_stats': priority_stats,
-        'user_stats': user_stats,
+        'priority_stats': breakdown['priority_stats'],
+        'user_stats': breakdown['user_stats'],
     }
     
     return render(request, 'analytics/task_analytics.html', context)
@@ -481,6 +620,31 @@ def task_analytics(request):
 
 # AJAX Views
 
+@login_required
+def customer_search(request):
+    """AJAX view returning customers matching a name or email fragment for pickers"""
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'results': []})
+    
+    customers = Customer.objects.filter(
+        Q(first_name__icontains=query) |
+        Q(last_name__icontains=query) |
+        Q(email__icontains=query)
+    ).order_by('first_name', 'last_name').values(
+        'id', 'first_name', 'last_name', 'email'
+    )[:CUSTOMER_SEARCH_LIMIT]
+    
+    results = [
+        {
+            'id': customer['id'],
+            'text': f"{customer['first_name']} {customer['last_name']} ({customer['email']})",
+        }
+        for customer in customers
+    ]
+    return JsonResponse({'results': results})
+
+
 @login_required
 def task_status_update(request):
     """AJAX view to update task status"""
@@ -488,47 +652,68 @@ def task_status_update(request):
         task_id = request.POST.get('task_id')
         new_status = request.POST.get('status')
         
-        try:
-            task = Task.objects.get(pk=task_id)
-            
-            if new_status == 'completed' and task.status != 'completed':
-                task.status = 'completed'
-                task.completed_at = timezone.now()
-                task.save()
-            else:
-                task.status = new_status
-                task.save()
-            
-            return JsonResponse({'success': True, 'message': 'Task status updated!'})
+        now = timezone.now()
+        changes = {'status': new_status, 'updated_at': now}
+        if new_status == 'completed':
+            # Keep the original completion time for tasks that were already completed
+            changes['completed_at'] = Case(
+                When(status='completed', then=F('completed_at')),
+                default=Value(now)
+            )
+        
+        if Task.objects.filter(pk=task_id).update(**changes):
+            return ORJSONResponse({'success': True, 'message': 'Task status updated!'})
         
-        except Task.DoesNotExist:
-            return JsonResponse({'success': False, 'message': 'Task not found!'})
+        return ORJSONResponse({'success': False, 'message': 'Task not found!'})
     
-    return JsonResponse({'success': False, 'message': 'Invalid request!'})
+    return ORJSONResponse({'success': False, 'message': 'Invalid request!'})
+
+
+def cached_workflow_analytics_payload(request):
+    """workflow_analytics_payload, cached under the latest template change so edits show up immediately"""
+    if not hasattr(request, 'workflow_analytics_payload'):
+        latest_update = WorkflowTemplate.objects.aggregate(latest=Max('updated_at'))['latest']
+        cache_key = f"workflow_analytics_data:{latest_update.isoformat() if latest_update else 'none'}"
+        data = cache.get(cache_key)
+        if data is None:
+            data = workflow_analytics_payload()
+            cache.set(cache_key, data, WORKFLOW_ANALYTICS_CACHE_TIMEOUT)
+        # Reused by the ETag check and the response body within one request
+        request.workflow_analytics_payload = data
+    return request.workflow_analytics_payload
 
 
 @login_required
+@cache_control(private=True, max_age=WORKFLOW_ANALYTICS_MAX_AGE)
+@condition(etag_func=lambda request: payload_etag(cached_workflow_analytics_payload(request)))
 def workflow_analytics_data(request):
     """AJAX view to get workflow analytics data"""
-    workflows = WorkflowTemplate.objects.all()
+    return ORJSONResponse({'workflows': cached_workflow_analytics_payload(request)})
+
+
+def workflow_analytics_payload():
+    """Per-workflow execution counts and success rates"""
+    workflows = WorkflowTemplate.objects.annotate(
+        execution_count=Count('workflowexecution'),
+        success_count=Count('workflowexecution', filter=Q(workflowexecution__status='completed')),
+        failure_count=Count('workflowexecution', filter=Q(workflowexecution__status='failed')),
+    ).values('name', 'execution_count', 'success_count', 'failure_count')
     
     data = []
-    for workflow in workflows:
-        executions = WorkflowExecution.objects.filter(workflow=workflow)
-        execution_count = executions.count()
-        success_count = executions.filter(status='completed').count()
-        failure_count = executions.filter(status='failed').count()
+    for workflow in workflows.iterator(chunk_size=200):
+        execution_count = workflow['execution_count']
+        success_count = workflow['success_count']
         
         success_rate = 0
         if execution_count > 0:
             success_rate = (success_count / execution_count) * 100
         
         data.append({
-            'name': workflow.name,
+            'name': workflow['name'],
             'executions': execution_count,
             'success_rate': round(success_rate, 1),
             'success_count': success_count,
-            'failure_count': failure_count,
+            'failure_count': workflow['failure_count'],
         })
     
-    return JsonResponse({'workflows': data})
\ No newline at end of file
+    return data
\ No newline at end of file
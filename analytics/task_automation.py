@@ -1,82 +1,229 @@
 from django.utils import timezone
 from django.contrib.auth.models import User
-from django.core.mail import send_mail
+from django.core.mail import get_connection, send_mail
 from django.conf import settings
-from datetime import timedelta
+from django.core.cache import cache
+from django.db.models import Count, Prefetch, prefetch_related_objects
+from datetime import datetime, timedelta
 import logging
+import threading
+from collections import namedtuple
 from typing import Dict, List, Optional, Any, Union
 
 from customers.models import Customer, CustomerNote, Tag
 from .models import (
-    WorkflowTemplate, WorkflowAction, WorkflowExecution, ActionExecution,
+    WorkflowTemplate, WorkflowAction, WorkflowExecution, WorkflowExecutionLog, ActionExecution,
     Task, Reminder, AnalyticsEvent, EmailTemplate
 )
 from .email_automation import EmailAutomationEngine
 
 logger = logging.getLogger(__name__)
 
+# Pre-built trigger condition sets; None means the condition isn't set
+CompiledConditions = namedtuple('CompiledConditions', ['cities', 'tags', 'note_types'])
+
+ACTIVE_TRIGGER_TYPES_CACHE_KEY = 'workflows:active_trigger_types'
+ACTIVE_TRIGGER_TYPES_CACHE_TIMEOUT = 300
+
+# Pending reminders fetched per round trip
+REMINDER_BATCH_SIZE = 1000
+
+COMPILED_CONDITIONS_CACHE_SIZE = 4096
+_compiled_conditions: Dict[Any, Optional[CompiledConditions]] = {}
+
+
+def active_trigger_types() -> set:
+    """Trigger types with at least one active workflow (cleared by analytics.signals on workflow changes)"""
+    return cache.get_or_set(
+        ACTIVE_TRIGGER_TYPES_CACHE_KEY,
+        lambda: set(
+            WorkflowTemplate.objects.filter(is_active=True).order_by().values_list('trigger_type', flat=True).distinct()
+        ),
+        ACTIVE_TRIGGER_TYPES_CACHE_TIMEOUT
+    )
+
+
+def condition_values(value) -> frozenset:
+    """Normalise a trigger condition value (one string or a list of them) to a frozenset"""
+    if isinstance(value, str):
+        return frozenset([value])
+    return frozenset(item for item in value or () if isinstance(item, str))
+
+
+def compile_trigger_conditions(workflow: WorkflowTemplate) -> Optional[CompiledConditions]:
+    """Return the workflow's trigger conditions as sets, or None when it has no conditions"""
+    key = (workflow.pk, workflow.updated_at)
+    try:
+        return _compiled_conditions[key]
+    except KeyError:
+        pass
+    
+    conditions = workflow.trigger_conditions
+    compiled = None
+    if conditions:
+        compiled = CompiledConditions(
+            cities=condition_values(conditions['customer_city']) if 'customer_city' in conditions else None,
+            tags=condition_values(conditions['customer_tags']) if 'customer_tags' in conditions else None,
+            note_types=condition_values(conditions['note_type']) if 'note_type' in conditions else None,
+        )
+    
+    if workflow.pk is not None:
+        if len(_compiled_conditions) >= COMPILED_CONDITIONS_CACHE_SIZE:
+            _compiled_conditions.clear()
+        _compiled_conditions[key] = compiled
+    return compiled
+
+
+class AnalyticsEventBuffer:
+    """Collect analytics events and write them with a single bulk_create"""
+    
+    _local = threading.local()
+    
+    def __init__(self, batch_size: int = 500):
+        self.batch_size = batch_size
+        self.events: List[AnalyticsEvent] = []
+    
+    def __enter__(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(self)
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._local.stack.pop()
+        self.flush()
+        return False
+    
+    def add(self, event: AnalyticsEvent):
+        """Queue an unsaved event, flushing once the batch is full"""
+        self.events.append(event)
+        if len(self.events) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        """Write all queued events"""
+        if self.events:
+            AnalyticsEvent.objects.bulk_create(self.events, batch_size=self.batch_size)
+            self.events = []
+    
+    @classmethod
+    def record(cls, **fields) -> AnalyticsEvent:
+        """Queue an event on the outermost active buffer, or save it straight away"""
+        event = AnalyticsEvent(**fields)
+        stack = getattr(cls._local, 'stack', None)
+        if stack:
+            stack[0].add(event)
+        else:
+            event.save()
+        return event
+
 
 class WorkflowEngine:
     """Core workflow automation engine"""
     
+    # Customer fields an update_customer action may change
+    ALLOWED_UPDATE_FIELDS = frozenset({
+        'first_name', 'last_name', 'mobile', 'street_address', 'suburb', 'city', 'postcode', 'is_active',
+    })
+    
     @staticmethod
     def trigger_workflows(trigger_type: str, customer: Customer, user: User, context: Optional[Dict[str, Any]] = None):
         """Trigger all active workflows for a given trigger type"""
         context = context or {}
         
+        # Most trigger types have no workflows configured; skip the lookup for them
+        if trigger_type not in active_trigger_types():
+            return []
+        
         # Get active workflows for this trigger type
-        workflows = WorkflowTemplate.objects.filter(
+        workflows = list(WorkflowTemplate.objects.filter(
             trigger_type=trigger_type,
             is_active=True
-        )
+        ).prefetch_related(WorkflowEngine.ordered_actions_prefetch()))
+        
+        compiled = [compile_trigger_conditions(workflow) for workflow in workflows]
+        
+        # Look up the customer's tag names once for every tag condition
+        customer_tag_names = None
+        if any(conditions and conditions.tags is not None for conditions in compiled):
+            customer_tag_names = set(customer.tags.order_by().values_list('name', flat=True))
+        
+        # Count this customer's live executions for every limited workflow in one query
+        execution_counts = None
+        limited_ids = [
+            workflow.pk for workflow, conditions in zip(workflows, compiled)
+            if conditions and workflow.max_executions
+        ]
+        if limited_ids:
+            execution_counts = dict(
+                WorkflowExecution.objects.filter(
+                    workflow_id__in=limited_ids,
+                    customer=customer,
+                    status__in=['completed', 'running']
+                ).order_by().values('workflow_id').annotate(n=Count('id')).values_list('workflow_id', 'n')
+            )
         
         triggered_executions = []
         
-        for workflow in workflows:
-            try:
-                # Check if workflow should be triggered based on conditions
-                if WorkflowEngine._should_trigger_workflow(workflow, customer, context):
-                    execution = WorkflowEngine.start_workflow_execution(workflow, customer, user, context)
-                    triggered_executions.append(execution)
-            except Exception as e:
-                logger.error(f"Error triggering workflow {workflow.name}: {e}")
+        with AnalyticsEventBuffer():
+            for workflow in workflows:
+                try:
+                    # Check if workflow should be triggered based on conditions
+                    if WorkflowEngine._should_trigger_workflow(
+                        workflow, customer, context, customer_tag_names, execution_counts
+                    ):
+                        execution = WorkflowEngine.start_workflow_execution(workflow, customer, user, context)
+                        triggered_executions.append(execution)
+                except Exception as e:
+                    logger.error(f"Error triggering workflow {workflow.name}: {e}")
         
         return triggered_executions
     
     @staticmethod
-    def _should_trigger_workflow(workflow: WorkflowTemplate, customer: Customer, context: Dict[str, Any]) -> bool:
+    def ordered_actions_prefetch() -> Prefetch:
+        """Prefetch a workflow's actions in execution order"""
+        return Prefetch('actions', queryset=WorkflowAction.objects.order_by('action_order'))
+    
+    @staticmethod
+    def _should_trigger_workflow(workflow: WorkflowTemplate, customer: Customer, context: Dict[str, Any],
+                                 customer_tag_names: Optional[set] = None,
+                                 execution_counts: Optional[Dict[int, int]] = None) -> bool:
         """Check if workflow should be triggered based on conditions"""
-        conditions = workflow.trigger_conditions
-        
-        if not conditions:
-            return True  # No conditions means always trigger
-        
         try:
+            conditions = compile_trigger_conditions(workflow)
+            
+            if conditions is None:
+                return True  # No conditions means always trigger
+            
             # Check customer conditions
-            if 'customer_city' in conditions:
-                if customer.city not in conditions['customer_city']:
-                    return False
+            if conditions.cities is not None and customer.city not in conditions.cities:
+                return False
             
-            if 'customer_tags' in conditions:
-                customer_tags = [tag.name for tag in customer.tags.all()]
-                required_tags = conditions['customer_tags']
-                if not any(tag in customer_tags for tag in required_tags):
+            if conditions.tags is not None:
+                if customer_tag_names is None:
+                    customer_tag_names = set(customer.tags.order_by().values_list('name', flat=True))
+                if not (conditions.tags & customer_tag_names):
                     return False
             
             # Check context conditions
-            if 'note_type' in conditions and 'note_type' in context:
-                if context['note_type'] not in conditions['note_type']:
+            if conditions.note_types is not None and 'note_type' in context:
+                if context['note_type'] not in conditions.note_types:
                     return False
             
             # Check execution limits
             if workflow.max_executions:
-                execution_count = WorkflowExecution.objects.filter(
-                    workflow=workflow,
-                    customer=customer,
-                    status__in=['completed', 'running']
-                ).count()
+                if execution_counts is not None:
+                    limit_reached = execution_counts.get(workflow.pk, 0) >= workflow.max_executions
+                else:
+                    # Probe for the max_executions-th row instead of counting them all
+                    limit_reached = WorkflowExecution.objects.filter(
+                        workflow=workflow,
+                        customer=customer,
+                        status__in=['completed', 'running']
+                    ).order_by()[workflow.max_executions - 1:workflow.max_executions].exists()
                 
-                if execution_count >= workflow.max_executions:
+                if limit_reached:
                     return False
             
             return True
@@ -90,24 +237,27 @@ class WorkflowEngine:
         """Start execution of a workflow"""
         context = context or {}
         
+        # Load the actions once so each step reads them from memory
+        if 'actions' not in getattr(workflow, '_prefetched_objects_cache', {}):
+            prefetch_related_objects([workflow], WorkflowEngine.ordered_actions_prefetch())
+        
         execution = WorkflowExecution.objects.create(
             workflow=workflow,
             customer=customer,
             triggered_by=user,
             status='pending',
-            context_data=context,
-            execution_log=[{
-                'timestamp': timezone.now().isoformat(),
-                'action': 'workflow_started',
-                'message': f'Workflow {workflow.name} started for {customer.first_name} {customer.last_name}'
-            }]
+            context_data=context
+        )
+        WorkflowEngine._log(
+            execution, 'workflow_started',
+            f'Workflow {workflow.name} started for {customer.first_name} {customer.last_name}'
         )
         
         # Start executing actions
         WorkflowEngine._execute_next_action(execution)
         
         # Track analytics event
-        AnalyticsEvent.objects.create(
+        AnalyticsEventBuffer.record(
             customer=customer,
             event_type='workflow_triggered',
             user=user,
@@ -121,44 +271,66 @@ class WorkflowEngine:
         
         return execution
     
+    @staticmethod
+    def _log(execution: WorkflowExecution, action: str, message: str, payload: Optional[Dict[str, Any]] = None,
+             timestamp: Optional[datetime] = None):
+        """Append an entry to the execution's log"""
+        WorkflowExecutionLog.objects.create(
+            execution=execution,
+            timestamp=timestamp or timezone.now(),
+            action=action,
+            message=message,
+            payload=payload or {}
+        )
+    
+    @staticmethod
+    def _get_next_action(execution: WorkflowExecution) -> Optional[WorkflowAction]:
+        """Return the first action at or after the execution's current step"""
+        workflow = execution.workflow
+        if 'actions' in getattr(workflow, '_prefetched_objects_cache', {}):
+            return next(
+                (a for a in workflow.actions.all() if a.action_order >= execution.current_action),
+                None
+            )
+        # Single LIMIT 1 lookup served by the (workflow, action_order) unique index
+        return workflow.actions.filter(
+            action_order__gte=execution.current_action
+        ).order_by('action_order').first()
+    
     @staticmethod
     def _execute_next_action(execution: WorkflowExecution):
-        """Execute the next action in the workflow"""
+        """Execute actions until the workflow completes, fails or waits on a delay"""
         if execution.status not in ['pending', 'running']:
             return
         
-        # Get the next action to execute
-        actions = WorkflowAction.objects.filter(
-            workflow=execution.workflow,
-            action_order__gte=execution.current_action
-        ).order_by('action_order')
-        
-        if not actions.exists():
-            # Workflow completed
-            execution.status = 'completed'
-            execution.completed_at = timezone.now()
-            execution.execution_log.append({
-                'timestamp': timezone.now().isoformat(),
-                'action': 'workflow_completed',
-                'message': 'All workflow actions completed successfully'
-            })
-            execution.save()
-            return
-
-        action = actions.first()
-        if action is None:
-            return
-            
+        # Step progress is only written at delay boundaries, on completion and on failure
         execution.status = 'running'
-        execution.current_action = action.action_order
-        execution.save()
+        execution.save(update_fields=['status', 'next_action_at'])
         
-        # Execute the action
-        WorkflowEngine._execute_action(execution, action)
+        while True:
+            # Get the next action to execute
+            action = WorkflowEngine._get_next_action(execution)
+            
+            if action is None:
+                # Workflow completed
+                execution.status = 'completed'
+                execution.completed_at = timezone.now()
+                WorkflowEngine._log(
+                    execution, 'workflow_completed', 'All workflow actions completed successfully',
+                    timestamp=execution.completed_at
+                )
+                execution.save(update_fields=['status', 'completed_at', 'current_action'])
+                return
+            
+            execution.current_action = action.action_order
+            
+            # Execute the action and stop unless the next one is due now
+            if not WorkflowEngine._execute_action(execution, action):
+                return
     
     @staticmethod
-    def _execute_action(execution: WorkflowExecution, action: WorkflowAction):
-        """Execute a specific workflow action"""
+    def _execute_action(execution: WorkflowExecution, action: WorkflowAction) -> bool:
+        """Execute a specific workflow action, returning whether to continue straight away"""
         action_execution = ActionExecution.objects.create(
             workflow_execution=execution,
             action=action,
@@ -166,71 +338,53 @@ class WorkflowEngine:
         )
         
         try:
-            result = None
-            
-            if action.action_type == 'create_task':
-                result = WorkflowEngine._execute_create_task(execution, action)
-            elif action.action_type == 'send_email':
-                result = WorkflowEngine._execute_send_email(execution, action)
-            elif action.action_type == 'add_note':
-                result = WorkflowEngine._execute_add_note(execution, action)
-            elif action.action_type == 'update_customer':
-                result = WorkflowEngine._execute_update_customer(execution, action)
-            elif action.action_type == 'send_notification':
-                result = WorkflowEngine._execute_send_notification(execution, action)
-            elif action.action_type == 'create_reminder':
-                result = WorkflowEngine._execute_create_reminder(execution, action)
-            elif action.action_type == 'assign_tag':
-                result = WorkflowEngine._execute_assign_tag(execution, action)
-            elif action.action_type == 'remove_tag':
-                result = WorkflowEngine._execute_remove_tag(execution, action)
-            elif action.action_type == 'wait':
-                result = WorkflowEngine._execute_wait(execution, action)
-            else:
+            handler = WorkflowEngine._ACTION_HANDLERS.get(action.action_type)
+            if handler is None:
                 raise ValueError(f"Unknown action type: {action.action_type}")
+            result = handler(execution, action)
             
             # Mark action as completed
             action_execution.status = 'completed'
-            action_execution.completed_at = timezone.now()
+            action_execution.completed_at = now = timezone.now()
             action_execution.result_data = result or {}
-            action_execution.save()
+            action_execution.save(update_fields=['status', 'completed_at', 'result_data'])
             
             # Log success
-            execution.execution_log.append({
-                'timestamp': timezone.now().isoformat(),
-                'action': action.action_type,
-                'message': f'Action {action.action_type} completed successfully',
-                'result': result
-            })
-            execution.save()
+            WorkflowEngine._log(
+                execution, action.action_type,
+                f'Action {action.action_type} completed successfully',
+                {'result': result},
+                timestamp=now
+            )
             
             # Continue to next action (after delay if specified)
             if action.delay_days or action.delay_hours or action.delay_minutes:
                 WorkflowEngine._schedule_next_action(execution, action)
-            else:
-                execution.current_action += 1
-                execution.save()
-                WorkflowEngine._execute_next_action(execution)
+                return False
+            
+            execution.current_action += 1
+            return True
         
         except Exception as e:
             # Mark action as failed
             action_execution.status = 'failed'
             action_execution.error_message = str(e)
-            action_execution.completed_at = timezone.now()
-            action_execution.save()
+            action_execution.completed_at = now = timezone.now()
+            action_execution.save(update_fields=['status', 'error_message', 'completed_at'])
             
             # Log error
-            execution.execution_log.append({
-                'timestamp': timezone.now().isoformat(),
-                'action': action.action_type,
-                'message': f'Action {action.action_type} failed: {str(e)}',
-                'error': str(e)
-            })
+            WorkflowEngine._log(
+                execution, action.action_type,
+                f'Action {action.action_type} failed: {str(e)}',
+                {'error': str(e)},
+                timestamp=now
+            )
             execution.status = 'failed'
             execution.error_message = str(e)
-            execution.save()
+            execution.save(update_fields=['status', 'error_message', 'current_action'])
             
             logger.error(f"Workflow action failed: {e}")
+            return False
     
     @staticmethod
     def _execute_create_task(execution: WorkflowExecution, action: WorkflowAction) -> Dict[str, Any]:
@@ -305,9 +459,10 @@ class WorkflowEngine:
             created_by=execution.triggered_by
         )
         
+        # The note itself is stored on CustomerNote; keep the action result small
         return {
             'note_id': note.pk,
-            'note_content': note.note[:50] + '...' if len(note.note) > 50 else note.note
+            'note_length': len(note.note)
         }
     
     @staticmethod
@@ -316,18 +471,20 @@ class WorkflowEngine:
         config = action.action_config
         customer = execution.customer
         
-        updated_fields = []
+        updates = config.get('updates', {})
+        updated_fields = [field_name for field_name in updates if field_name in WorkflowEngine.ALLOWED_UPDATE_FIELDS]
+        safe_updates = {field_name: updates[field_name] for field_name in updated_fields}
         
-        for field_name, field_value in config.get('updates', {}).items():
-            if hasattr(customer, field_name):
+        if safe_updates:
+            safe_updates['updated_at'] = timezone.now()
+            Customer.objects.filter(pk=customer.pk).update(**safe_updates)
+            # Keep the in-memory customer in step for later actions
+            for field_name, field_value in safe_updates.items():
                 setattr(customer, field_name, field_value)
-                updated_fields.append(field_name)
-        
-        if updated_fields:
-            customer.save()
         
         return {
-            'updated_fields': updated_fields
+            'updated_fields': updated_fields,
+            'skipped_fields': [field_name for field_name in updates if field_name not in WorkflowEngine.ALLOWED_UPDATE_FIELDS]
         }
     
     @staticmethod
@@ -383,11 +540,15 @@ class WorkflowEngine:
         config = action.action_config
         tag_names = config.get('tags', [])
         
-        assigned_tags = []
-        for tag_name in tag_names:
-            tag, created = Tag.objects.get_or_create(name=tag_name)
-            execution.customer.tags.add(tag)
-            assigned_tags.append(tag_name)
+        assigned_tags = list(dict.fromkeys(tag_names))
+        tags = {tag.name: tag for tag in Tag.objects.filter(name__in=assigned_tags)}
+        for tag_name in assigned_tags:
+            if tag_name not in tags:
+                # Tag.save() picks a unique slug, so new tags are created individually
+                tags[tag_name] = Tag.objects.create(name=tag_name)
+        
+        if tags:
+            execution.customer.tags.add(*tags.values())
         
         return {
             'assigned_tags': assigned_tags
@@ -399,14 +560,12 @@ class WorkflowEngine:
         config = action.action_config
         tag_names = config.get('tags', [])
         
-        removed_tags = []
-        for tag_name in tag_names:
-            try:
-                tag = Tag.objects.get(name=tag_name)
-                execution.customer.tags.remove(tag)
-                removed_tags.append(tag_name)
-            except Tag.DoesNotExist:
-                pass
+        tags = list(Tag.objects.filter(name__in=tag_names))
+        if tags:
+            execution.customer.tags.remove(*tags)
+        
+        found_names = {tag.name for tag in tags}
+        removed_tags = [tag_name for tag_name in tag_names if tag_name in found_names]
         
         return {
             'removed_tags': removed_tags
@@ -415,8 +574,7 @@ class WorkflowEngine:
     @staticmethod
     def _execute_wait(execution: WorkflowExecution, action: WorkflowAction) -> Dict[str, Any]:
         """Execute wait/delay action"""
-        # For immediate execution, we just continue
-        # In production, this would schedule the next action
+        # The delay itself is applied by _schedule_next_action
         return {
             'wait_completed': True,
             'delay_days': action.delay_days,
@@ -424,14 +582,60 @@ class WorkflowEngine:
             'delay_minutes': action.delay_minutes
         }
     
+    # Action handlers keyed by WorkflowAction.action_type
+    _ACTION_HANDLERS = {
+        'create_task': _execute_create_task,
+        'send_email': _execute_send_email,
+        'add_note': _execute_add_note,
+        'update_customer': _execute_update_customer,
+        'send_notification': _execute_send_notification,
+        'create_reminder': _execute_create_reminder,
+        'assign_tag': _execute_assign_tag,
+        'remove_tag': _execute_remove_tag,
+        'wait': _execute_wait,
+    }
+    
     @staticmethod
     def _schedule_next_action(execution: WorkflowExecution, action: WorkflowAction):
         """Schedule the next action after a delay"""
-        # In production, this would use Celery or another task queue
-        # For now, we'll just continue immediately
+        # process_due_executions resumes the workflow once the delay has passed
         execution.current_action += 1
-        execution.save()
-        WorkflowEngine._execute_next_action(execution)
+        execution.next_action_at = timezone.now() + timedelta(
+            days=action.delay_days,
+            hours=action.delay_hours,
+            minutes=action.delay_minutes
+        )
+        execution.save(update_fields=['current_action', 'next_action_at'])
+    
+    @staticmethod
+    def process_due_executions() -> int:
+        """Resume workflow executions whose scheduled delay has passed"""
+        due_executions = WorkflowExecution.objects.filter(
+            status='running',
+            next_action_at__lte=timezone.now()
+        ).select_related('workflow', 'customer', 'triggered_by').prefetch_related(
+            Prefetch('workflow__actions', queryset=WorkflowAction.objects.order_by('action_order'))
+        )
+        
+        resumed_count = 0
+        
+        for execution in due_executions:
+            # Claim the execution by clearing the time we loaded; if an overlapping
+            # run already claimed (or rescheduled) it, nothing matches and we skip it
+            claimed = WorkflowExecution.objects.filter(
+                pk=execution.pk, status='running', next_action_at=execution.next_action_at
+            ).update(next_action_at=None)
+            if not claimed:
+                continue
+            
+            try:
+                execution.next_action_at = None
+                WorkflowEngine._execute_next_action(execution)
+                resumed_count += 1
+            except Exception as e:
+                logger.error(f"Failed to resume workflow execution {execution.pk}: {e}")
+        
+        return resumed_count
 
 
 class TaskManager:
@@ -454,7 +658,7 @@ class TaskManager:
         
         # Track analytics event
         if created_by:
-            AnalyticsEvent.objects.create(
+            AnalyticsEventBuffer.record(
                 customer=customer,
                 event_type='task_created',
                 user=created_by,
@@ -473,51 +677,60 @@ class TaskManager:
         """Mark a task as completed"""
         task.status = 'completed'
         task.completed_at = timezone.now()
-        task.save()
-        
-        # Track analytics event
-        AnalyticsEvent.objects.create(
-            customer=task.customer,
-            event_type='task_completed',
-            user=completed_by,
-            metadata={
-                'task_id': task.pk,
-                'task_title': task.title,
-                'completion_time': task.completed_at.isoformat() if task.completed_at is not None else None
-            }
-        )
-        
-        # Trigger workflows for task completion
-        WorkflowEngine.trigger_workflows(
-            trigger_type='task_completed',
-            customer=task.customer,
-            user=completed_by,
-            context={
-                'task_id': task.pk,
-                'task_title': task.title,
-                'task_priority': task.priority
-            }
-        )
+        task.save(update_fields=['status', 'completed_at', 'updated_at'])
+        
+        with AnalyticsEventBuffer():
+            # Track analytics event
+            AnalyticsEventBuffer.record(
+                customer=task.customer,
+                event_type='task_completed',
+                user=completed_by,
+                metadata={
+                    'task_id': task.pk,
+                    'task_title': task.title,
+                    'completion_time': task.completed_at.isoformat() if task.completed_at is not None else None
+                }
+            )
+            
+            # Trigger workflows for task completion
+            WorkflowEngine.trigger_workflows(
+                trigger_type='task_completed',
+                customer=task.customer,
+                user=completed_by,
+                context={
+                    'task_id': task.pk,
+                    'task_title': task.title,
+                    'task_priority': task.priority
+                }
+            )
         
         return task
     
+    # Columns task lists show, including the customer and assignee they join
+    LIST_FIELDS = (
+        'id', 'title', 'description', 'priority', 'due_date', 'status', 'customer', 'assigned_to',
+        'customer__first_name', 'customer__last_name', 'customer__email',
+        'assigned_to__username', 'assigned_to__first_name', 'assigned_to__last_name',
+    )
+    
     @staticmethod
-    def get_overdue_tasks():
+    def get_overdue_tasks(now: Optional[timezone.datetime] = None):
         """Get all overdue tasks"""
         return Task.objects.filter(
-            due_date__lt=timezone.now(),
+            due_date__lt=now or timezone.now(),
             status__in=['pending', 'in_progress']
-        )
+        ).select_related('customer', 'assigned_to').only(*TaskManager.LIST_FIELDS)
     
     @staticmethod
-    def get_tasks_due_soon(days: int = 3):
+    def get_tasks_due_soon(days: int = 3, now: Optional[timezone.datetime] = None):
         """Get tasks due within specified days"""
-        due_date_threshold = timezone.now() + timedelta(days=days)
+        now = now or timezone.now()
+        due_date_threshold = now + timedelta(days=days)
         return Task.objects.filter(
             due_date__lte=due_date_threshold,
-            due_date__gte=timezone.now(),
+            due_date__gte=now,
             status__in=['pending', 'in_progress']
-        )
+        ).select_related('customer', 'assigned_to').only(*TaskManager.LIST_FIELDS)
 
 
 class ReminderManager:
@@ -526,32 +739,65 @@ class ReminderManager:
     @staticmethod
     def process_pending_reminders():
         """Process and send pending reminders"""
+        now = timezone.now()
         pending_reminders = Reminder.objects.filter(
-            remind_at__lte=timezone.now(),
+            remind_at__lte=now,
             is_sent=False
-        )
+        ).select_related('customer', 'task', 'user').order_by('pk')
         
-        processed_count = 0
+        sent_count = 0
+        last_pk = 0
         
-        for reminder in pending_reminders:
-            try:
-                # Send reminder notification (email, SMS, etc.)
-                ReminderManager._send_reminder_notification(reminder)
+        # Share one mail session across the run, opened only once something is due
+        connection = None
+        try:
+            while True:
+                batch = list(pending_reminders.filter(pk__gt=last_pk)[:REMINDER_BATCH_SIZE])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
                 
-                # Mark as sent
-                reminder.is_sent = True
-                reminder.sent_at = timezone.now()
-                reminder.save()
+                if connection is None:
+                    connection = ReminderManager._open_mail_connection()
                 
-                processed_count += 1
+                sent = []
+                for reminder in batch:
+                    try:
+                        # Send reminder notification (email, SMS, etc.)
+                        ReminderManager._send_reminder_notification(reminder, connection=connection)
+                        reminder.is_sent = True
+                        reminder.sent_at = timezone.now()
+                        sent.append(reminder)
+                        
+                    except Exception as e:
+                        logger.error(f"Failed to send reminder {reminder.pk}: {e}")
                 
-            except Exception as e:
-                logger.error(f"Failed to send reminder {reminder.pk}: {e}")
+                # Record each chunk before fetching the next, so a crash re-sends at most one chunk
+                if sent:
+                    Reminder.objects.bulk_update(sent, ['is_sent', 'sent_at'])
+                sent_count += len(sent)
+                
+                if len(batch) < REMINDER_BATCH_SIZE:
+                    break
+        finally:
+            if connection is not None:
+                connection.close()
         
-        return processed_count
+        return sent_count
     
     @staticmethod
-    def _send_reminder_notification(reminder: Reminder):
+    def _open_mail_connection():
+        """Open a shared mail session, or return None so each reminder sends on its own"""
+        try:
+            connection = get_connection()
+            connection.open()
+            return connection
+        except Exception as e:
+            logger.error(f"Failed to open mail connection for reminders: {e}")
+            return None
+
+    @staticmethod
+    def _send_reminder_notification(reminder: Reminder, connection=None):
         """Send reminder notification"""
         subject = f"Reminder: {reminder.title}"
         message = f"""
@@ -570,7 +816,8 @@ class ReminderManager:
             message=message,
             from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[reminder.user.email],
-            fail_silently=False
+            fail_silently=False,
+            connection=connection
         )
 
 
@@ -3,8 +3,13 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse, HttpResponse
 from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.core.cache import cache
 from django.core.paginator import Paginator
-from django.db.models import Q, Count, Avg
+from django.db import transaction
+from django.db.models import Q, F, Count, Avg, Max, ExpressionWrapper, DurationField
+from django.db.models.functions import TruncDate
 from datetime import timedelta, datetime
 import json
 
@@ -13,33 +18,70 @@ from .models import (
     WorkflowTemplate, WorkflowAction, WorkflowExecution, Task, 
     Reminder, AnalyticsEvent
 )
-from .task_automation import WorkflowEngine, TaskManager
+from .task_automation import ACTIVE_TRIGGER_TYPES_CACHE_KEY, WorkflowEngine, TaskManager
+from .simple_task_views import (
+    TASK_DASHBOARD_STATS_CACHE_KEY, TASK_DASHBOARD_STATS_CACHE_TIMEOUT, WORKFLOW_ANALYTICS_MAX_AGE,
+    task_dashboard_stats, cached_task_breakdown_stats, cached_workflow_analytics_payload
+)
+from .utils import payload_etag
+
+
+# Task creation chart is the same for every user, so share it per day
+TASK_CREATION_CHART_CACHE_KEY = 'task_analytics:creation_chart:{}'
+TASK_CREATION_CHART_CACHE_TIMEOUT = 300
+
+
+def task_creation_chart(now):
+    """JSON list of tasks created on each of the last 30 days, newest first"""
+    thirty_days_ago = now - timedelta(days=30)
+    recent_tasks = Task.objects.filter(created_at__gte=thirty_days_ago)
+    
+    # Daily task creation, counted in one grouped query
+    daily_counts = {
+        row['day']: row['count']
+        for row in recent_tasks.annotate(day=TruncDate('created_at')).values('day').annotate(
+            count=Count('id')
+        ).order_by('day')
+    }
+    task_creation_data = []
+    for i in range(30):
+        date = now.date() - timedelta(days=i)
+        task_creation_data.append({
+            'date': date.strftime('%Y-%m-%d'),
+            'count': daily_counts.get(date, 0)
+        })
+    return json.dumps(task_creation_data)
 
 
 @login_required
 def task_dashboard(request):
     """Task automation dashboard"""
+    now = timezone.now()
+    
     # Get user's assigned tasks
-    assigned_tasks = Task.objects.filter(assigned_to=request.user).order_by('-created_at')[:10]
+    assigned_tasks = Task.objects.filter(assigned_to=request.user).select_related('customer').order_by('-created_at')[:10]
     
     # Get recent workflow executions
-    recent_executions = WorkflowExecution.objects.order_by('-started_at')[:10]
+    recent_executions = WorkflowExecution.objects.select_related('workflow', 'customer').order_by('-started_at')[:10]
     
     # Get overdue tasks
-    overdue_tasks = TaskManager.get_overdue_tasks()[:5]
+    overdue_tasks = TaskManager.get_overdue_tasks(now)[:5]
     
     # Get tasks due soon
-    upcoming_tasks = TaskManager.get_tasks_due_soon()[:5]
-    
-    # Task statistics
-    total_tasks = Task.objects.count()
-    completed_tasks = Task.objects.filter(status='completed').count()
-    overdue_count = TaskManager.get_overdue_tasks().count()
+    upcoming_tasks = TaskManager.get_tasks_due_soon(now=now)[:5]
     
-    # Workflow statistics
-    active_workflows = WorkflowTemplate.objects.filter(is_active=True).count()
-    total_executions = WorkflowExecution.objects.count()
-    successful_executions = WorkflowExecution.objects.filter(status='completed').count()
+    # Task and workflow statistics, shared briefly across requests like the simple dashboard
+    stats = cache.get_or_set(
+        TASK_DASHBOARD_STATS_CACHE_KEY,
+        lambda: task_dashboard_stats(now),
+        TASK_DASHBOARD_STATS_CACHE_TIMEOUT
+    )
+    total_tasks = stats['total_tasks']
+    completed_tasks = stats['completed_tasks']
+    overdue_count = stats['overdue_count']
+    active_workflows = stats['active_workflows']
+    total_executions = stats['total_executions']
+    successful_executions = stats['successful_executions']
     
     context = {
         'assigned_tasks': assigned_tasks,
@@ -62,7 +104,10 @@ def task_dashboard(request):
 @login_required
 def workflow_list(request):
     """List all workflow templates"""
-    workflows = WorkflowTemplate.objects.annotate(
+    workflows = WorkflowTemplate.objects.select_related('created_by').only(
+        'name', 'description', 'trigger_type', 'is_active', 'created_at',
+        'created_by__username', 'created_by__first_name', 'created_by__last_name',
+    ).annotate(
         execution_count=Count('workflowexecution'),
         success_count=Count('workflowexecution', filter=Q(workflowexecution__status='completed'))
     ).order_by('-created_at')
@@ -82,18 +127,23 @@ def workflow_list(request):
 @login_required
 def workflow_detail(request, pk):
     """Workflow template detail view"""
-    workflow = get_object_or_404(WorkflowTemplate, pk=pk)
+    workflow = get_object_or_404(WorkflowTemplate.objects.select_related('created_by'), pk=pk)
     
     # Get workflow actions
     actions = workflow.actions.all().order_by('action_order')
     
     # Get recent executions
-    executions = workflow.workflowexecution_set.order_by('-started_at')[:20]
+    executions = workflow.workflowexecution_set.select_related('customer', 'triggered_by').order_by('-started_at')[:20]
     
     # Execution statistics
-    total_executions = workflow.workflowexecution_set.count()
-    successful_executions = workflow.workflowexecution_set.filter(status='completed').count()
-    failed_executions = workflow.workflowexecution_set.filter(status='failed').count()
+    execution_stats = workflow.workflowexecution_set.aggregate(
+        total=Count('id'),
+        successful=Count('id', filter=Q(status='completed')),
+        failed=Count('id', filter=Q(status='failed')),
+    )
+    total_executions = execution_stats['total']
+    successful_executions = execution_stats['successful']
+    failed_executions = execution_stats['failed']
     
     context = {
         'workflow': workflow,
@@ -156,14 +206,17 @@ def workflow_edit(request, pk):
 @login_required
 def workflow_toggle_active(request, pk):
     """Toggle workflow active status"""
-    workflow = get_object_or_404(WorkflowTemplate, pk=pk)
-    workflow.is_active = not workflow.is_active
-    workflow.save()
+    with transaction.atomic():
+        WorkflowTemplate.objects.filter(pk=pk).update(is_active=~F('is_active'), updated_at=timezone.now())
+        name, is_active = get_object_or_404(WorkflowTemplate.objects.values_list('name', 'is_active'), pk=pk)
     
-    status = 'activated' if workflow.is_active else 'deactivated'
-    messages.success(request, f'Workflow "{workflow.name}" {status}!')
+    # update() skips the post_save signal that normally drops this cache
+    cache.delete(ACTIVE_TRIGGER_TYPES_CACHE_KEY)
     
-    return redirect('analytics:workflow_detail', pk=workflow.pk)
+    status = 'activated' if is_active else 'deactivated'
+    messages.success(request, f'Workflow "{name}" {status}!')
+    
+    return redirect('analytics:workflow_detail', pk=pk)
 
 
 @login_required
@@ -177,11 +230,15 @@ def workflow_action_create(request, workflow_pk):
             action = form.save(commit=False)
             action.workflow = workflow
             
-            # Set action order
-            last_action = workflow.actions.order_by('-action_order').first()
-            action.action_order = (last_action.action_order + 1) if last_action else 1
-            
-            action.save()
+            with transaction.atomic():
+                # Lock the workflow so concurrent requests can't claim the same action order
+                WorkflowTemplate.objects.select_for_update().only('pk').get(pk=workflow.pk)
+                
+                # Set action order
+                last_order = workflow.actions.aggregate(last_order=Max('action_order'))['last_order']
+                action.action_order = (last_order or 0) + 1
+                
+                action.save()
             messages.success(request, 'Action added to workflow!')
             return redirect('analytics:workflow_detail', pk=workflow.pk)
     else:
@@ -215,12 +272,9 @@ def workflow_execute_manual(request, pk):
         except Customer.DoesNotExist:
             messages.error(request, 'Customer not found!')
     
-    # Get recent customers for selection
-    customers = Customer.objects.order_by('-created_at')[:20]
-    
+    # Customers are picked on demand through the customer_search endpoint
     context = {
         'workflow': workflow,
-        'customers': customers,
     }
     
     return render(request, 'analytics/workflow_execute_manual.html', context)
@@ -229,10 +283,13 @@ def workflow_execute_manual(request, pk):
 @login_required
 def workflow_execution_detail(request, pk):
     """Workflow execution detail view"""
-    execution = get_object_or_404(WorkflowExecution, pk=pk)
+    execution = get_object_or_404(
+        WorkflowExecution.objects.select_related('workflow', 'customer', 'triggered_by'),
+        pk=pk
+    )
     
     # Get action executions
-    action_executions = execution.action_executions.order_by('started_at')
+    action_executions = execution.action_executions.select_related('action').order_by('started_at')
     
     context = {
         'execution': execution,
@@ -245,9 +302,15 @@ def workflow_execution_detail(request, pk):
 @login_required
 def task_list(request):
     """List all tasks with filtering"""
-    tasks = Task.objects.select_related('customer', 'assigned_to', 'created_by').order_by('-created_at')
+    tasks = Task.objects.select_related('customer', 'assigned_to', 'created_by').only(
+        'title', 'status', 'priority', 'due_date', 'completed_at', 'created_at', 'is_automated',
+        'customer__first_name', 'customer__last_name',
+        'assigned_to__username', 'assigned_to__first_name', 'assigned_to__last_name',
+        'created_by__username', 'created_by__first_name', 'created_by__last_name',
+    ).order_by('-created_at')
     
     # Apply filters
+    now = timezone.now()
     filter_form = TaskFilterForm(request.GET)
     if filter_form.is_valid():
         if filter_form.cleaned_data.get('status'):
@@ -263,11 +326,11 @@ def task_list(request):
             tasks = tasks.filter(customer=filter_form.cleaned_data['customer'])
         
         if filter_form.cleaned_data.get('overdue_only'):
-            tasks = tasks.filter(due_date__lt=timezone.now(), status__in=['pending', 'in_progress'])
+            tasks = tasks.filter(due_date__lt=now, status__in=['pending', 'in_progress'])
         
         if filter_form.cleaned_data.get('due_soon_only'):
-            due_soon = timezone.now() + timedelta(days=3)
-            tasks = tasks.filter(due_date__lte=due_soon, due_date__gte=timezone.now())
+            due_soon = now + timedelta(days=3)
+            tasks = tasks.filter(due_date__lte=due_soon, due_date__gte=now)
     
     paginator = Paginator(tasks, 20)
     page_number = request.GET.get('page')
@@ -285,10 +348,13 @@ def task_list(request):
 @login_required
 def task_detail(request, pk):
     """Task detail view"""
-    task = get_object_or_404(Task, pk=pk)
+    task = get_object_or_404(
+        Task.objects.select_related('customer', 'assigned_to', 'created_by', 'workflow_execution'),
+        pk=pk
+    )
     
     # Get task comments
-    comments = task.comments.order_by('-created_at')
+    comments = task.comments.select_related('author').order_by('-created_at')
     
     context = {
         'task': task,
@@ -369,13 +435,15 @@ def task_edit(request, pk):
 @login_required
 def task_complete(request, pk):
     """Mark task as completed"""
-    task = get_object_or_404(Task, pk=pk)
-    
-    if task.status != 'completed':
-        TaskManager.complete_task(task, request.user)
-        messages.success(request, f'Task "{task.title}" marked as completed!')
-    else:
-        messages.info(request, 'Task is already completed.')
+    with transaction.atomic():
+        # Lock the task so concurrent clicks can't both record a completion
+        task = get_object_or_404(Task.objects.select_related('customer').select_for_update(of=('self',)), pk=pk)
+        
+        if task.status != 'completed':
+            TaskManager.complete_task(task, request.user)
+            messages.success(request, f'Task "{task.title}" marked as completed!')
+        else:
+            messages.info(request, 'Task is already completed.')
     
     return redirect('analytics:task_detail', pk=task.pk)
 
@@ -383,14 +451,21 @@ def task_complete(request, pk):
 @login_required
 def task_analytics(request):
     """Task analytics and reporting"""
-    # Task completion analytics
-    total_tasks = Task.objects.count()
-    completed_tasks = Task.objects.filter(status='completed').count()
-    pending_tasks = Task.objects.filter(status='pending').count()
-    in_progress_tasks = Task.objects.filter(status='in_progress').count()
-    
-    # Overdue tasks
-    overdue_tasks = TaskManager.get_overdue_tasks().count()
+    now = timezone.now()
+    
+    # Task completion and overdue counts in a single pass
+    task_counts = Task.objects.aggregate(
+        total=Count('id'),
+        completed=Count('id', filter=Q(status='completed')),
+        pending=Count('id', filter=Q(status='pending')),
+        in_progress=Count('id', filter=Q(status='in_progress')),
+        overdue=Count('id', filter=Q(due_date__lt=now, status__in=['pending', 'in_progress'])),
+    )
+    total_tasks = task_counts['total']
+    completed_tasks = task_counts['completed']
+    pending_tasks = task_counts['pending']
+    in_progress_tasks = task_counts['in_progress']
+    overdue_tasks = task_counts['overdue']
     
     # Average completion time
     completed_with_times = Task.objects.filter(
@@ -398,35 +473,20 @@ def task_analytics(request):
         completed_at__isnull=False
     )
     
-    avg_completion_time = None
-    if completed_with_times.exists():
-        total_time = sum([
-            (task.completed_at - task.created_at).total_seconds() 
-            for task in completed_with_times
-        ])
-        avg_completion_time = total_time / completed_with_times.count() / 3600  # Convert to hours
-    
-    # Task distribution by priority
-    priority_stats = Task.objects.values('priority').annotate(count=Count('id'))
-    
-    # Task distribution by assigned user
-    user_stats = Task.objects.values('assigned_to__username').annotate(
-        count=Count('id')
-    ).order_by('-count')[:10]
+    avg_duration = completed_with_times.aggregate(
+        avg=Avg(ExpressionWrapper(F('completed_at') - F('created_at'), output_field=DurationField()))
+    )['avg']
+    avg_completion_time = avg_duration.total_seconds() / 3600 if avg_duration is not None else None  # Convert to hours
     
-    # Recent task trends (last 30 days)
-    thirty_days_ago = timezone.now() - timedelta(days=30)
-    recent_tasks = Task.objects.filter(created_at__gte=thirty_days_ago)
+    # Task distribution by priority and by assigned user
+    breakdown = cached_task_breakdown_stats()
     
-    # Daily task creation for charts
-    task_creation_data = []
-    for i in range(30):
-        date = timezone.now().date() - timedelta(days=i)
-        count = recent_tasks.filter(created_at__date=date).count()
-        task_creation_data.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'count': count
-        })
+    # Recent task trends (last 30 days) for charts
+    task_creation_data = cache.get_or_set(
+        TASK_CREATION_CHART_CACHE_KEY.format(now.date().isoformat()),
+        lambda: task_creation_chart(now),
+        TASK_CREATION_CHART_CACHE_TIMEOUT
+    )
     
     context = {
         'total_tasks': total_tasks,
@@ -436,9 +496,9 @@ def task_analytics(request):
         'overdue_tasks': overdue_tasks,
         'completion_rate': round((completed_tasks / total_tasks * 100) if total_tasks > 0 else 0, 1),
         'avg_completion_time': round(avg_completion_time, 1) if avg_completion_time else None,
-        'priority_stats': list(priority_stats),
-        'user_stats': list(user_stats),
-        'task_creation_data': json.dumps(task_creation_data),
+        'priority_stats': breakdown['priority_stats'],
+        'user_stats': breakdown['user_stats'],
+        'task_creation_data': task_creation_data,
     }
     
     return render(request, 'analytics/task_analytics.html', context)
@@ -447,14 +507,19 @@ def task_analytics(request):
 @login_required
 def reminder_list(request):
     """List all reminders"""
-    reminders = Reminder.objects.select_related('customer', 'user').order_by('-remind_at')
+    reminders = Reminder.objects.select_related('customer', 'user').only(
+        'title', 'description', 'remind_at', 'is_sent', 'sent_at', 'created_at',
+        'customer__first_name', 'customer__last_name',
+        'user__username', 'user__first_name', 'user__last_name',
+    ).order_by('-remind_at')
     
     # Filter options
+    now = timezone.now()
     filter_type = request.GET.get('filter', 'all')
     if filter_type == 'pending':
-        reminders = reminders.filter(is_sent=False, remind_at__lte=timezone.now())
+        reminders = reminders.filter(is_sent=False, remind_at__lte=now)
     elif filter_type == 'upcoming':
-        reminders = reminders.filter(is_sent=False, remind_at__gt=timezone.now())
+        reminders = reminders.filter(is_sent=False, remind_at__gt=now)
     elif filter_type == 'sent':
         reminders = reminders.filter(is_sent=True)
     
@@ -523,13 +588,13 @@ def task_status_update(request):
         new_status = request.POST.get('status')
         
         try:
-            task = Task.objects.get(pk=task_id)
-            
-            if new_status == 'completed' and task.status != 'completed':
-                TaskManager.complete_task(task, request.user)
-            else:
-                task.status = new_status
-                task.save()
+            if new_status == 'completed':
+                # Completion records an event and fires workflows, so it needs the task itself
+                task = Task.objects.select_related('customer').get(pk=task_id)
+                if task.status != 'completed':
+                    TaskManager.complete_task(task, request.user)
+            elif not Task.objects.filter(pk=task_id).update(status=new_status, updated_at=timezone.now()):
+                raise Task.DoesNotExist
             
             return JsonResponse({'success': True, 'message': 'Task status updated!'})
         
@@ -540,26 +605,8 @@ def task_status_update(request):
 
 
 @login_required
+@cache_control(private=True, max_age=WORKFLOW_ANALYTICS_MAX_AGE)
+@condition(etag_func=lambda request: payload_etag(cached_workflow_analytics_payload(request)))
 def workflow_analytics_data(request):
     """AJAX view to get workflow analytics data"""
-    workflows = WorkflowTemplate.objects.annotate(
-        execution_count=Count('workflowexecution'),
-        success_count=Count('workflowexecution', filter=Q(workflowexecution__status='completed')),
-        failure_count=Count('workflowexecution', filter=Q(workflowexecution__status='failed'))
-    )
-    
-    data = []
-    for workflow in workflows:
-        success_rate = 0
-        if workflow.execution_count > 0:
-            success_rate = (workflow.success_count / workflow.execution_count) * 100
-        
-        data.append({
-            'name': workflow.name,
-            'executions': workflow.execution_count,
-            'success_rate': round(success_rate, 1),
-            'success_count': workflow.success_count,
-            'failure_count': workflow.failure_count,
-        })
-    
-    return JsonResponse({'workflows': data})
\ No newline at end of file
+    return JsonResponse({'workflows': cached_workflow_analytics_payload(request)})
\ No newline at end of file
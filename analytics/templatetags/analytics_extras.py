@@ -1,7 +1,20 @@
+from functools import lru_cache
+
 from django import template
 
 register = template.Library()
 
+# Translation table for replace_underscore, applied in a single C-level pass
+UNDERSCORE_TABLE = str.maketrans('_', ' ')
+
+
+@lru_cache(maxsize=128)
+def parse_replace_arg(arg):
+    """Split a replace filter argument into its (old, new) pair, or None"""
+    if ',' in arg:
+        return tuple(arg.split(',', 1))
+    return None
+
 @register.filter
 def replace(value, arg):
     """
@@ -11,8 +24,9 @@ def replace(value, arg):
     if not isinstance(value, str):
         value = str(value)
     
-    if ',' in arg:
-        old, new = arg.split(',', 1)
+    pair = parse_replace_arg(arg)
+    if pair:
+        old, new = pair
         return value.replace(old, new)
     return value
 
@@ -24,4 +38,4 @@ def replace_underscore(value):
     """
     if not isinstance(value, str):
         value = str(value)
-    return value.replace('_', ' ')
\ No newline at end of file
+    return value.translate(UNDERSCORE_TABLE)
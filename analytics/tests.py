@@ -1,3 +1,1715 @@
-from django.test import TestCase
+from django.test import TestCase, Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.core.paginator import Paginator
+from django.db import connection
+from django.http import HttpResponse
+from django.shortcuts import render
+from django.urls import reverse
+from django.utils import timezone
+from datetime import timedelta
+from io import StringIO
+import json
+import sys
+from unittest.mock import MagicMock, patch
 
-# Create your tests here.
+from customers.models import Customer, CustomField, CustomerCustomFieldValue, CustomerFile, CustomerNote, Tag
+from .models import ActionExecution, AnalyticsEvent, CustomerMetrics, DashboardMetric, EmailDelivery, EmailSequence, EmailTemplate, Job, Report, JobUpdate, QuoteRequest, Reminder, Task, WorkflowAction, WorkflowExecution, WorkflowTemplate
+from .email_automation import EmailAutomationEngine
+from .pagination import PKPaginator, WindowCountPaginator
+from .quote_job_automation import QuoteJobAutomationEngine
+from .quote_job_views import job_search_q
+from . import task_views, views
+from .templatetags import analytics_extras
+from .utils import AnalyticsCalculator, track_event
+from .task_automation import ReminderManager, TaskManager, WorkflowEngine, active_trigger_types, compile_trigger_conditions
+
+
+def make_customer(**overrides):
+	data = {
+		'first_name': 'Jane',
+		'last_name': 'Doe',
+		'email': 'jane@example.com',
+		'mobile': '0211234567',
+		'street_address': '1 Queen Street',
+		'suburb': 'CBD',
+		'city': 'Auckland',
+		'postcode': '1010',
+	}
+	data.update(overrides)
+	return Customer.objects.create(**data)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class JobDetailTests(TestCase):
+	def setUp(self):
+		self.client = Client()
+		self.user = User.objects.create_user(username='tester', password='pw')
+		self.customer = make_customer()
+		self.job = Job.objects.create(
+			customer=self.customer,
+			title='Fence repair',
+			description='Replace broken palings',
+			created_by=self.user,
+			assigned_to=self.user,
+		)
+		for i in range(3):
+			JobUpdate.objects.create(
+				job=self.job,
+				title=f'Update {i}',
+				description='Progress',
+				created_by=self.user,
+			)
+
+	def test_job_detail_prefetches_updates_with_authors(self):
+		self.client.force_login(self.user)
+		with patch('analytics.quote_job_views.render', return_value=HttpResponse()) as mock_render:
+			resp = self.client.get(reverse('analytics:job_detail', args=[self.job.pk]))
+		self.assertEqual(resp.status_code, 200)
+		context = mock_render.call_args[0][2]
+		with self.assertNumQueries(0):
+			authors = [update.created_by.username for update in context['updates']]
+			customer_name = context['job'].customer.full_name
+		self.assertEqual(authors, ['tester'] * 3)
+		self.assertEqual(customer_name, 'Jane Doe')
+
+
+class EmailCustomerLookupTests(TestCase):
+	def test_existing_customer_is_reused(self):
+		customer = make_customer(email='known@example.com')
+		with self.assertNumQueries(1):
+			found = QuoteJobAutomationEngine.get_or_create_email_customer('known@example.com')
+		self.assertEqual(found.pk, customer.pk)
+
+	def test_unknown_sender_creates_placeholder_customer(self):
+		created = QuoteJobAutomationEngine.get_or_create_email_customer('new.person@example.com')
+		self.assertEqual(created.first_name, 'New.Person')
+		self.assertEqual(created.postcode, '0000')
+		self.assertEqual(Customer.objects.filter(email='new.person@example.com').count(), 1)
+
+
+class SearchPredicateTests(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='tester', password='pw')
+		self.customer = make_customer(first_name='Aroha', email='aroha@example.com')
+		self.job = Job.objects.create(
+			customer=self.customer,
+			title='Deck staining',
+			description='Two coats',
+			created_by=self.user,
+		)
+
+	def test_job_search_matches_customer_and_number(self):
+		self.assertTrue(Job.objects.filter(job_search_q('aroha')).exists())
+		self.assertTrue(Job.objects.filter(job_search_q(self.job.job_number)).exists())
+		self.assertFalse(Job.objects.filter(job_search_q('nothing-like-this')).exists())
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class JobExportTests(TestCase):
+	def setUp(self):
+		self.client = Client()
+		self.user = User.objects.create_user(username='tester', password='pw')
+		self.customer = make_customer()
+		self.job = Job.objects.create(
+			customer=self.customer,
+			title='Gutter clean',
+			description='Front and back',
+			created_by=self.user,
+		)
+
+	def test_job_export_streams_filtered_rows(self):
+		self.client.force_login(self.user)
+		resp = self.client.get(reverse('analytics:job_export_csv'), {'search': 'gutter'})
+		self.assertEqual(resp.status_code, 200)
+		self.assertTrue(resp.streaming)
+		self.assertIn('attachment;', resp['Content-Disposition'])
+		lines = b''.join(resp.streaming_content).decode().strip().splitlines()
+		self.assertEqual(len(lines), 2)
+		self.assertTrue(lines[0].startswith('Job Number,Title'))
+		self.assertIn(self.job.job_number, lines[1])
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class QuoteDetailTests(TestCase):
+	def setUp(self):
+		self.client = Client()
+		self.user = User.objects.create_user(username='tester', password='pw')
+		self.customer = make_customer()
+		self.quote = QuoteRequest.objects.create(
+			customer=self.customer,
+			title='Roof repaint',
+			description='Two storey',
+			status='approved',
+		)
+		QuoteRequest.objects.create(customer=self.customer, title='Fence', description='Timber')
+
+	def test_quote_detail_annotates_customer_quote_counts(self):
+		self.client.force_login(self.user)
+		with patch('analytics.quote_job_views.render', return_value=HttpResponse()) as mock_render:
+			resp = self.client.get(reverse('analytics:quote_detail', args=[self.quote.pk]))
+		self.assertEqual(resp.status_code, 200)
+		context = mock_render.call_args[0][2]
+		self.assertEqual(context['approved_quotes_count'], 1)
+		self.assertEqual(context['quote'].customer_quotes_count, 2)
+
+
+class ApprovedQuoteCountTests(TestCase):
+	def setUp(self):
+		self.customer = make_customer()
+		self.other = make_customer(email='other@example.com')
+
+	def counts(self):
+		self.customer.refresh_from_db()
+		self.other.refresh_from_db()
+		return self.customer.approved_quote_count, self.other.approved_quote_count
+
+	def test_counter_follows_status_customer_and_delete(self):
+		quote = QuoteRequest.objects.create(customer=self.customer, title='Deck', description='Build')
+		self.assertEqual(self.counts(), (0, 0))
+		quote.status = 'approved'
+		quote.save()
+		quote.save()
+		self.assertEqual(self.counts(), (1, 0))
+		quote.customer = self.other
+		quote.save()
+		self.assertEqual(self.counts(), (0, 1))
+		quote.status = 'rejected'
+		quote.save()
+		self.assertEqual(self.counts(), (0, 0))
+		approved = QuoteRequest.objects.create(customer=self.customer, title='Path', description='Pave', status='approved')
+		self.assertEqual(self.counts(), (1, 0))
+		QuoteRequest.objects.get(pk=approved.pk).delete()
+		self.assertEqual(self.counts(), (0, 0))
+
+	def test_saving_a_stale_customer_keeps_the_counter(self):
+		stale = Customer.objects.get(pk=self.customer.pk)
+		QuoteRequest.objects.create(customer=self.customer, title='Deck', description='Build', status='approved')
+		stale.city = 'Wellington'
+		stale.save()
+		self.assertEqual(self.counts(), (1, 0))
+		self.assertEqual(self.customer.city, 'Wellington')
+
+	def test_saving_a_deferred_customer_writes_only_loaded_fields(self):
+		partial = Customer.objects.only('id', 'first_name').get(pk=self.customer.pk)
+		partial.first_name = 'Janet'
+		with self.assertNumQueries(1) as queries:
+			partial.save()
+		self.assertNotIn('"city"', queries.captured_queries[0]['sql'])
+		self.assertEqual(Customer.objects.get(pk=self.customer.pk).first_name, 'Janet')
+
+	def test_saving_after_a_concurrent_delete_recreates_the_row(self):
+		Customer.objects.filter(pk=self.customer.pk).delete()
+		self.customer.city = 'Napier'
+		self.customer.save()
+		self.assertEqual(Customer.objects.get(pk=self.customer.pk).city, 'Napier')
+
+	def test_recount_catches_up_with_bulk_writes(self):
+		QuoteRequest.objects.bulk_create([
+			QuoteRequest(customer=self.customer, title=f'Job {index}', description='Bulk', status='approved', reference_number=f'QR-BULK-{index}')
+			for index in range(2)
+		])
+		QuoteRequest.objects.filter(title='Job 1').update(customer=self.other)
+		self.assertEqual(self.counts(), (0, 0))
+		out = StringIO()
+		call_command('recalculate_quote_counts', stdout=out)
+		self.assertIn('Recounted approved quotes for 2 customers', out.getvalue())
+		self.assertEqual(self.counts(), (1, 1))
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class TaskDashboardTests(TestCase):
+	def setUp(self):
+		self.client = Client()
+		self.user = User.objects.create_user(username='tester', password='pw')
+		customer = make_customer()
+		past = timezone.now() - timedelta(days=1)
+		Task.objects.create(title='Call', customer=customer, created_by=self.user, status='completed')
+		Task.objects.create(title='Email', customer=customer, created_by=self.user, due_date=past)
+		Task.objects.create(title='Visit', customer=customer, created_by=self.user, status='in_progress')
+		cache.clear()
+
+	def test_task_stats_are_aggregated(self):
+		self.client.force_login(self.user)
+		with patch('analytics.simple_task_views.render', return_value=HttpResponse()) as mock_render:
+			self.client.get(reverse('analytics:task_analytics'))
+		context = mock_render.call_args[0][2]
+		self.assertEqual(context['total_tasks'], 3)
+		self.assertEqual(context['completed_tasks'], 1)
+		self.assertEqual(context['pending_tasks'], 1)
+		self.assertEqual(context['in_progress_tasks'], 1)
+		self.assertEqual(context['overdue_tasks'], 1)
+		self.assertEqual(context['completion_rate'], 33.3)
+
+	def analytics_context(self):
+		with patch('analytics.simple_task_views.render', return_value=HttpResponse()) as mock_render:
+			self.client.get(reverse('analytics:task_analytics'))
+		return mock_render.call_args[0][2]
+
+	def test_breakdowns_are_served_from_cache(self):
+		self.client.force_login(self.user)
+		self.assertEqual(self.analytics_context()['priority_stats'], [{'priority': 'medium', 'count': 3}])
+		Task.objects.create(title='Urgent', customer=Customer.objects.get(), created_by=self.user, priority='high')
+		with CaptureQueriesContext(connection) as queries:
+			context = self.analytics_context()
+		self.assertFalse(any('GROUP BY' in q['sql'] for q in queries.captured_queries))
+		self.assertEqual(context['user_stats'], [{'assigned_to__username': None, 'count': 3}])
+
+		# The refresh command picks up the new task for the next page load
+		call_command('refresh_task_analytics', stdout=StringIO())
+		priorities = {row['priority']: row['count'] for row in self.analytics_context()['priority_stats']}
+		self.assertEqual(priorities, {'medium': 3, 'high': 1})
+
+
+class WorkflowAnalyticsDataTests(TestCase):
+	def setUp(self):
+		self.client = Client()
+		self.user = User.objects.create_user(username='tester', password='pw')
+		customer = make_customer()
+		busy = WorkflowTemplate.objects.create(name='Onboarding', created_by=self.user)
+		WorkflowTemplate.objects.create(name='Unused', created_by=self.user)
+		for status in ('completed', 'completed', 'failed', 'running'):
+			WorkflowExecution.objects.create(workflow=busy, customer=customer, triggered_by=self.user, status=status)
+		cache.clear()
+
+	def test_counts_are_grouped_per_workflow(self):
+		self.client.force_login(self.user)
+		with self.assertNumQueries(4):
+			resp = self.client.get(reverse('analytics:workflow_analytics_data'))
+		workflows = {w['name']: w for w in resp.json()['workflows']}
+		self.assertEqual(workflows['Onboarding']['executions'], 4)
+		self.assertEqual(workflows['Onboarding']['success_count'], 2)
+		self.assertEqual(workflows['Onboarding']['failure_count'], 1)
+		self.assertEqual(workflows['Onboarding']['success_rate'], 50.0)
+		self.assertEqual(workflows['Unused']['executions'], 0)
+		self.assertEqual(resp['Cache-Control'], 'private, max-age=30')
+
+	def test_payload_is_cached_until_a_workflow_changes(self):
+		self.client.force_login(self.user)
+		first = self.client.get(reverse('analytics:workflow_analytics_data')).json()
+		with self.assertNumQueries(3):
+			self.assertEqual(self.client.get(reverse('analytics:workflow_analytics_data')).json(), first)
+		WorkflowTemplate.objects.create(name='Fresh', created_by=self.user)
+		names = [w['name'] for w in self.client.get(reverse('analytics:workflow_analytics_data')).json()['workflows']]
+		self.assertIn('Fresh', names)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class TaskDashboardQueryTests(TestCase):
+	def setUp(self):
+		self.client = Client()
+		self.user = User.objects.create_user(username='tester', password='pw')
+		workflow = WorkflowTemplate.objects.create(name='Onboarding', created_by=self.user)
+		for i in range(3):
+			customer = make_customer(email=f'c{i}@example.com')
+			Task.objects.create(title=f'Task {i}', customer=customer, created_by=self.user, assigned_to=self.user)
+			WorkflowExecution.objects.create(workflow=workflow, customer=customer, triggered_by=self.user)
+		cache.clear()
+
+	def test_dashboard_lists_do_not_query_per_row(self):
+		self.client.force_login(self.user)
+		with patch('analytics.simple_task_views.render', return_value=HttpResponse()) as mock_render:
+			self.client.get(reverse('analytics:task_dashboard'))
+		context = mock_render.call_args[0][2]
+		tasks = list(context['assigned_tasks'])
+		executions = list(context['recent_executions'])
+		with self.assertNumQueries(0):
+			[task.customer.full_name for task in tasks]
+			[(execution.workflow.name, execution.customer.full_name) for execution in executions]
+
+
+class PKPaginatorTests(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='tester', password='pw')
+		customer = make_customer()
+		for i in range(7):
+			Task.objects.create(title=f'Task {i}', customer=customer, created_by=self.user, priority=['low', 'high'][i % 2])
+
+	def test_pages_match_stock_paginator(self):
+		tasks = Task.objects.select_related('customer').order_by('priority', '-title')
+		stock = Paginator(tasks, 3)
+		paginator = PKPaginator(tasks, 3)
+		self.assertEqual(paginator.count, 7)
+		for number in stock.page_range:
+			self.assertEqual(list(paginator.page(number)), list(stock.page(number)))
+
+	def test_page_rows_keep_selected_relations(self):
+		page = PKPaginator(Task.objects.select_related('customer').order_by('title'), 3).page(2)
+		with self.assertNumQueries(0):
+			names = [task.customer.full_name for task in page]
+		self.assertEqual(names, ['Jane Doe'] * 3)
+
+
+class WindowCountPaginatorTests(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='tester', password='pw')
+		customer = make_customer()
+		for i in range(7):
+			Task.objects.create(title=f'Task {i}', customer=customer, created_by=self.user)
+		self.tasks = Task.objects.select_related('customer').order_by('title')
+
+	def test_total_comes_from_page_query(self):
+		paginator = WindowCountPaginator(self.tasks, 3)
+		with self.assertNumQueries(2):
+			page = paginator.get_page(2)
+			self.assertEqual(paginator.count, 7)
+			self.assertEqual(paginator.num_pages, 3)
+		self.assertEqual([task.title for task in page], ['Task 3', 'Task 4', 'Task 5'])
+
+	def test_matches_stock_paginator_with_orphans_and_bad_numbers(self):
+		for number in (1, 2, 3, 9, 'x', 0):
+			stock = Paginator(self.tasks, 3, orphans=1).get_page(number)
+			page = WindowCountPaginator(self.tasks, 3, orphans=1).get_page(number)
+			self.assertEqual(list(page), list(stock))
+			self.assertEqual(page.number, stock.number)
+
+
+class EmailWebhookTests(TestCase):
+	def test_invalid_json_is_rejected(self):
+		resp = self.client.post(reverse('analytics:webhook_email_received'), data=b'{not json', content_type='application/json')
+		self.assertEqual(resp.status_code, 400)
+
+	def test_html_body_used_when_text_missing(self):
+		payload = {'from': {'email': 'sender@example.com'}, 'subject': 'Quote please', 'html': '<p>Need a fence</p>'}
+		with patch('analytics.quote_job_views.QuoteJobAutomationEngine.process_incoming_email', return_value=None) as mock_process:
+			resp = self.client.post(reverse('analytics:webhook_email_received'), data=payload, content_type='application/json')
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(mock_process.call_args.kwargs['body'], '<p>Need a fence</p>')
+
+
+class CustomerSearchTests(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='tester', password='pw')
+		make_customer(first_name='Aroha', last_name='Ngata', email='aroha@example.com')
+		make_customer(first_name='Ben', last_name='Smith', email='ben@example.com')
+
+	def test_search_returns_matching_customers(self):
+		self.client.force_login(self.user)
+		resp = self.client.get(reverse('analytics:customer_search'), {'q': 'aro'})
+		self.assertEqual([r['text'] for r in resp.json()['results']], ['Aroha Ngata (aroha@example.com)'])
+
+	def test_empty_query_returns_nothing(self):
+		self.client.force_login(self.user)
+		resp = self.client.get(reverse('analytics:customer_search'))
+		self.assertEqual(resp.json()['results'], [])
+
+
+class StatsApiTests(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='tester', password='pw')
+		self.customer = make_customer()
+		cache.clear()
+
+	def test_quote_stats_single_query(self):
+		QuoteRequest.objects.create(customer=self.customer, title='A', description='x', status='accepted')
+		QuoteRequest.objects.create(customer=self.customer, title='B', description='x', status='quoted', final_quote_amount=250)
+		QuoteRequest.objects.create(customer=self.customer, title='C', description='x', status='received')
+		self.client.force_login(self.user)
+		with self.assertNumQueries(3):
+			data = self.client.get(reverse('analytics:quote_stats_api')).json()
+		self.assertEqual(data, {
+			'total_quotes': 3,
+			'pending_quotes': 1,
+			'quoted_amount': 250.0,
+			'accepted_quotes': 1,
+			'conversion_rate': 33.3,
+		})
+
+	def test_job_stats(self):
+		Job.objects.create(customer=self.customer, title='A', description='x', created_by=self.user, status='completed', completed_date=timezone.now(), final_amount=400)
+		Job.objects.create(customer=self.customer, title='B', description='x', created_by=self.user, status='pending', due_date=timezone.now() - timedelta(days=1))
+		self.client.force_login(self.user)
+		data = self.client.get(reverse('analytics:job_stats_api')).json()
+		self.assertEqual(data, {
+			'total_jobs': 2,
+			'active_jobs': 1,
+			'completed_jobs': 1,
+			'overdue_jobs': 1,
+			'total_revenue': 400.0,
+		})
+
+	def test_stats_are_served_from_cache(self):
+		self.client.force_login(self.user)
+		first = self.client.get(reverse('analytics:quote_stats_api')).json()
+		QuoteRequest.objects.create(customer=self.customer, title='D', description='x')
+		with self.assertNumQueries(2):
+			self.assertEqual(self.client.get(reverse('analytics:quote_stats_api')).json(), first)
+		self.assertEqual(self.client.get(reverse('analytics:quote_stats_api'), {'days': 7}).json()['total_quotes'], 1)
+
+	def test_unchanged_stats_answer_conditional_get_with_304(self):
+		self.client.force_login(self.user)
+		etag = self.client.get(reverse('analytics:job_stats_api'))['ETag']
+		resp = self.client.get(reverse('analytics:job_stats_api'), HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(resp.status_code, 304)
+		cache.clear()
+		Job.objects.create(customer=self.customer, title='New', description='x', created_by=self.user)
+		resp = self.client.get(reverse('analytics:job_stats_api'), HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(resp.status_code, 200)
+
+
+class WorkflowActionCreateTests(TestCase):
+	def test_actions_are_appended_in_order(self):
+		user = User.objects.create_user(username='tester', password='pw')
+		workflow = WorkflowTemplate.objects.create(name='Onboarding', created_by=user)
+		self.client.force_login(user)
+		url = reverse('analytics:workflow_action_create', args=[workflow.pk])
+		for _ in range(2):
+			self.client.post(url, {'action_type': 'send_email', 'action_config': '{}'})
+		self.assertEqual(list(workflow.actions.order_by('action_order').values_list('action_order', flat=True)), [1, 2])
+
+
+class WorkflowActionReorderTests(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='tester', password='pw')
+		self.workflow = WorkflowTemplate.objects.create(name='Onboarding', created_by=self.user)
+		self.actions = [
+			WorkflowAction.objects.create(workflow=self.workflow, action_type=action_type, action_order=order)
+			for action_type, order in (('send_email', 1), ('wait', 2), ('add_note', 5))
+		]
+		self.url = reverse('analytics:workflow_action_reorder', args=[self.workflow.pk])
+		self.client.force_login(self.user)
+
+	def test_actions_are_renumbered_without_per_row_saves(self):
+		new_order = [self.actions[2].pk, self.actions[0].pk, self.actions[1].pk]
+		# Session, user, workflow, savepoint, lock, running check, current orders, two UPDATEs however many actions there are, release
+		with self.assertNumQueries(10):
+			resp = self.client.post(self.url, {'action_ids': new_order})
+		self.assertTrue(resp.json()['success'])
+		self.assertEqual(
+			list(self.workflow.actions.values_list('action_type', 'action_order')),
+			[('add_note', 1), ('send_email', 2), ('wait', 3)],
+		)
+
+	def test_partial_action_list_is_rejected(self):
+		resp = self.client.post(self.url, {'action_ids': [self.actions[1].pk, self.actions[0].pk]})
+		self.assertFalse(resp.json()['success'])
+		self.assertEqual(list(self.workflow.actions.values_list('action_order', flat=True)), [1, 2, 5])
+
+	def test_zero_and_negative_orders_are_shifted_clear(self):
+		WorkflowAction.objects.filter(pk=self.actions[0].pk).update(action_order=0)
+		WorkflowAction.objects.filter(pk=self.actions[1].pk).update(action_order=-3)
+		new_order = [self.actions[1].pk, self.actions[2].pk, self.actions[0].pk]
+		self.assertTrue(self.client.post(self.url, {'action_ids': new_order}).json()['success'])
+		self.assertEqual(
+			list(self.workflow.actions.values_list('action_type', 'action_order')),
+			[('wait', 1), ('add_note', 2), ('send_email', 3)],
+		)
+
+	def test_running_executions_block_reordering(self):
+		WorkflowExecution.objects.create(
+			workflow=self.workflow, customer=make_customer(), triggered_by=self.user, status='running', current_action=2
+		)
+		resp = self.client.post(self.url, {'action_ids': [self.actions[2].pk, self.actions[0].pk, self.actions[1].pk]})
+		self.assertFalse(resp.json()['success'])
+		self.assertEqual(list(self.workflow.actions.values_list('action_order', flat=True)), [1, 2, 5])
+
+
+class TaskStatusUpdateTests(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='tester', password='pw')
+		self.task = Task.objects.create(title='Call', customer=make_customer(), created_by=self.user)
+		self.client.force_login(self.user)
+
+	def test_task_complete_sets_completion_once(self):
+		url = reverse('analytics:task_complete', args=[self.task.pk])
+		self.client.get(url)
+		self.task.refresh_from_db()
+		self.assertEqual(self.task.status, 'completed')
+		first_completed_at = self.task.completed_at
+		self.assertIsNotNone(first_completed_at)
+		self.client.get(url)
+		self.task.refresh_from_db()
+		self.assertEqual(self.task.completed_at, first_completed_at)
+
+	def test_ajax_status_update_keeps_existing_completion_time(self):
+		url = reverse('analytics:task_status_update')
+		self.assertTrue(self.client.post(url, {'task_id': self.task.pk, 'status': 'completed'}).json()['success'])
+		self.task.refresh_from_db()
+		completed_at = self.task.completed_at
+		self.assertIsNotNone(completed_at)
+		self.client.post(url, {'task_id': self.task.pk, 'status': 'completed'})
+		self.task.refresh_from_db()
+		self.assertEqual(self.task.completed_at, completed_at)
+		self.assertFalse(self.client.post(url, {'task_id': 9999, 'status': 'pending'}).json()['success'])
+
+
+class WorkflowToggleTests(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='tester', password='pw')
+		self.workflow = WorkflowTemplate.objects.create(name='Onboarding', created_by=self.user, trigger_type='customer_created')
+		self.client.force_login(self.user)
+		cache.clear()
+
+	def test_toggle_flips_flag_in_place(self):
+		updated_at = self.workflow.updated_at
+		self.assertEqual(active_trigger_types(), {'customer_created'})
+		with patch('analytics.simple_task_views.messages') as mock_messages:
+			resp = self.client.post(reverse('analytics:workflow_toggle_active', args=[self.workflow.pk]))
+		self.assertRedirects(resp, reverse('analytics:workflow_detail', args=[self.workflow.pk]), fetch_redirect_response=False)
+		self.assertEqual(mock_messages.success.call_args[0][1], 'Workflow "Onboarding" deactivated!')
+		self.workflow.refresh_from_db()
+		self.assertFalse(self.workflow.is_active)
+		self.assertGreater(self.workflow.updated_at, updated_at)
+		self.assertEqual(active_trigger_types(), set())
+
+		self.client.post(reverse('analytics:workflow_toggle_active', args=[self.workflow.pk]))
+		self.workflow.refresh_from_db()
+		self.assertTrue(self.workflow.is_active)
+
+	def test_missing_workflow_is_404(self):
+		resp = self.client.post(reverse('analytics:workflow_toggle_active', args=[0]))
+		self.assertEqual(resp.status_code, 404)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class WorkflowListTests(TestCase):
+	def test_rows_render_without_per_row_queries(self):
+		user = User.objects.create_user(username='tester', password='pw', first_name='Tess')
+		for i in range(3):
+			workflow = WorkflowTemplate.objects.create(name=f'Flow {i}', created_by=user)
+			WorkflowAction.objects.create(workflow=workflow, action_type='send_email', action_order=1)
+		self.client.force_login(user)
+		with patch('analytics.simple_task_views.render', return_value=HttpResponse()) as mock_render:
+			self.client.get(reverse('analytics:workflow_list'))
+		workflows = list(mock_render.call_args[0][2]['workflows'])
+		with self.assertNumQueries(0):
+			rows = [(w.name, w.trigger_type, w.created_by.get_full_name(), w.action_count) for w in workflows]
+		self.assertEqual(len(rows), 3)
+		self.assertEqual(rows[0][3], 1)
+
+
+class TaskDashboardDueTasksTests(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='tester', password='pw')
+		customer = make_customer()
+		now = timezone.now()
+		for days in range(1, 8):
+			Task.objects.create(title=f'Late {days}', customer=customer, created_by=self.user, due_date=now - timedelta(days=days))
+		Task.objects.create(title='Soon', customer=customer, created_by=self.user, due_date=now + timedelta(days=1))
+		Task.objects.create(title='Later', customer=customer, created_by=self.user, due_date=now + timedelta(days=10))
+		Task.objects.create(title='Done', customer=customer, created_by=self.user, status='completed', due_date=now + timedelta(hours=1))
+		cache.clear()
+
+	def test_overdue_and_upcoming_are_split_and_capped(self):
+		self.client.force_login(self.user)
+		with patch('analytics.simple_task_views.render', return_value=HttpResponse()) as mock_render:
+			self.client.get(reverse('analytics:task_dashboard'))
+		context = mock_render.call_args[0][2]
+		self.assertEqual([t.title for t in context['overdue_tasks']], ['Late 7', 'Late 6', 'Late 5', 'Late 4', 'Late 3'])
+		self.assertEqual([t.title for t in context['upcoming_tasks']], ['Soon'])
+
+
+class WorkflowExecuteManualTests(TestCase):
+	def test_form_leaves_customer_lookup_to_search(self):
+		user = User.objects.create_user(username='tester', password='pw')
+		workflow = WorkflowTemplate.objects.create(name='Onboarding', created_by=user)
+		make_customer()
+		self.client.force_login(user)
+		with patch('analytics.simple_task_views.render', return_value=HttpResponse()) as mock_render, \
+				CaptureQueriesContext(connection) as queries:
+			self.client.get(reverse('analytics:workflow_execute_manual', args=[workflow.pk]))
+		self.assertNotIn('customers', mock_render.call_args[0][2])
+		self.assertFalse(any('customers_customer' in q['sql'] for q in queries.captured_queries))
+
+
+class WorkflowExecutionDetailTests(TestCase):
+	def test_action_executions_are_prefetched(self):
+		user = User.objects.create_user(username='tester', password='pw')
+		workflow = WorkflowTemplate.objects.create(name='Onboarding', created_by=user)
+		execution = WorkflowExecution.objects.create(workflow=workflow, customer=make_customer(), triggered_by=user)
+		for order in (1, 2):
+			action = WorkflowAction.objects.create(workflow=workflow, action_type='send_email', action_order=order)
+			ActionExecution.objects.create(workflow_execution=execution, action=action)
+		self.client.force_login(user)
+		with patch('analytics.simple_task_views.render', return_value=HttpResponse()) as mock_render:
+			self.client.get(reverse('analytics:workflow_execution_detail', args=[execution.pk]))
+		context = mock_render.call_args[0][2]
+		with self.assertNumQueries(0):
+			orders = [ae.action.action_order for ae in context['action_executions']]
+		self.assertEqual(orders, [1, 2])
+
+
+class WorkflowTriggerTests(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='tester', password='pw')
+		self.customer = make_customer()
+		self.customer.tags.add(Tag.objects.create(name='VIP', slug='vip'))
+		cache.clear()
+
+	def test_tag_conditions_share_one_tag_lookup(self):
+		for name in ('First', 'Second', 'Third'):
+			WorkflowTemplate.objects.create(
+				name=name, created_by=self.user, trigger_type='customer_created',
+				trigger_conditions={'customer_tags': ['Wholesale']},
+			)
+		active_trigger_types()
+		# Workflows, their actions and the customer's tag names
+		with self.assertNumQueries(3):
+			executions = WorkflowEngine.trigger_workflows('customer_created', self.customer, self.user)
+		self.assertEqual(executions, [])
+
+	def test_matching_tag_triggers_workflow(self):
+		WorkflowTemplate.objects.create(
+			name='VIP welcome', created_by=self.user, trigger_type='customer_created',
+			trigger_conditions={'customer_tags': ['Wholesale', 'VIP']},
+		)
+		executions = WorkflowEngine.trigger_workflows('customer_created', self.customer, self.user)
+		self.assertEqual(len(executions), 1)
+		self.assertEqual(executions[0].status, 'completed')
+
+	def test_actions_are_loaded_once_per_trigger(self):
+		workflow = WorkflowTemplate.objects.create(name='Drip', created_by=self.user, trigger_type='customer_created')
+		for order in (3, 1, 2):
+			WorkflowAction.objects.create(workflow=workflow, action_type='wait', action_order=order)
+		with CaptureQueriesContext(connection) as ctx:
+			executions = WorkflowEngine.trigger_workflows('customer_created', self.customer, self.user)
+		action_queries = [q for q in ctx.captured_queries if q['sql'].startswith('SELECT') and 'FROM "analytics_workflowaction"' in q['sql']]
+		self.assertEqual(len(action_queries), 1)
+		self.assertEqual(executions[0].status, 'completed')
+		self.assertEqual(
+			list(executions[0].action_executions.values_list('action__action_order', flat=True).order_by('pk')),
+			[1, 2, 3],
+		)
+
+	def test_execution_limit_is_enforced(self):
+		workflow = WorkflowTemplate.objects.create(
+			name='Twice only', created_by=self.user, trigger_type='customer_created', max_executions=2,
+			trigger_conditions={'customer_city': ['Auckland']},
+		)
+		self.assertEqual(len(WorkflowEngine.trigger_workflows('customer_created', self.customer, self.user)), 1)
+		self.assertTrue(WorkflowEngine._should_trigger_workflow(workflow, self.customer, {}))
+		self.assertEqual(len(WorkflowEngine.trigger_workflows('customer_created', self.customer, self.user)), 1)
+		self.assertFalse(WorkflowEngine._should_trigger_workflow(workflow, self.customer, {}))
+		self.assertEqual(WorkflowEngine.trigger_workflows('customer_created', self.customer, self.user), [])
+
+	def test_analytics_events_are_written_in_one_insert(self):
+		for name in ('First', 'Second', 'Third'):
+			WorkflowTemplate.objects.create(name=name, created_by=self.user, trigger_type='task_completed')
+		task = Task.objects.create(title='Call back', customer=self.customer, created_by=self.user)
+		with CaptureQueriesContext(connection) as ctx:
+			TaskManager.complete_task(task, self.user)
+		inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "analytics_analyticsevent"')]
+		self.assertEqual(len(inserts), 1)
+		self.assertEqual(AnalyticsEvent.objects.filter(event_type='task_completed').count(), 1)
+		self.assertEqual(AnalyticsEvent.objects.filter(event_type='workflow_triggered').count(), 3)
+
+	def test_delayed_action_resumes_once_due(self):
+		workflow = WorkflowTemplate.objects.create(name='Follow up', created_by=self.user, trigger_type='customer_created')
+		WorkflowAction.objects.create(workflow=workflow, action_type='wait', action_order=1, delay_hours=2)
+		WorkflowAction.objects.create(workflow=workflow, action_type='wait', action_order=2)
+		execution = WorkflowEngine.trigger_workflows('customer_created', self.customer, self.user)[0]
+		self.assertEqual(execution.status, 'running')
+		self.assertEqual(execution.action_executions.count(), 1)
+		self.assertEqual(WorkflowEngine.process_due_executions(), 0)
+		WorkflowExecution.objects.filter(pk=execution.pk).update(next_action_at=timezone.now() - timedelta(minutes=1))
+		self.assertEqual(WorkflowEngine.process_due_executions(), 1)
+		execution.refresh_from_db()
+		self.assertEqual(execution.status, 'completed')
+		self.assertIsNone(execution.next_action_at)
+		self.assertEqual(execution.action_executions.count(), 2)
+
+	def test_overlapping_runs_resume_each_execution_once(self):
+		workflow = WorkflowTemplate.objects.create(name='Drip', created_by=self.user, trigger_type='customer_created')
+		WorkflowAction.objects.create(workflow=workflow, action_type='wait', action_order=1, delay_minutes=5)
+		WorkflowAction.objects.create(workflow=workflow, action_type='add_note', action_order=2, action_config={'content': 'Hi'})
+		first = WorkflowEngine.trigger_workflows('customer_created', self.customer, self.user)[0]
+		second = WorkflowEngine.trigger_workflows('customer_created', make_customer(email='second@example.com'), self.user)[0]
+		WorkflowExecution.objects.update(next_action_at=timezone.now() - timedelta(minutes=1))
+
+		original = WorkflowEngine._execute_next_action
+		runs = {}
+
+		def execute(execution):
+			# A second cron run starts while the first is still on its first execution
+			if 'inner' not in runs:
+				runs['inner'] = None
+				runs['inner'] = WorkflowEngine.process_due_executions()
+			original(execution)
+
+		with patch.object(WorkflowEngine, '_execute_next_action', side_effect=execute):
+			outer = WorkflowEngine.process_due_executions()
+		self.assertEqual((outer, runs['inner']), (1, 1))
+		for execution in (first, second):
+			self.assertEqual(execution.action_executions.count(), 2)
+
+	def test_execution_log_is_written_to_log_table(self):
+		workflow = WorkflowTemplate.objects.create(name='Drip', created_by=self.user, trigger_type='customer_created')
+		WorkflowAction.objects.create(workflow=workflow, action_type='wait', action_order=1)
+		WorkflowAction.objects.create(workflow=workflow, action_type='bogus', action_order=2)
+		execution = WorkflowEngine.trigger_workflows('customer_created', self.customer, self.user)[0]
+		entries = list(execution.log_entries.values_list('action', flat=True))
+		self.assertEqual(entries, ['workflow_started', 'wait', 'bogus'])
+		self.assertEqual(execution.log_entries.last().payload, {'error': 'Unknown action type: bogus'})
+		execution.refresh_from_db()
+		self.assertEqual(execution.status, 'failed')
+		self.assertEqual(execution.execution_log, [])
+
+	def test_execution_updates_only_write_changed_columns(self):
+		workflow = WorkflowTemplate.objects.create(name='Drip', created_by=self.user, trigger_type='customer_created')
+		WorkflowAction.objects.create(workflow=workflow, action_type='wait', action_order=1)
+		with CaptureQueriesContext(connection) as ctx:
+			WorkflowEngine.trigger_workflows('customer_created', self.customer, self.user, {'source': 'import'})
+		updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "analytics_workflowexecution"')]
+		self.assertTrue(updates)
+		for sql in updates:
+			self.assertNotIn('context_data', sql)
+			self.assertNotIn('execution_log', sql)
+
+	def test_tag_actions_work_on_all_tags_at_once(self):
+		Tag.objects.create(name='Lead', slug='lead')
+		workflow = WorkflowTemplate.objects.create(name='Retag', created_by=self.user, trigger_type='customer_created')
+		WorkflowAction.objects.create(workflow=workflow, action_type='assign_tag', action_order=1, action_config={'tags': ['Lead', 'Hot', 'Hot']})
+		WorkflowAction.objects.create(workflow=workflow, action_type='remove_tag', action_order=2, action_config={'tags': ['VIP', 'Missing']})
+		execution = WorkflowEngine.trigger_workflows('customer_created', self.customer, self.user)[0]
+		self.assertEqual(sorted(self.customer.tags.values_list('name', flat=True)), ['Hot', 'Lead'])
+		results = [ae.result_data for ae in execution.action_executions.order_by('pk')]
+		self.assertEqual(results, [{'assigned_tags': ['Lead', 'Hot']}, {'removed_tags': ['VIP']}])
+		self.assertEqual(Tag.objects.get(name='Hot').slug, 'hot')
+
+	def test_next_action_without_prefetch_is_one_query(self):
+		workflow = WorkflowTemplate.objects.create(name='Drip', created_by=self.user, trigger_type='customer_created')
+		for order in (1, 2, 3):
+			WorkflowAction.objects.create(workflow=workflow, action_type='wait', action_order=order)
+		execution = WorkflowExecution.objects.select_related('workflow').get(
+			pk=WorkflowExecution.objects.create(workflow=workflow, customer=self.customer, triggered_by=self.user, current_action=2).pk
+		)
+		with self.assertNumQueries(1):
+			action = WorkflowEngine._get_next_action(execution)
+		self.assertEqual(action.action_order, 2)
+
+	def test_long_workflow_runs_without_recursion(self):
+		workflow = WorkflowTemplate.objects.create(name='Long', created_by=self.user, trigger_type='customer_created')
+		WorkflowAction.objects.bulk_create(
+			WorkflowAction(workflow=workflow, action_type='wait', action_order=order) for order in range(1, 151)
+		)
+		limit = sys.getrecursionlimit()
+		sys.setrecursionlimit(200)
+		try:
+			execution = WorkflowEngine.trigger_workflows('customer_created', self.customer, self.user)[0]
+		finally:
+			sys.setrecursionlimit(limit)
+		self.assertEqual(execution.status, 'completed')
+		self.assertEqual(execution.action_executions.count(), 150)
+
+	def test_action_and_log_share_a_timestamp(self):
+		workflow = WorkflowTemplate.objects.create(name='Drip', created_by=self.user, trigger_type='customer_created')
+		WorkflowAction.objects.create(workflow=workflow, action_type='wait', action_order=1)
+		execution = WorkflowEngine.trigger_workflows('customer_created', self.customer, self.user)[0]
+		action_execution = execution.action_executions.get()
+		self.assertEqual(execution.log_entries.get(action='wait').timestamp, action_execution.completed_at)
+		self.assertEqual(execution.log_entries.get(action='workflow_completed').timestamp, execution.completed_at)
+
+	def test_compiled_conditions_follow_workflow_edits(self):
+		workflow = WorkflowTemplate.objects.create(
+			name='Notes', created_by=self.user, trigger_type='note_added',
+			trigger_conditions={'note_type': ['call'], 'customer_city': 'Auckland'},
+		)
+		compiled = compile_trigger_conditions(workflow)
+		self.assertIs(compile_trigger_conditions(workflow), compiled)
+		self.assertEqual(compiled.note_types, frozenset({'call'}))
+		self.assertEqual(compiled.cities, frozenset({'Auckland'}))
+		self.assertIsNone(compiled.tags)
+		self.assertTrue(WorkflowEngine._should_trigger_workflow(workflow, self.customer, {'note_type': 'call'}))
+		self.assertFalse(WorkflowEngine._should_trigger_workflow(workflow, self.customer, {'note_type': 'email'}))
+
+		workflow.trigger_conditions = {'note_type': ['email']}
+		workflow.save()
+		self.assertTrue(WorkflowEngine._should_trigger_workflow(workflow, self.customer, {'note_type': 'email'}))
+
+	def test_fast_path_workflow_writes_execution_twice(self):
+		workflow = WorkflowTemplate.objects.create(name='Drip', created_by=self.user, trigger_type='customer_created')
+		for order in range(1, 6):
+			WorkflowAction.objects.create(workflow=workflow, action_type='wait', action_order=order)
+		with CaptureQueriesContext(connection) as ctx:
+			execution = WorkflowEngine.trigger_workflows('customer_created', self.customer, self.user)[0]
+		updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "analytics_workflowexecution"')]
+		self.assertEqual(len(updates), 2)
+		execution.refresh_from_db()
+		self.assertEqual((execution.status, execution.current_action), ('completed', 6))
+
+	def test_update_customer_only_writes_allowed_fields(self):
+		workflow = WorkflowTemplate.objects.create(name='Relocate', created_by=self.user, trigger_type='customer_created')
+		WorkflowAction.objects.create(
+			workflow=workflow, action_type='update_customer', action_order=1,
+			action_config={'updates': {'city': 'Wellington', 'approved_quote_count': 99, 'pk': 5}},
+		)
+		execution = WorkflowEngine.trigger_workflows('customer_created', self.customer, self.user)[0]
+		self.customer.refresh_from_db()
+		self.assertEqual(self.customer.city, 'Wellington')
+		self.assertEqual(self.customer.approved_quote_count, 0)
+		self.assertEqual(
+			execution.action_executions.get().result_data,
+			{'updated_fields': ['city'], 'skipped_fields': ['approved_quote_count', 'pk']},
+		)
+
+	def test_trigger_types_without_workflows_skip_the_database(self):
+		WorkflowTemplate.objects.create(name='Welcome', created_by=self.user, trigger_type='customer_created')
+		self.assertEqual(active_trigger_types(), {'customer_created'})
+		with self.assertNumQueries(0):
+			self.assertEqual(WorkflowEngine.trigger_workflows('file_uploaded', self.customer, self.user), [])
+
+		WorkflowTemplate.objects.create(name='Filed', created_by=self.user, trigger_type='file_uploaded')
+		self.assertEqual(len(WorkflowEngine.trigger_workflows('file_uploaded', self.customer, self.user)), 1)
+
+	def test_add_note_result_references_the_note(self):
+		workflow = WorkflowTemplate.objects.create(name='Note', created_by=self.user, trigger_type='customer_created')
+		WorkflowAction.objects.create(workflow=workflow, action_type='add_note', action_order=1, action_config={'content': 'x' * 500})
+		execution = WorkflowEngine.trigger_workflows('customer_created', self.customer, self.user)[0]
+		note = self.customer.notes.get()
+		self.assertEqual(execution.action_executions.get().result_data, {'note_id': note.pk, 'note_length': 500})
+
+
+class SessionCountingEmailBackend(locmem.EmailBackend):
+	"""locmem backend that, like SMTP, opens its own session per send unless one is already open"""
+	sessions = 0
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self.session = None
+
+	def open(self):
+		if self.session is not None:
+			return False
+		self.session = object()
+		SessionCountingEmailBackend.sessions += 1
+		return True
+
+	def close(self):
+		self.session = None
+
+	def send_messages(self, messages):
+		new_session = self.open()
+		try:
+			return super().send_messages(messages)
+		finally:
+			if new_session:
+				self.close()
+
+
+class UnreachableEmailBackend(locmem.EmailBackend):
+	"""locmem backend whose mail server refuses every connection"""
+
+	def open(self):
+		raise ConnectionRefusedError('mail server unreachable')
+
+	def send_messages(self, messages):
+		self.open()
+
+
+class ReminderProcessingTests(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='tester', password='pw', email='tester@example.com')
+		self.customer = make_customer()
+		past = timezone.now() - timedelta(minutes=5)
+		for title in ('Call', 'Quote', 'Invoice'):
+			Reminder.objects.create(title=title, customer=self.customer, user=self.user, remind_at=past)
+		Reminder.objects.create(title='Later', user=self.user, remind_at=timezone.now() + timedelta(days=1))
+
+	def test_sent_reminders_are_marked_in_one_update(self):
+		with CaptureQueriesContext(connection) as ctx:
+			processed = ReminderManager.process_pending_reminders()
+		self.assertEqual(processed, 3)
+		self.assertEqual(len(mail.outbox), 3)
+		updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "analytics_reminder"')]
+		self.assertEqual(len(updates), 1)
+		self.assertEqual(Reminder.objects.filter(is_sent=True, sent_at__isnull=False).count(), 3)
+		self.assertFalse(Reminder.objects.get(title='Later').is_sent)
+
+	def test_each_chunk_is_recorded_with_its_send_times(self):
+		start = timezone.now()
+		send_times = [start + timedelta(seconds=offset) for offset in (1, 2)]
+		original = ReminderManager._send_reminder_notification
+
+		def send(reminder, connection=None):
+			if reminder.title == 'Invoice':
+				raise SystemExit('worker killed')
+			original(reminder, connection=connection)
+
+		with patch('analytics.task_automation.REMINDER_BATCH_SIZE', 2), \
+				patch('analytics.task_automation.timezone.now', side_effect=[start, *send_times]), \
+				patch.object(ReminderManager, '_send_reminder_notification', side_effect=send):
+			with self.assertRaises(SystemExit):
+				ReminderManager.process_pending_reminders()
+		# The first chunk was stored before the run died on the second
+		self.assertEqual(
+			list(Reminder.objects.filter(is_sent=True).order_by('pk').values_list('title', 'sent_at')),
+			[('Call', send_times[0]), ('Quote', send_times[1])],
+		)
+		self.assertFalse(Reminder.objects.get(title='Invoice').is_sent)
+
+	@override_settings(EMAIL_BACKEND='analytics.tests.SessionCountingEmailBackend')
+	def test_batch_shares_one_mail_session(self):
+		SessionCountingEmailBackend.sessions = 0
+		ReminderManager.process_pending_reminders()
+		self.assertEqual(SessionCountingEmailBackend.sessions, 1)
+		self.assertEqual(len(mail.outbox), 3)
+
+	@override_settings(EMAIL_BACKEND='analytics.tests.SessionCountingEmailBackend')
+	def test_no_mail_session_when_nothing_is_due(self):
+		Reminder.objects.update(remind_at=timezone.now() + timedelta(days=1))
+		SessionCountingEmailBackend.sessions = 0
+		self.assertEqual(ReminderManager.process_pending_reminders(), 0)
+		self.assertEqual(SessionCountingEmailBackend.sessions, 0)
+
+	@override_settings(EMAIL_BACKEND='analytics.tests.UnreachableEmailBackend')
+	def test_unreachable_mail_server_leaves_reminders_pending(self):
+		self.assertEqual(ReminderManager.process_pending_reminders(), 0)
+		self.assertFalse(Reminder.objects.filter(is_sent=True).exists())
+
+	def test_failed_reminders_stay_pending(self):
+		original = ReminderManager._send_reminder_notification
+
+		def send(reminder, connection=None):
+			if reminder.title == 'Quote':
+				raise RuntimeError('SMTP down')
+			original(reminder, connection=connection)
+
+		with patch.object(ReminderManager, '_send_reminder_notification', side_effect=send):
+			self.assertEqual(ReminderManager.process_pending_reminders(), 2)
+		self.assertFalse(Reminder.objects.get(title='Quote').is_sent)
+
+	def test_reminder_relations_are_loaded_with_the_reminders(self):
+		task = Task.objects.create(title='Measure up', customer=self.customer, created_by=self.user)
+		Reminder.objects.update(task=task)
+		# One SELECT for the reminders and their relations, one UPDATE
+		with self.assertNumQueries(2):
+			ReminderManager.process_pending_reminders()
+		self.assertIn('Task: Measure up', mail.outbox[0].body)
+
+
+class TaskManagerQueryTests(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='tester', password='pw')
+		customer = make_customer()
+		now = timezone.now()
+		for days in (1, 2):
+			Task.objects.create(title=f'Late {days}', customer=customer, created_by=self.user, assigned_to=self.user, due_date=now - timedelta(days=days))
+			Task.objects.create(title=f'Soon {days}', customer=customer, created_by=self.user, due_date=now + timedelta(days=days))
+
+	def test_task_lists_load_customer_and_assignee_in_one_query(self):
+		for queryset in (TaskManager.get_overdue_tasks(), TaskManager.get_tasks_due_soon()):
+			with self.assertNumQueries(1):
+				rows = [
+					(task.title, task.get_priority_display(), task.due_date, task.customer.first_name,
+					 task.assigned_to.username if task.assigned_to else None)
+					for task in queryset
+				]
+			self.assertEqual(len(rows), 2)
+		self.assertEqual(TaskManager.get_overdue_tasks().count(), 2)
+
+
+class TaskViewsModuleTests(TestCase):
+	"""Views in analytics.task_views, exercised directly since urls route to simple_task_views"""
+
+	def setUp(self):
+		self.factory = RequestFactory()
+		self.user = User.objects.create_user(username='tester', password='pw')
+		self.customer = make_customer()
+		now = timezone.now()
+		Task.objects.create(title='Late', customer=self.customer, created_by=self.user, due_date=now - timedelta(days=1))
+		Task.objects.create(title='Done', customer=self.customer, created_by=self.user, status='completed', completed_at=now)
+		workflow = WorkflowTemplate.objects.create(name='Onboarding', created_by=self.user)
+		WorkflowExecution.objects.create(workflow=workflow, customer=self.customer, triggered_by=self.user, status='completed')
+		cache.clear()
+
+	def render_context(self, view, *args, method='get', data=None):
+		request = getattr(self.factory, method)('/', data or {})
+		request.user = self.user
+		with patch('analytics.task_views.render', return_value=HttpResponse()) as mock_render:
+			view(request, *args)
+		return mock_render.call_args[0][2]
+
+	def test_dashboard_counters_use_aggregates(self):
+		with self.assertNumQueries(3):
+			context = self.render_context(task_views.task_dashboard)
+		self.assertEqual(
+			(context['total_tasks'], context['completed_tasks'], context['overdue_count']),
+			(2, 1, 1),
+		)
+		self.assertEqual((context['total_executions'], context['successful_executions']), (1, 1))
+		self.assertEqual(context['success_rate'], 100.0)
+
+		# Served from the shared dashboard cache on the next load
+		Task.objects.create(title='New', customer=self.customer, created_by=self.user)
+		with self.assertNumQueries(0):
+			context = self.render_context(task_views.task_dashboard)
+		self.assertEqual(context['total_tasks'], 2)
+
+	def test_dashboard_rows_do_not_query_per_row(self):
+		Task.objects.update(assigned_to=self.user)
+		context = self.render_context(task_views.task_dashboard)
+		with self.assertNumQueries(2):
+			[task.customer.first_name for task in context['assigned_tasks']]
+			[(e.workflow.name, e.customer.first_name) for e in context['recent_executions']]
+
+	@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+	def test_dashboard_renders_due_task_cards_without_per_row_queries(self):
+		now = timezone.now()
+		for days in (1, 2):
+			Task.objects.create(title=f'Late {days}', description='Overdue job', customer=self.customer, created_by=self.user, due_date=now - timedelta(days=days))
+			Task.objects.create(title=f'Soon {days}', description='Upcoming job', customer=self.customer, created_by=self.user, due_date=now + timedelta(days=days))
+		Task.objects.update(assigned_to=self.user)
+		self.render_context(task_views.task_dashboard)
+		request = self.factory.get('/')
+		request.user = self.user
+		with patch('analytics.task_views.render', wraps=render) as mock_render:
+			# Two permission checks in the layout, then assigned, executions, overdue and upcoming; counters are cached
+			with self.assertNumQueries(6):
+				response = task_views.task_dashboard(request)
+			context = mock_render.call_args[0][2]
+			with self.assertNumQueries(0):
+				cards = [
+					(task.title, task.description, task.get_status_display(), task.customer.last_name, task.assigned_to.username)
+					for task in [*context['overdue_tasks'], *context['upcoming_tasks']]
+				]
+		self.assertEqual(len(cards), 5)
+		self.assertContains(response, 'Late 1')
+		self.assertContains(response, 'Soon 2')
+
+	def test_execution_detail_rows_do_not_query_per_row(self):
+		execution = WorkflowExecution.objects.get()
+		for order in (1, 2):
+			action = WorkflowAction.objects.create(workflow=execution.workflow, action_type='wait', action_order=order)
+			ActionExecution.objects.create(workflow_execution=execution, action=action)
+		context = self.render_context(task_views.workflow_execution_detail, execution.pk)
+		with self.assertNumQueries(1):
+			self.assertEqual([ae.action.action_order for ae in context['action_executions']], [1, 2])
+
+	def test_task_creation_chart_counts_each_day(self):
+		Task.objects.filter(title='Late').update(created_at=timezone.now() - timedelta(days=2))
+		context = self.render_context(task_views.task_analytics)
+		chart = json.loads(context['task_creation_data'])
+		self.assertEqual(len(chart), 30)
+		self.assertEqual([day['count'] for day in chart[:3]], [1, 0, 1])
+		self.assertEqual(sum(day['count'] for day in chart), 2)
+
+	def test_task_creation_chart_is_cached_for_the_day(self):
+		first = self.render_context(task_views.task_analytics)['task_creation_data']
+		Task.objects.create(title='New', customer=self.customer, created_by=self.user)
+		with CaptureQueriesContext(connection) as queries:
+			second = self.render_context(task_views.task_analytics)['task_creation_data']
+		self.assertEqual(second, first)
+		self.assertFalse(any('GROUP BY' in q['sql'] and 'created_at' in q['sql'] for q in queries.captured_queries))
+
+	def test_average_completion_time_is_computed_in_the_database(self):
+		now = timezone.now()
+		Task.objects.filter(title='Done').update(created_at=now - timedelta(hours=4), completed_at=now)
+		Task.objects.create(
+			title='Quick', customer=self.customer, created_by=self.user, status='completed', completed_at=now,
+		)
+		Task.objects.filter(title='Quick').update(created_at=now - timedelta(hours=2))
+		context = self.render_context(task_views.task_analytics)
+		self.assertEqual(context['avg_completion_time'], 3.0)
+
+	def test_list_pages_select_only_rendered_columns(self):
+		Reminder.objects.create(title='Call', customer=self.customer, user=self.user, remind_at=timezone.now())
+		workflow = self.render_context(task_views.workflow_list)['workflows'][0]
+		self.assertIn('trigger_conditions', workflow.get_deferred_fields())
+		self.assertEqual(workflow.execution_count, 1)
+		reminder = self.render_context(task_views.reminder_list)['reminders'][0]
+		self.assertIn('workflow_execution_id', reminder.get_deferred_fields())
+
+	def test_due_soon_filter_reads_the_clock_once(self):
+		now = timezone.now()
+		Task.objects.create(title='Soon', customer=self.customer, created_by=self.user, due_date=now + timedelta(days=1))
+		filter_form = MagicMock()
+		filter_form.is_valid.return_value = True
+		filter_form.cleaned_data = {'due_soon_only': True}
+		with patch('analytics.task_views.TaskFilterForm', return_value=filter_form, create=True), \
+				patch('analytics.task_views.timezone.now', return_value=now) as clock:
+			context = self.render_context(task_views.task_list)
+		self.assertEqual([task.title for task in context['tasks']], ['Soon'])
+		self.assertEqual(clock.call_count, 1)
+
+	def test_reminder_filters_share_one_clock_read(self):
+		now = timezone.now()
+		Reminder.objects.create(title='Due', customer=self.customer, user=self.user, remind_at=now - timedelta(hours=1))
+		Reminder.objects.create(title='Later', customer=self.customer, user=self.user, remind_at=now + timedelta(hours=1))
+		for filter_type, expected in (('pending', ['Due']), ('upcoming', ['Later'])):
+			with patch('analytics.task_views.timezone.now', return_value=now) as clock:
+				context = self.render_context(task_views.reminder_list, data={'filter': filter_type})
+			self.assertEqual([reminder.title for reminder in context['reminders']], expected)
+			self.assertEqual(clock.call_count, 1)
+
+	def test_workflow_detail_counts_executions_in_one_query(self):
+		execution = WorkflowExecution.objects.get()
+		WorkflowExecution.objects.create(workflow=execution.workflow, customer=self.customer, triggered_by=self.user, status='failed')
+		# The workflow and the execution counters
+		with self.assertNumQueries(2):
+			context = self.render_context(task_views.workflow_detail, execution.workflow.pk)
+		self.assertEqual(
+			(context['total_executions'], context['successful_executions'], context['failed_executions']),
+			(2, 1, 1),
+		)
+		self.assertEqual(context['success_rate'], 50.0)
+
+	def test_workflow_analytics_data_reports_rates(self):
+		request = self.factory.get('/')
+		request.user = self.user
+		# Latest template change for the cache key, then the grouped counts
+		with self.assertNumQueries(2):
+			response = task_views.workflow_analytics_data(request)
+		self.assertEqual(json.loads(response.content), {'workflows': [
+			{'name': 'Onboarding', 'executions': 1, 'success_rate': 100.0, 'success_count': 1, 'failure_count': 0},
+		]})
+		self.assertIn('max-age=30', response['Cache-Control'])
+
+		request = self.factory.get('/', HTTP_IF_NONE_MATCH=response['ETag'])
+		request.user = self.user
+		self.assertEqual(task_views.workflow_analytics_data(request).status_code, 304)
+
+	def test_task_complete_records_completion_once(self):
+		task = Task.objects.get(title='Late')
+		request = self.factory.post('/')
+		request.user = self.user
+		with patch('analytics.task_views.messages') as mock_messages:
+			task_views.task_complete(request, task.pk)
+			task_views.task_complete(request, task.pk)
+		mock_messages.success.assert_called_once()
+		mock_messages.info.assert_called_once()
+		self.assertEqual(AnalyticsEvent.objects.filter(event_type='task_completed').count(), 1)
+
+	def test_action_create_appends_after_highest_order(self):
+		workflow = WorkflowTemplate.objects.get()
+		for order in (1, 4):
+			WorkflowAction.objects.create(workflow=workflow, action_type='wait', action_order=order)
+		form = MagicMock()
+		form.is_valid.return_value = True
+		form.save.return_value = WorkflowAction(action_type='add_note')
+		request = self.factory.post('/')
+		request.user = self.user
+		with patch('analytics.task_views.WorkflowActionForm', return_value=form, create=True), \
+				patch('analytics.task_views.messages'):
+			response = task_views.workflow_action_create(request, workflow.pk)
+		self.assertEqual(response.status_code, 302)
+		self.assertEqual(
+			list(workflow.actions.values_list('action_type', 'action_order')),
+			[('wait', 1), ('wait', 4), ('add_note', 5)],
+		)
+
+	def test_task_analytics_counters_share_one_query(self):
+		Task.objects.create(title='Open', customer=self.customer, created_by=self.user, status='in_progress')
+		with CaptureQueriesContext(connection) as queries:
+			context = self.render_context(task_views.task_analytics)
+		self.assertEqual(sum('COUNT' in q['sql'] and 'GROUP BY' not in q['sql'] for q in queries.captured_queries), 1)
+		self.assertEqual(
+			[context[key] for key in ('total_tasks', 'completed_tasks', 'pending_tasks', 'in_progress_tasks', 'overdue_tasks')],
+			[3, 1, 1, 1, 1],
+		)
+
+	def post_status(self, task_id, status):
+		request = self.factory.post('/', {'task_id': task_id, 'status': status})
+		request.user = self.user
+		return json.loads(task_views.task_status_update(request).content)
+
+	def test_status_update_is_a_single_update(self):
+		task = Task.objects.get(title='Late')
+		with self.assertNumQueries(1):
+			self.assertTrue(self.post_status(task.pk, 'in_progress')['success'])
+		task.refresh_from_db()
+		self.assertEqual(task.status, 'in_progress')
+		self.assertGreater(task.updated_at, task.created_at)
+		self.assertFalse(self.post_status(0, 'in_progress')['success'])
+
+	def test_status_update_to_completed_records_completion(self):
+		task = Task.objects.get(title='Late')
+		self.assertTrue(self.post_status(task.pk, 'completed')['success'])
+		task.refresh_from_db()
+		self.assertEqual(task.status, 'completed')
+		self.assertIsNotNone(task.completed_at)
+		self.assertTrue(AnalyticsEvent.objects.filter(event_type='task_completed').exists())
+
+
+class AnalyticsExtrasFilterTests(TestCase):
+	"""Template filters used in analytics tables"""
+
+	def test_replace_uses_first_comma_only(self):
+		self.assertEqual(analytics_extras.replace('a_b_c', '_,-'), 'a-b-c')
+		self.assertEqual(analytics_extras.replace('keep', 'nocomma'), 'keep')
+		self.assertEqual(analytics_extras.replace(12, '1,3'), '32')
+
+	def test_replace_underscore(self):
+		self.assertEqual(analytics_extras.replace_underscore('in_progress_task'), 'in progress task')
+		self.assertEqual(analytics_extras.replace_underscore(None), 'None')
+
+
+class EmailSequenceTriggerTests(TestCase):
+	"""EmailAutomationEngine.trigger_sequence step loading"""
+
+	def setUp(self):
+		self.user = User.objects.create_user(username='sender', password='pw')
+		self.customer = make_customer()
+		self.sequence = EmailSequence.objects.create(name='Welcome', created_by=self.user)
+		for number in (2, 1, 3):
+			template = EmailTemplate.objects.create(
+				name=f'Step {number}', subject=f'Subject {number}', content='Hi', created_by=self.user
+			)
+			self.sequence.steps.create(template=template, step_number=number)
+
+	def test_steps_and_templates_load_in_one_query(self):
+		# One SELECT for steps with their templates, one INSERT for the analytics event
+		with patch.object(EmailAutomationEngine, 'send_template_email') as send, \
+				patch.object(EmailAutomationEngine, 'schedule_sequence_step') as schedule, \
+				self.assertNumQueries(2):
+			EmailAutomationEngine.trigger_sequence(self.sequence, self.customer, self.user)
+			first_step = send.call_args.kwargs['sequence_step']
+			later_steps = [call.kwargs['sequence_step'] for call in schedule.call_args_list]
+			subjects = [step.template.subject for step in [first_step] + later_steps]
+		self.assertEqual(subjects, ['Subject 1', 'Subject 2', 'Subject 3'])
+
+	def test_sequence_without_steps_sends_nothing(self):
+		self.sequence.steps.all().delete()
+		with patch.object(EmailAutomationEngine, 'send_template_email') as send:
+			self.assertEqual(EmailAutomationEngine.trigger_sequence(self.sequence, self.customer, self.user), [])
+		send.assert_not_called()
+
+
+class CustomerMetricsCalculationTests(TestCase):
+	"""AnalyticsCalculator.calculate_customer_metrics"""
+
+	def setUp(self):
+		self.user = User.objects.create_user(username='tester', password='pw')
+		self.customer = make_customer(mobile='')
+		for text in ('Called', 'Emailed'):
+			CustomerNote.objects.create(customer=self.customer, note=text, created_by=self.user)
+		CustomerFile.objects.create(customer=self.customer, file='customer_files/quote.pdf')
+		now = timezone.now()
+		for days_ago in (2, 10, 45):
+			event = AnalyticsEvent.objects.create(customer=self.customer, event_type='viewed', user=self.user)
+			AnalyticsEvent.objects.filter(pk=event.pk).update(timestamp=now - timedelta(days=days_ago))
+		self.latest = now - timedelta(days=2)
+
+	def test_metrics_match_customer_activity(self):
+		metrics = AnalyticsCalculator.calculate_customer_metrics(self.customer)
+		self.assertEqual((metrics.total_interactions, metrics.notes_count, metrics.files_count), (3, 2, 1))
+		self.assertEqual(metrics.last_interaction_date, self.latest)
+		# Eight of ten profile fields (no mobile or custom fields, but has notes)
+		self.assertEqual(metrics.profile_completeness, 80.0)
+		# 2 recent events * 10 + 3 interactions * 2 + 80 * 0.2
+		self.assertEqual(metrics.engagement_score, 42.0)
+		# email 20 + address 10 + 42 * 0.3 + 2 notes * 5 + recent activity 10
+		self.assertAlmostEqual(metrics.lead_score, 62.6)
+
+	def test_profile_completeness_checks_related_data_in_one_query(self):
+		with self.assertNumQueries(1):
+			self.assertEqual(AnalyticsCalculator._calculate_profile_completeness(self.customer), 80.0)
+		with self.assertNumQueries(0):
+			self.assertEqual(
+				AnalyticsCalculator._calculate_profile_completeness(self.customer, has_notes=True, has_custom_fields=True),
+				90.0,
+			)
+
+	def test_related_counts_do_not_join_the_relations_together(self):
+		for name in ('company', 'industry'):
+			field = CustomField.objects.create(name=name, label=name.title(), field_type='text')
+			CustomerCustomFieldValue.objects.create(customer=self.customer, custom_field=field, value='x')
+		with CaptureQueriesContext(connection) as queries:
+			counts = AnalyticsCalculator._related_counts(self.customer)
+		self.assertEqual(counts, {'notes_total': 2, 'files_total': 1, 'has_custom_fields': True})
+		self.assertNotIn('JOIN', queries.captured_queries[0]['sql'])
+
+	def test_recalculation_reuses_shared_counts(self):
+		AnalyticsCalculator.calculate_customer_metrics(self.customer)
+		# Metrics row, event aggregate, related-data aggregate, save
+		with self.assertNumQueries(4) as queries:
+			AnalyticsCalculator.calculate_customer_metrics(self.customer)
+		update = queries.captured_queries[-1]['sql']
+		self.assertTrue(update.startswith('UPDATE'))
+		self.assertIn('"calculated_at"', update)
+		self.assertNotIn('"customer_id" =', update.split('WHERE')[0])
+
+
+class RecalculateAllMetricsTests(TestCase):
+	"""AnalyticsCalculator.recalculate_all_metrics"""
+
+	def setUp(self):
+		self.user = User.objects.create_user(username='tester', password='pw')
+		now = timezone.now()
+		self.customers = []
+		for index in range(3):
+			customer = make_customer(email=f'bulk{index}@example.com', mobile='' if index else '021 555 0100')
+			for note_index in range(index):
+				CustomerNote.objects.create(customer=customer, note=f'Note {note_index}', created_by=self.user)
+			CustomerFile.objects.create(customer=customer, file='customer_files/quote.pdf')
+			for days_ago in (2, 10, 45)[:index + 1]:
+				event = AnalyticsEvent.objects.create(customer=customer, event_type='viewed', user=self.user)
+				AnalyticsEvent.objects.filter(pk=event.pk).update(timestamp=now - timedelta(days=days_ago))
+			self.customers.append(customer)
+
+	def metric_values(self):
+		return list(
+			CustomerMetrics.objects.order_by('customer_id').values_list(
+				'customer_id', 'total_interactions', 'notes_count', 'files_count',
+				'last_interaction_date', 'profile_completeness', 'engagement_score', 'lead_score'
+			)
+		)
+
+	def test_matches_per_customer_calculation(self):
+		for customer in self.customers:
+			AnalyticsCalculator.calculate_customer_metrics(customer)
+		expected = self.metric_values()
+		CustomerMetrics.objects.all().delete()
+		# Create missing rows, then update the existing ones on a second pass
+		self.assertEqual(AnalyticsCalculator.recalculate_all_metrics(), 3)
+		self.assertEqual(self.metric_values(), expected)
+		self.assertEqual(AnalyticsCalculator.recalculate_all_metrics(), 3)
+		self.assertEqual(self.metric_values(), expected)
+
+	def test_query_count_does_not_grow_with_customers(self):
+		AnalyticsCalculator.recalculate_all_metrics()
+		# Existing metrics, annotated customers, savepoint, bulk update, release
+		with self.assertNumQueries(5):
+			AnalyticsCalculator.recalculate_all_metrics()
+
+	def test_annotations_do_not_join_related_tables(self):
+		with CaptureQueriesContext(connection) as queries:
+			AnalyticsCalculator.recalculate_all_metrics()
+		annotated = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('SELECT "customers_customer"')]
+		self.assertEqual(len(annotated), 1)
+		self.assertNotIn('JOIN', annotated[0])
+		self.assertNotIn('GROUP BY "customers_customer"', annotated[0])
+
+	def test_customers_are_written_in_chunks(self):
+		AnalyticsCalculator.recalculate_all_metrics()
+		expected = self.metric_values()
+		CustomerMetrics.objects.filter(customer=self.customers[2]).delete()
+		with patch('analytics.utils.CUSTOMER_METRICS_BATCH_SIZE', 2), CaptureQueriesContext(connection) as queries:
+			self.assertEqual(AnalyticsCalculator.recalculate_all_metrics(), 3)
+		lookups = [q for q in queries.captured_queries if q['sql'].startswith('SELECT "analytics_customermetrics"')]
+		self.assertEqual(len(lookups), 2)
+		self.assertEqual(self.metric_values(), expected)
+
+	def test_management_command_recalculates_active_customers(self):
+		Customer.objects.filter(pk=self.customers[0].pk).update(is_active=False)
+		out = StringIO()
+		call_command('recalculate_customer_metrics', stdout=out)
+		self.assertIn('Recalculated metrics for 2 customers', out.getvalue())
+		self.assertFalse(CustomerMetrics.objects.filter(customer=self.customers[0]).exists())
+
+
+class TrackEventTests(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='tester', password='pw')
+		self.customer = make_customer()
+		cache.clear()
+
+	def test_bursts_share_one_metrics_refresh_after_commit(self):
+		with patch.object(AnalyticsCalculator, 'calculate_customer_metrics') as calculate:
+			with self.captureOnCommitCallbacks(execute=True) as callbacks:
+				for _ in range(3):
+					track_event(self.customer, 'viewed', self.user)
+				calculate.assert_not_called()
+		self.assertEqual(len(callbacks), 1)
+		calculate.assert_called_once_with(self.customer)
+		self.assertEqual(AnalyticsEvent.objects.filter(customer=self.customer).count(), 3)
+
+	def test_stale_sweep_counts_the_rest_of_a_burst(self):
+		with self.captureOnCommitCallbacks(execute=True):
+			track_event(self.customer, 'viewed', self.user)
+		with self.captureOnCommitCallbacks(execute=True) as callbacks:
+			track_event(self.customer, 'viewed', self.user)
+			track_event(self.customer, 'note_added', self.user)
+		self.assertEqual(callbacks, [])
+		self.assertEqual(CustomerMetrics.objects.get(customer=self.customer).total_interactions, 1)
+		self.assertEqual(list(AnalyticsCalculator.stale_metrics_customers()), [self.customer])
+
+		out = StringIO()
+		call_command('recalculate_customer_metrics', '--stale', stdout=out)
+		self.assertIn('Recalculated metrics for 1 customers', out.getvalue())
+		self.assertEqual(CustomerMetrics.objects.get(customer=self.customer).total_interactions, 3)
+		self.assertFalse(AnalyticsCalculator.stale_metrics_customers().exists())
+
+	def test_metrics_refresh_again_after_the_interval(self):
+		with self.captureOnCommitCallbacks(execute=True):
+			track_event(self.customer, 'viewed', self.user)
+		self.assertEqual(CustomerMetrics.objects.get(customer=self.customer).total_interactions, 1)
+		cache.clear()
+		with self.captureOnCommitCallbacks(execute=True):
+			track_event(self.customer, 'note_added', self.user)
+		self.assertEqual(CustomerMetrics.objects.get(customer=self.customer).total_interactions, 2)
+
+
+@override_settings(TIME_ZONE='UTC')
+class TrendTests(TestCase):
+	"""AnalyticsCalculator daily trend series"""
+
+	def setUp(self):
+		self.user = User.objects.create_user(username='tester', password='pw')
+		now = timezone.now()
+		for index, days_ago in enumerate((0, 3, 3, 40)):
+			customer = make_customer(email=f'c{index}@example.com')
+			Customer.objects.filter(pk=customer.pk).update(created_at=now - timedelta(days=days_ago))
+			event = AnalyticsEvent.objects.create(customer=customer, event_type='viewed', user=self.user)
+			AnalyticsEvent.objects.filter(pk=event.pk).update(timestamp=now - timedelta(days=days_ago))
+		Customer.objects.filter(email='c1@example.com').update(is_active=False)
+
+	def test_customer_trends_group_by_day_in_one_query(self):
+		with self.assertNumQueries(1):
+			trends = AnalyticsCalculator.get_customer_trends(7)
+		self.assertEqual(len(trends), 8)
+		self.assertEqual(trends[-1], {'date': timezone.now().date().strftime('%Y-%m-%d'), 'count': 1})
+		self.assertEqual([day['count'] for day in trends], [0, 0, 0, 0, 1, 0, 0, 1])
+
+	def test_engagement_trends_group_by_day_in_one_query(self):
+		with self.assertNumQueries(1):
+			trends = AnalyticsCalculator.get_engagement_trends(7)
+		self.assertEqual([day['count'] for day in trends], [0, 0, 0, 0, 2, 0, 0, 1])
+
+
+@override_settings(TIME_ZONE='UTC')
+class DashboardMetricsCalculationTests(TestCase):
+	"""AnalyticsCalculator.calculate_dashboard_metrics"""
+
+	def setUp(self):
+		cache.clear()
+		self.user = User.objects.create_user(username='tester', password='pw')
+		now = timezone.now()
+		for index, days_ago in enumerate((0, 5, 20, 60)):
+			customer = make_customer(email=f'c{index}@example.com')
+			Customer.objects.filter(pk=customer.pk).update(created_at=now - timedelta(days=days_ago))
+		make_customer(email='gone@example.com', is_active=False)
+		for email, days_ago in (('c0@example.com', 1), ('c0@example.com', 2), ('c3@example.com', 45)):
+			event = AnalyticsEvent.objects.create(customer=Customer.objects.get(email=email), event_type='viewed', user=self.user)
+			AnalyticsEvent.objects.filter(pk=event.pk).update(timestamp=now - timedelta(days=days_ago))
+		for customer, engagement in zip(Customer.objects.filter(is_active=True)[:2], (40.0, 60.0)):
+			CustomerMetrics.objects.create(customer=customer, engagement_score=engagement, profile_completeness=engagement / 2)
+
+	def metric(self, metric_type):
+		return DashboardMetric.objects.get(metric_type=metric_type).value
+
+	def test_customer_counts_share_one_aggregate(self):
+		with CaptureQueriesContext(connection) as queries:
+			AnalyticsCalculator.calculate_dashboard_metrics()
+		self.assertEqual(sum(q['sql'].startswith('SELECT COUNT') for q in queries.captured_queries), 1)
+		self.assertEqual(
+			[self.metric(metric_type)['count'] for metric_type in (
+				'total_customers', 'new_customers_today', 'new_customers_week', 'new_customers_month', 'active_customers',
+			)],
+			[4, 1, 2, 3, 1],
+		)
+		self.assertEqual(self.metric('engagement_rate'), {'rate': 50.0})
+		self.assertEqual(self.metric('avg_profile_completeness'), {'percentage': 25.0})
+
+	def test_averages_share_the_customer_aggregate(self):
+		# Metrics of inactive customers still count towards the averages
+		CustomerMetrics.objects.create(
+			customer=Customer.objects.get(email='gone@example.com'), engagement_score=80.0, profile_completeness=40.0
+		)
+		with CaptureQueriesContext(connection) as queries:
+			AnalyticsCalculator.calculate_dashboard_metrics()
+		averaging = [q['sql'] for q in queries.captured_queries if 'AVG(' in q['sql']]
+		self.assertEqual(len(averaging), 1)
+		self.assertIn('COUNT(', averaging[0])
+		self.assertEqual(self.metric('engagement_rate'), {'rate': 60.0})
+		self.assertEqual(self.metric('avg_profile_completeness'), {'percentage': 30.0})
+		self.assertEqual(self.metric('total_customers'), {'count': 4})
+
+	def test_top_cities_come_from_the_hourly_city_counts(self):
+		AnalyticsCalculator.calculate_dashboard_metrics()
+		make_customer(email='welly@example.com', city='Wellington')
+		AnalyticsCalculator.calculate_dashboard_metrics()
+		self.assertEqual(self.metric('top_cities'), {'cities': [{'city': 'Auckland', 'count': 4}]})
+
+		out = StringIO()
+		call_command('refresh_city_counts', stdout=out)
+		self.assertIn('Cached 2 cities', out.getvalue())
+		AnalyticsCalculator.calculate_dashboard_metrics()
+		self.assertEqual(self.metric('top_cities'), {'cities': [
+			{'city': 'Auckland', 'count': 4}, {'city': 'Wellington', 'count': 1},
+		]})
+
+	def test_empty_metrics_average_to_zero(self):
+		CustomerMetrics.objects.all().delete()
+		AnalyticsCalculator.calculate_dashboard_metrics()
+		self.assertEqual(self.metric('engagement_rate'), {'rate': 0})
+		self.assertEqual(self.metric('avg_profile_completeness'), {'percentage': 0})
+
+
+class AnalyticsAPITests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.user = User.objects.create_user(username='tester', password='pw')
+		self.client.force_login(self.user)
+		for index, (lead, engagement) in enumerate(((5, 85), (25, 85), (30, 45), (99, 0), (100, 100))):
+			CustomerMetrics.objects.create(
+				customer=make_customer(email=f'c{index}@example.com'), lead_score=lead, engagement_score=engagement
+			)
+
+	def chart(self, name):
+		return self.client.get(reverse('analytics:api_data'), {'chart': name}).json()['data']
+
+	def test_score_distributions_bucket_in_one_query(self):
+		# Session, user, then a single aggregate over all buckets
+		with self.assertNumQueries(3):
+			lead = self.chart('lead_scores')
+		self.assertEqual([(b['label'], b['count']) for b in lead], [
+			('Low', 1), ('Fair', 2), ('Good', 0), ('High', 0), ('Excellent', 1),
+		])
+		self.assertEqual(lead[0]['range'], '0-20')
+		engagement = self.chart('engagement_scores')
+		self.assertEqual([b['count'] for b in engagement], [1, 0, 1, 0, 2])
+
+	def test_chart_data_is_served_as_json(self):
+		make_customer(email='inactive@example.com', city='Wellington', is_active=False)
+		response = self.client.get(reverse('analytics:api_data'), {'chart': 'geographic_distribution'})
+		self.assertEqual(response['Content-Type'], 'application/json')
+		self.assertEqual(response.json(), {'data': [{'city': 'Auckland', 'count': 5}]})
+
+
+@override_settings(TIME_ZONE='UTC')
+class CustomerTimelineTests(TestCase):
+	def test_timeline_groups_recent_events_by_day_and_type(self):
+		user = User.objects.create_user(username='tester', password='pw')
+		customer = make_customer()
+		now = timezone.now()
+		for event_type, days_ago in (('viewed', 1), ('viewed', 1), ('note_added', 1), ('viewed', 5), ('viewed', 100)):
+			event = AnalyticsEvent.objects.create(customer=customer, event_type=event_type, user=user)
+			AnalyticsEvent.objects.filter(pk=event.pk).update(timestamp=now - timedelta(days=days_ago))
+		with CaptureQueriesContext(connection) as queries:
+			timeline = views.CustomerAnalyticsView()._get_customer_timeline(customer)
+		day = lambda days_ago: (now - timedelta(days=days_ago)).strftime('%Y-%m-%d')
+		self.assertEqual(timeline, {day(5): {'viewed': 1}, day(1): {'viewed': 2, 'note_added': 1}})
+		where = queries.captured_queries[0]['sql'].split('WHERE')[1].split('GROUP BY')[0]
+		self.assertNotIn('django_datetime_cast_date', where)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class AnalyticsPageQueryTests(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='tester', password='pw')
+		self.customer = make_customer()
+		cache.clear()
+
+	def test_dashboard_metrics_are_cached_between_loads(self):
+		self.client.force_login(self.user)
+		with patch('analytics.views.AnalyticsCalculator.calculate_dashboard_metrics', wraps=AnalyticsCalculator.calculate_dashboard_metrics) as calculate:
+			first = self.client.get(reverse('analytics:dashboard')).context['metrics']
+			make_customer(email='second@example.com')
+			second = self.client.get(reverse('analytics:dashboard')).context['metrics']
+		calculate.assert_called_once_with()
+		self.assertEqual(first['total_customers'], {'count': 1})
+		self.assertEqual(second, first)
+
+	def test_dashboard_metrics_skip_retired_metric_types(self):
+		DashboardMetric.objects.create(metric_type='retired_metric', value={'count': 99})
+		metrics = views.dashboard_metrics()
+		self.assertNotIn('retired_metric', metrics)
+		self.assertEqual(set(metrics), set(views.KNOWN_METRIC_TYPES))
+		self.assertEqual(metrics['total_customers'], {'count': 1})
+
+	def test_customer_events_load_their_users_up_front(self):
+		for index in range(3):
+			user = User.objects.create_user(username=f'user{index}', password='pw')
+			AnalyticsEvent.objects.create(customer=self.customer, event_type='viewed', user=user)
+		request = RequestFactory().get('/')
+		request.user = self.user
+		view = views.CustomerAnalyticsView()
+		view.setup(request, customer_id=self.customer.pk)
+		context = view.get_context_data(customer_id=self.customer.pk)
+		with self.assertNumQueries(1):
+			usernames = [event.user.username for event in context['recent_events']]
+		self.assertEqual(sorted(usernames), ['user0', 'user1', 'user2'])
+
+	def test_reports_list_does_not_query_per_report(self):
+		for index in range(3):
+			author = User.objects.create_user(username=f'author{index}', password='pw')
+			Report.objects.create(name=f'Report {index}', created_by=author, is_public=True)
+		self.client.force_login(self.user)
+		with CaptureQueriesContext(connection) as queries:
+			resp = self.client.get(reverse('analytics:reports_list'))
+		self.assertContains(resp, 'author2')
+		# The logged-in user, then the report page with its authors joined in
+		self.assertEqual(sum('"auth_user"' in q['sql'] for q in queries.captured_queries), 2)
+
+
+class EmailStatsViewTests(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='tester', password='pw')
+		self.client.force_login(self.user)
+		customer = make_customer()
+		now = timezone.now()
+		for opened, clicked in ((True, True), (True, False), (False, False), (False, False)):
+			EmailDelivery.objects.create(
+				customer=customer, subject='Hello', sent_by=self.user,
+				opened_at=now if opened else None, clicked_at=now if clicked else None,
+			)
+		old = EmailDelivery.objects.create(customer=customer, subject='Old', sent_by=self.user, opened_at=now)
+		EmailDelivery.objects.filter(pk=old.pk).update(sent_at=now - timedelta(days=60))
+
+	def test_overview_counts_come_from_one_aggregate(self):
+		with CaptureQueriesContext(connection) as queries:
+			response = self.client.get(reverse('analytics:email_stats'))
+		self.assertEqual(sum('analytics_emaildelivery' in q['sql'] for q in queries.captured_queries), 1)
+		self.assertEqual(response.json(), {
+			'total_sent': 4, 'total_opened': 2, 'total_clicked': 1, 'open_rate': 50.0, 'click_rate': 50.0,
+		})
+
+
+class EmailTemplateAPITests(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='tester', password='pw')
+		self.client.force_login(self.user)
+		cache.clear()
+		self.welcome = EmailTemplate.objects.create(name='Welcome', subject='Hi', content='Hello', created_by=self.user)
+		EmailTemplate.objects.create(name='Archived', subject='Old', content='Old', created_by=self.user, is_active=False)
+
+	def template_names(self):
+		response = self.client.get(reverse('analytics:template_api'))
+		return [template['name'] for template in response.json()['templates']]
+
+	def test_list_is_cached_until_templates_change(self):
+		self.assertEqual(self.template_names(), ['Welcome'])
+		with CaptureQueriesContext(connection) as queries:
+			self.assertEqual(self.template_names(), ['Welcome'])
+		self.assertFalse(any('analytics_emailtemplate' in q['sql'] for q in queries.captured_queries))
+
+		EmailTemplate.objects.create(name='Follow up', subject='Again', content='Hi', created_by=self.user)
+		self.assertEqual(self.template_names(), ['Follow up', 'Welcome'])
+		self.client.delete(reverse('analytics:template_api_detail', args=[self.welcome.pk]))
+		self.assertEqual(self.template_names(), ['Follow up'])
+
+
+class EmailSequenceCreateViewTests(TestCase):
+	def setUp(self):
+		self.user = User.objects.create_user(username='tester', password='pw')
+		self.client.force_login(self.user)
+		self.templates = [
+			EmailTemplate.objects.create(name=f'Step {index}', subject='Hi', content='Hello', created_by=self.user)
+			for index in range(3)
+		]
+
+	def post_sequence(self, steps, **data):
+		data = {'name': 'Onboarding', 'trigger_type': 'customer_created', 'is_active': 'true', 'steps': json.dumps(steps), **data}
+		return self.client.post(reverse('analytics:sequence_create'), data).json()
+
+	def test_steps_are_inserted_together(self):
+		steps = [
+			{'template_id': template.pk, 'step_number': index + 1, 'delay_days': index}
+			for index, template in enumerate(self.templates)
+		]
+		with CaptureQueriesContext(connection) as queries:
+			result = self.post_sequence(steps)
+		self.assertTrue(result['success'])
+		self.assertEqual(sum('analytics_emailtemplate' in q['sql'] for q in queries.captured_queries), 1)
+		self.assertEqual(sum(q['sql'].startswith('INSERT INTO "analytics_emailsequencestep"') for q in queries.captured_queries), 1)
+		sequence = EmailSequence.objects.get(pk=result['sequence_id'])
+		self.assertEqual(
+			list(sequence.steps.values_list('template_id', 'step_number', 'delay_days')),
+			[(template.pk, index + 1, index) for index, template in enumerate(self.templates)],
+		)
+
+	def test_new_sequence_is_written_once_and_edits_are_saved(self):
+		with CaptureQueriesContext(connection) as queries:
+			result = self.post_sequence([])
+		self.assertFalse(any(q['sql'].startswith('UPDATE "analytics_emailsequence"') for q in queries.captured_queries))
+		self.post_sequence([], sequence_id=result['sequence_id'], name='Renamed', is_active='false')
+		sequence = EmailSequence.objects.get(pk=result['sequence_id'])
+		self.assertEqual((sequence.name, sequence.is_active), ('Renamed', False))
+
+	def test_unknown_template_is_reported(self):
+		result = self.post_sequence([{'template_id': self.templates[0].pk + 100, 'step_number': 1}])
+		self.assertEqual(result, {'success': False, 'error': 'No EmailTemplate matches the given query.'})
@@ -49,6 +49,7 @@ urlpatterns = [
     
     # Workflow Action URLs
     path('workflows/<int:workflow_pk>/actions/create/', task_views.workflow_action_create, name='workflow_action_create'),
+    path('workflows/<int:workflow_pk>/actions/reorder/', task_views.workflow_action_reorder, name='workflow_action_reorder'),
     
     # Workflow Execution URLs
     path('executions/<int:pk>/', task_views.workflow_execution_detail, name='workflow_execution_detail'),
@@ -60,6 +61,7 @@ urlpatterns = [
     # AJAX URLs
     path('ajax/task-status-update/', task_views.task_status_update, name='task_status_update'),
     path('ajax/workflow-analytics/', task_views.workflow_analytics_data, name='workflow_analytics_data'),
+    path('ajax/customer-search/', task_views.customer_search, name='customer_search'),
     
     # Lead Scoring URLs
     path('lead-scoring/', scoring_views.lead_scoring_dashboard, name='lead_scoring_dashboard'),
@@ -88,6 +90,7 @@ urlpatterns = [
     # Quote URLs
     path('quotes/', quote_views.quote_list, name='quote_list'),
     path('quotes/create/', quote_views.quote_create, name='quote_create'),
+    path('quotes/export/', quote_views.quote_export_csv, name='quote_export_csv'),
     path('quotes/<int:quote_id>/', quote_views.quote_detail, name='quote_detail'),
     path('quotes/<int:quote_id>/edit/', quote_views.quote_edit, name='quote_edit'),
     path('quotes/<int:quote_id>/send/', quote_views.quote_send, name='quote_send'),
@@ -101,6 +104,7 @@ urlpatterns = [
     # Job URLs
     path('jobs/', quote_views.job_list, name='job_list'),
     path('jobs/create/', quote_views.job_create, name='job_create'),
+    path('jobs/export/', quote_views.job_export_csv, name='job_export_csv'),
     path('jobs/<int:job_id>/', quote_views.job_detail, name='job_detail'),
     path('jobs/<int:job_id>/update-status/', quote_views.job_update_status, name='job_update_status'),
     path('jobs/<int:job_id>/add-update/', quote_views.job_add_update, name='job_add_update'),
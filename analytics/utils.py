@@ -1,11 +1,140 @@
-from django.db import models
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.http import HttpResponse, JsonResponse
 from django.utils import timezone
-from django.db.models import Count, Q, Avg, F
-from datetime import datetime, timedelta
-from customers.models import Customer
+from django.db.models import Count, Q, Avg, F, Max, Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce, TruncDate
+from datetime import datetime, time, timedelta
+import hashlib
+from customers.models import Customer, CustomerCustomFieldValue, CustomerFile, CustomerNote
 from .models import AnalyticsEvent, CustomerMetrics, DashboardMetric
 import json
 
+# CustomerMetrics columns written by calculate_customer_metrics (calculated_at is auto_now)
+CUSTOMER_METRICS_FIELDS = [
+    'total_interactions', 'notes_count', 'files_count', 'last_interaction_date',
+    'profile_completeness', 'engagement_score', 'lead_score', 'calculated_at',
+]
+
+# Rows per bulk_create/bulk_update statement when recalculating metrics in bulk
+CUSTOMER_METRICS_BATCH_SIZE = 500
+
+# Active-customer counts per city, refreshed hourly by the refresh_city_counts command
+CITY_COUNTS_CACHE_KEY = 'analytics:city_counts'
+CITY_COUNTS_CACHE_TIMEOUT = 3600
+
+# Seconds during which further events for a customer skip the metrics refresh
+CUSTOMER_METRICS_REFRESH_KEY = 'analytics:metrics_refreshed:{}'
+CUSTOMER_METRICS_REFRESH_INTERVAL = 60
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
+
+
+def json_loads(data):
+    """Parse JSON from bytes or str, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def payload_etag(data):
+    """Stable ETag for a JSON-serializable payload, for conditional GETs on polled endpoints"""
+    encoded = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder).encode()
+    return hashlib.md5(encoded, usedforsecurity=False).hexdigest()
+
+
+class ORJSONResponse(JsonResponse):
+    """JsonResponse that serializes with orjson when it is installed"""
+    
+    def __init__(self, data, safe=True, **kwargs):
+        if orjson is None:
+            super().__init__(data, safe=safe, **kwargs)
+            return
+        
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                "In order to allow non-dict objects to be serialized set the "
+                "safe parameter to False."
+            )
+        kwargs.setdefault('content_type', 'application/json')
+        # Types orjson does not handle natively (e.g. Decimal) go through Django's encoder
+        content = orjson.dumps(data, default=DjangoJSONEncoder().default, option=orjson.OPT_NAIVE_UTC)
+        HttpResponse.__init__(self, content=content, **kwargs)
+
+
+def start_of_day(day):
+    """Aware datetime for midnight at the start of a date in the current time zone"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def customer_subquery_count(queryset):
+    """Correlated COUNT of a customer-keyed queryset, so each relation is counted without joining the others"""
+    return Coalesce(
+        Subquery(
+            queryset.filter(customer=OuterRef('pk'))
+            .order_by()
+            .values('customer')
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0
+    )
+
+
+def daily_counts(queryset, field, start_date, end_date):
+    """Rows per day of a datetime field between two dates (inclusive), zero-filled, from one grouped query"""
+    # Compare the raw column against day boundaries so its indexes stay usable
+    counts = dict(
+        queryset.filter(**{
+            f'{field}__gte': start_of_day(start_date),
+            f'{field}__lt': start_of_day(end_date + timedelta(days=1)),
+        })
+        .annotate(day=TruncDate(field))
+        .order_by()
+        .values('day')
+        .annotate(count=Count('id'))
+        .values_list('day', 'count')
+    )
+    
+    daily = []
+    current_date = start_date
+    while current_date <= end_date:
+        daily.append({
+            'date': current_date.strftime('%Y-%m-%d'),
+            'count': counts.get(current_date, 0)
+        })
+        current_date += timedelta(days=1)
+    
+    return daily
+
+
+def city_counts():
+    """Active customers per city, busiest first"""
+    return list(
+        Customer.objects.filter(is_active=True).values('city').annotate(
+            count=Count('id')
+        ).exclude(city__isnull=True).exclude(city='').order_by('-count')
+    )
+
+
+def refresh_city_counts():
+    """Recompute city_counts and store it for the dashboard and geographic chart"""
+    counts = city_counts()
+    cache.set(CITY_COUNTS_CACHE_KEY, counts, CITY_COUNTS_CACHE_TIMEOUT)
+    return counts
+
+
+def cached_city_counts():
+    """city_counts from the cache, computed on the spot if it has expired"""
+    counts = cache.get(CITY_COUNTS_CACHE_KEY)
+    if counts is None:
+        counts = refresh_city_counts()
+    return counts
+
 
 class AnalyticsCalculator:
     """Calculate various analytics metrics"""
@@ -26,30 +155,161 @@ class AnalyticsCalculator:
             }
         )
         
+        # Event counts and the latest interaction in a single pass
+        now = timezone.now()
+        event_stats = AnalyticsEvent.objects.filter(customer=customer).aggregate(
+            total=Count('id'),
+            last_30_days=Count('id', filter=Q(timestamp__gte=now - timedelta(days=30))),
+            last_7_days=Count('id', filter=Q(timestamp__gte=now - timedelta(days=7))),
+            last_timestamp=Max('timestamp'),
+        )
+        related_counts = AnalyticsCalculator._related_counts(customer)
+        
         # Calculate interactions
-        metrics.total_interactions = AnalyticsEvent.objects.filter(customer=customer).count()
-        metrics.notes_count = customer.notes.count()
-        metrics.files_count = customer.files.count()
+        metrics.total_interactions = event_stats['total']
+        metrics.notes_count = related_counts['notes_total']
+        metrics.files_count = related_counts['files_total']
         
         # Calculate last interaction
-        last_event = AnalyticsEvent.objects.filter(customer=customer).first()
-        if last_event:
-            metrics.last_interaction_date = last_event.timestamp
+        if event_stats['last_timestamp'] is not None:
+            metrics.last_interaction_date = event_stats['last_timestamp']
         
         # Calculate profile completeness
-        metrics.profile_completeness = AnalyticsCalculator._calculate_profile_completeness(customer)
+        metrics.profile_completeness = AnalyticsCalculator._calculate_profile_completeness(
+            customer,
+            has_notes=related_counts['notes_total'] > 0,
+            has_custom_fields=related_counts['has_custom_fields'],
+        )
         
         # Calculate engagement score
-        metrics.engagement_score = AnalyticsCalculator._calculate_engagement_score(customer)
+        metrics.engagement_score = AnalyticsCalculator._calculate_engagement_score(
+            customer,
+            profile_completeness=metrics.profile_completeness,
+            recent_events=event_stats['last_30_days'],
+            total_interactions=event_stats['total'],
+        )
         
         # Calculate lead score
-        metrics.lead_score = AnalyticsCalculator._calculate_lead_score(customer)
+        metrics.lead_score = AnalyticsCalculator._calculate_lead_score(
+            customer,
+            engagement_score=metrics.engagement_score,
+            notes_count=metrics.notes_count,
+            recent_activity=event_stats['last_7_days'] > 0,
+        )
         
-        metrics.save()
+        metrics.save(update_fields=CUSTOMER_METRICS_FIELDS)
         return metrics
     
     @staticmethod
-    def _calculate_profile_completeness(customer):
+    def recalculate_all_metrics(queryset=None):
+        """Recalculate metrics for many customers from one annotated query, writing them in batches"""
+        if queryset is None:
+            queryset = Customer.objects.filter(is_active=True)
+        
+        now = timezone.now()
+        # One correlated subquery per figure, so events, notes and files are never joined
+        # together (each one is served by the customer foreign key indexes)
+        events = AnalyticsEvent.objects.all()
+        customers = queryset.order_by().annotate(
+            total_events=customer_subquery_count(events),
+            events_30_days=customer_subquery_count(events.filter(timestamp__gte=now - timedelta(days=30))),
+            events_7_days=customer_subquery_count(events.filter(timestamp__gte=now - timedelta(days=7))),
+            last_event=Subquery(
+                events.filter(customer=OuterRef('pk')).order_by('-timestamp').values('timestamp')[:1]
+            ),
+            notes_total=customer_subquery_count(CustomerNote.objects.all()),
+            files_total=customer_subquery_count(CustomerFile.objects.all()),
+            has_custom_fields=Exists(
+                CustomerCustomFieldValue.objects.filter(customer=OuterRef('pk'))
+            ),
+        )
+        
+        # Stream the annotated rows and flush each chunk, so memory stays bounded by the batch size
+        updated = 0
+        batch = []
+        for customer in customers.iterator(chunk_size=CUSTOMER_METRICS_BATCH_SIZE):
+            batch.append(customer)
+            if len(batch) >= CUSTOMER_METRICS_BATCH_SIZE:
+                updated += AnalyticsCalculator._save_metrics_batch(batch, now)
+                batch = []
+        if batch:
+            updated += AnalyticsCalculator._save_metrics_batch(batch, now)
+        
+        return updated
+    
+    @staticmethod
+    def stale_metrics_customers(queryset=None):
+        """Customers with analytics events newer than their stored metrics (or no metrics yet)"""
+        if queryset is None:
+            queryset = Customer.objects.all()
+        has_events = Exists(AnalyticsEvent.objects.filter(customer=OuterRef('pk')))
+        has_newer_events = Exists(AnalyticsEvent.objects.filter(
+            customer=OuterRef('pk'), timestamp__gt=OuterRef('metrics__calculated_at')
+        ))
+        return queryset.filter(has_newer_events | (Q(metrics__isnull=True) & has_events))
+    
+    @staticmethod
+    def _save_metrics_batch(customers, now):
+        """Write metrics for a chunk of customers annotated by recalculate_all_metrics"""
+        existing = {
+            metrics.customer_id: metrics
+            for metrics in CustomerMetrics.objects.filter(customer__in=[customer.pk for customer in customers])
+        }
+        
+        to_create = []
+        to_update = []
+        for customer in customers:
+            metrics = existing.get(customer.pk)
+            if metrics is None:
+                metrics = CustomerMetrics(customer=customer)
+                to_create.append(metrics)
+            else:
+                to_update.append(metrics)
+            
+            metrics.total_interactions = customer.total_events
+            metrics.notes_count = customer.notes_total
+            metrics.files_count = customer.files_total
+            if customer.last_event is not None:
+                metrics.last_interaction_date = customer.last_event
+            metrics.profile_completeness = AnalyticsCalculator._calculate_profile_completeness(
+                customer,
+                has_notes=customer.notes_total > 0,
+                has_custom_fields=customer.has_custom_fields,
+            )
+            metrics.engagement_score = AnalyticsCalculator._calculate_engagement_score(
+                customer,
+                profile_completeness=metrics.profile_completeness,
+                recent_events=customer.events_30_days,
+                total_interactions=customer.total_events,
+            )
+            metrics.lead_score = AnalyticsCalculator._calculate_lead_score(
+                customer,
+                engagement_score=metrics.engagement_score,
+                notes_count=customer.notes_total,
+                recent_activity=customer.events_7_days > 0,
+            )
+            # bulk_update bypasses auto_now, so stamp the calculation time explicitly
+            metrics.calculated_at = now
+        
+        with transaction.atomic():
+            CustomerMetrics.objects.bulk_update(
+                to_update, CUSTOMER_METRICS_FIELDS, batch_size=CUSTOMER_METRICS_BATCH_SIZE
+            )
+            CustomerMetrics.objects.bulk_create(to_create, batch_size=CUSTOMER_METRICS_BATCH_SIZE)
+        
+        return len(to_update) + len(to_create)
+    
+    @staticmethod
+    def _related_counts(customer):
+        """Count a customer's notes and files and check for custom field values in one query"""
+        return Customer.objects.filter(pk=customer.pk).values(
+            notes_total=customer_subquery_count(CustomerNote.objects.all()),
+            files_total=customer_subquery_count(CustomerFile.objects.all()),
+            has_custom_fields=Exists(CustomerCustomFieldValue.objects.filter(customer=OuterRef('pk'))),
+        ).get()
+    
+    @staticmethod
+    def _calculate_profile_completeness(customer, has_notes=None, has_custom_fields=None):
         """Calculate how complete a customer profile is"""
         total_fields = 10  # Adjust based on important fields
         completed_fields = 0
@@ -72,44 +332,58 @@ class AnalyticsCalculator:
         if customer.postcode:
             completed_fields += 1
         
+        # Probe whichever related-data flags the caller did not supply in one query
+        if has_notes is None or has_custom_fields is None:
+            flags = Customer.objects.filter(pk=customer.pk).values(
+                has_notes=Exists(CustomerNote.objects.filter(customer=OuterRef('pk'))),
+                has_custom_fields=Exists(CustomerCustomFieldValue.objects.filter(customer=OuterRef('pk'))),
+            ).get()
+            if has_notes is None:
+                has_notes = flags['has_notes']
+            if has_custom_fields is None:
+                has_custom_fields = flags['has_custom_fields']
+        
         # Check if has notes
-        if customer.notes.exists():
+        if has_notes:
             completed_fields += 1
         
         # Check if has custom field values
-        if customer.custom_field_values.exists():
+        if has_custom_fields:
             completed_fields += 1
         
         return (completed_fields / total_fields) * 100
     
     @staticmethod
-    def _calculate_engagement_score(customer):
-        """Calculate customer engagement score"""
+    def _calculate_engagement_score(customer, profile_completeness=None, recent_events=None, total_interactions=None):
+        """Calculate customer engagement score, reusing event counts the caller already has"""
         score = 0.0
         
         # Recent activity (last 30 days)
-        thirty_days_ago = timezone.now() - timedelta(days=30)
-        recent_events = AnalyticsEvent.objects.filter(
-            customer=customer,
-            timestamp__gte=thirty_days_ago
-        ).count()
+        if recent_events is None:
+            thirty_days_ago = timezone.now() - timedelta(days=30)
+            recent_events = AnalyticsEvent.objects.filter(
+                customer=customer,
+                timestamp__gte=thirty_days_ago
+            ).count()
         
         # Score based on recent activity
         score += min(recent_events * 10, 50)  # Max 50 points for activity
         
         # Score based on total interactions
-        total_interactions = AnalyticsEvent.objects.filter(customer=customer).count()
+        if total_interactions is None:
+            total_interactions = AnalyticsEvent.objects.filter(customer=customer).count()
         score += min(total_interactions * 2, 30)  # Max 30 points for total interactions
         
         # Score based on profile completeness
-        profile_score = AnalyticsCalculator._calculate_profile_completeness(customer)
-        score += profile_score * 0.2  # Max 20 points for completeness
+        if profile_completeness is None:
+            profile_completeness = AnalyticsCalculator._calculate_profile_completeness(customer)
+        score += profile_completeness * 0.2  # Max 20 points for completeness
         
         return min(score, 100)  # Cap at 100
     
     @staticmethod
-    def _calculate_lead_score(customer):
-        """Calculate lead scoring"""
+    def _calculate_lead_score(customer, engagement_score=None, notes_count=None, recent_activity=None):
+        """Calculate lead scoring, reusing scores and counts the caller already has"""
         score = 0.0
         
         # Base scoring factors
@@ -121,19 +395,22 @@ class AnalyticsCalculator:
             score += 10  # Has address
         
         # Engagement-based scoring
-        engagement_score = AnalyticsCalculator._calculate_engagement_score(customer)
+        if engagement_score is None:
+            engagement_score = AnalyticsCalculator._calculate_engagement_score(customer)
         score += engagement_score * 0.3  # 30% of engagement score
         
         # Notes and interactions
-        notes_count = customer.notes.count()
+        if notes_count is None:
+            notes_count = customer.notes.count()
         score += min(notes_count * 5, 25)  # Max 25 points for notes
         
         # Recent activity boost
-        seven_days_ago = timezone.now() - timedelta(days=7)
-        recent_activity = AnalyticsEvent.objects.filter(
-            customer=customer,
-            timestamp__gte=seven_days_ago
-        ).exists()
+        if recent_activity is None:
+            seven_days_ago = timezone.now() - timedelta(days=7)
+            recent_activity = AnalyticsEvent.objects.filter(
+                customer=customer,
+                timestamp__gte=seven_days_ago
+            ).exists()
         
         if recent_activity:
             score += 10  # Recent activity bonus
@@ -148,71 +425,62 @@ class AnalyticsCalculator:
         week_ago = now - timedelta(days=7)
         month_ago = now - timedelta(days=30)
         
+        # Customer counts and the CustomerMetrics averages in a single pass; the
+        # one-to-one metrics join adds no rows, and every metrics row has a customer,
+        # so the averages still cover all metrics regardless of is_active
+        recently_active = Exists(
+            AnalyticsEvent.objects.filter(customer=OuterRef('pk'), timestamp__gte=month_ago)
+        )
+        active = Q(is_active=True)
+        customer_counts = Customer.objects.aggregate(
+            total=Count('id', filter=active),
+            today=Count('id', filter=active & Q(created_at__date=today)),
+            week=Count('id', filter=active & Q(created_at__gte=week_ago)),
+            month=Count('id', filter=active & Q(created_at__gte=month_ago)),
+            active=Count('id', filter=active & Q(recently_active)),
+            avg_engagement=Avg('metrics__engagement_score'),
+            avg_completeness=Avg('metrics__profile_completeness'),
+        )
+        
         # Total customers
-        total_customers = Customer.objects.filter(is_active=True).count()
         DashboardMetric.objects.update_or_create(
             metric_type='total_customers',
-            defaults={'value': {'count': total_customers}}
+            defaults={'value': {'count': customer_counts['total']}}
         )
         
         # New customers today
-        new_today = Customer.objects.filter(
-            created_at__date=today,
-            is_active=True
-        ).count()
         DashboardMetric.objects.update_or_create(
             metric_type='new_customers_today',
-            defaults={'value': {'count': new_today}}
+            defaults={'value': {'count': customer_counts['today']}}
         )
         
         # New customers this week
-        new_week = Customer.objects.filter(
-            created_at__gte=week_ago,
-            is_active=True
-        ).count()
         DashboardMetric.objects.update_or_create(
             metric_type='new_customers_week',
-            defaults={'value': {'count': new_week}}
+            defaults={'value': {'count': customer_counts['week']}}
         )
         
         # New customers this month
-        new_month = Customer.objects.filter(
-            created_at__gte=month_ago,
-            is_active=True
-        ).count()
         DashboardMetric.objects.update_or_create(
             metric_type='new_customers_month',
-            defaults={'value': {'count': new_month}}
+            defaults={'value': {'count': customer_counts['month']}}
         )
         
         # Active customers (with recent activity)
-        active_customers = Customer.objects.filter(
-            is_active=True,
-            analytics_events__timestamp__gte=month_ago
-        ).distinct().count()
         DashboardMetric.objects.update_or_create(
             metric_type='active_customers',
-            defaults={'value': {'count': active_customers}}
+            defaults={'value': {'count': customer_counts['active']}}
         )
         
         # Top cities
-        top_cities = Customer.objects.filter(is_active=True).values('city').annotate(
-            count=Count('id')
-        ).exclude(city__isnull=True).exclude(city='').order_by('-count')[:5]
-        
         DashboardMetric.objects.update_or_create(
             metric_type='top_cities',
-            defaults={'value': {'cities': list(top_cities)}}
+            defaults={'value': {'cities': cached_city_counts()[:5]}}
         )
         
         # Engagement rate
-        total_with_metrics = CustomerMetrics.objects.count()
-        if total_with_metrics > 0:
-            avg_engagement = CustomerMetrics.objects.aggregate(
-                avg_score=Avg('engagement_score')
-            )['avg_score'] or 0
-        else:
-            avg_engagement = 0
+        avg_engagement = customer_counts['avg_engagement'] or 0
+        avg_completeness = customer_counts['avg_completeness'] or 0
         
         DashboardMetric.objects.update_or_create(
             metric_type='engagement_rate',
@@ -220,13 +488,6 @@ class AnalyticsCalculator:
         )
         
         # Average profile completeness
-        if total_with_metrics > 0:
-            avg_completeness = CustomerMetrics.objects.aggregate(
-                avg_completeness=Avg('profile_completeness')
-            )['avg_completeness'] or 0
-        else:
-            avg_completeness = 0
-        
         DashboardMetric.objects.update_or_create(
             metric_type='avg_profile_completeness',
             defaults={'value': {'percentage': round(avg_completeness, 2)}}
@@ -238,23 +499,9 @@ class AnalyticsCalculator:
         end_date = timezone.now().date()
         start_date = end_date - timedelta(days=days)
         
-        # Generate daily counts
-        daily_counts = []
-        current_date = start_date
-        
-        while current_date <= end_date:
-            count = Customer.objects.filter(
-                created_at__date=current_date,
-                is_active=True
-            ).count()
-            
-            daily_counts.append({
-                'date': current_date.strftime('%Y-%m-%d'),
-                'count': count
-            })
-            current_date += timedelta(days=1)
-        
-        return daily_counts
+        return daily_counts(
+            Customer.objects.filter(is_active=True), 'created_at', start_date, end_date
+        )
     
     @staticmethod
     def get_engagement_trends(days=30):
@@ -262,28 +509,12 @@ class AnalyticsCalculator:
         end_date = timezone.now().date()
         start_date = end_date - timedelta(days=days)
         
-        daily_engagement = []
-        current_date = start_date
-        
-        while current_date <= end_date:
-            count = AnalyticsEvent.objects.filter(
-                timestamp__date=current_date
-            ).count()
-            
-            daily_engagement.append({
-                'date': current_date.strftime('%Y-%m-%d'),
-                'count': count
-            })
-            current_date += timedelta(days=1)
-        
-        return daily_engagement
+        return daily_counts(AnalyticsEvent.objects.all(), 'timestamp', start_date, end_date)
     
     @staticmethod
     def get_geographic_distribution():
         """Get customer distribution by city"""
-        return Customer.objects.filter(is_active=True).values('city').annotate(
-            count=Count('id')
-        ).exclude(city__isnull=True).exclude(city='').order_by('-count')
+        return cached_city_counts()
 
 
 def track_event(customer, event_type, user=None, metadata=None):
@@ -295,5 +526,9 @@ def track_event(customer, event_type, user=None, metadata=None):
         metadata=metadata or {}
     )
     
-    # Update customer metrics
-    AnalyticsCalculator.calculate_customer_metrics(customer)
\ No newline at end of file
+    # Update customer metrics once the event is committed, at most once per
+    # interval so bursts of events (page views, bulk edits) share one refresh.
+    # Events skipped here leave the metrics stale; `recalculate_customer_metrics
+    # --stale` (run from cron) picks up the tail of each burst.
+    if cache.add(CUSTOMER_METRICS_REFRESH_KEY.format(customer.pk), True, CUSTOMER_METRICS_REFRESH_INTERVAL):
+        transaction.on_commit(lambda: AnalyticsCalculator.calculate_customer_metrics(customer))
@@ -1,8 +1,10 @@
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import TemplateView, ListView, CreateView, UpdateView
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
+from django.core.cache import cache
 from django.db.models import Count, Q, Avg
+from django.db.models.functions import TruncDate
 from django.utils import timezone
 from django.contrib import messages
 from django.urls import reverse_lazy
@@ -14,8 +16,24 @@ from .models import (
     AnalyticsEvent, CustomerMetrics, DashboardMetric, 
     Report, EmailTemplate, EmailSequence, EmailDelivery
 )
-from .utils import AnalyticsCalculator
-from .email_automation import EmailAutomationEngine, EmailTemplateProcessor
+from .utils import AnalyticsCalculator, ORJSONResponse, start_of_day
+from .email_automation import EmailAutomationEngine, EmailTemplateProcessor, active_email_templates
+
+
+DASHBOARD_METRICS_CACHE_KEY = 'analytics_dashboard:metrics'
+DASHBOARD_METRICS_CACHE_TIMEOUT = 300
+
+# Metric rows the dashboard reads; rows left behind by retired metric types are ignored
+KNOWN_METRIC_TYPES = [metric_type for metric_type, label in DashboardMetric.METRIC_TYPES]
+
+
+def dashboard_metrics():
+    """Recalculate the stored dashboard metrics and return their values by metric type"""
+    AnalyticsCalculator.calculate_dashboard_metrics()
+    
+    return dict(
+        DashboardMetric.objects.filter(metric_type__in=KNOWN_METRIC_TYPES).values_list('metric_type', 'value')
+    )
 
 
 class AnalyticsDashboardView(LoginRequiredMixin, TemplateView):
@@ -25,13 +43,12 @@ class AnalyticsDashboardView(LoginRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Calculate fresh metrics
-        AnalyticsCalculator.calculate_dashboard_metrics()
-        
-        # Get dashboard metrics
-        metrics = {}
-        for metric in DashboardMetric.objects.all():
-            metrics[metric.metric_type] = metric.value
+        # Dashboard metrics, recalculated at most once per cache window
+        metrics = cache.get_or_set(
+            DASHBOARD_METRICS_CACHE_KEY,
+            dashboard_metrics,
+            DASHBOARD_METRICS_CACHE_TIMEOUT
+        )
         
         context.update({
             'metrics': metrics,
@@ -53,7 +70,7 @@ class AnalyticsAPIView(LoginRequiredMixin, TemplateView):
         elif chart_type == 'engagement_trends':
             data = AnalyticsCalculator.get_engagement_trends(days)
         elif chart_type == 'geographic_distribution':
-            data = list(AnalyticsCalculator.get_geographic_distribution())
+            data = AnalyticsCalculator.get_geographic_distribution()
         elif chart_type == 'lead_scores':
             data = self._get_lead_score_distribution()
         elif chart_type == 'engagement_scores':
@@ -61,7 +78,7 @@ class AnalyticsAPIView(LoginRequiredMixin, TemplateView):
         else:
             data = []
         
-        return JsonResponse({'data': data})
+        return ORJSONResponse({'data': data})
     
     def _get_lead_score_distribution(self):
         """Get distribution of lead scores"""
@@ -73,19 +90,7 @@ class AnalyticsAPIView(LoginRequiredMixin, TemplateView):
             (80, 100, 'Excellent')
         ]
         
-        distribution = []
-        for min_score, max_score, label in ranges:
-            count = CustomerMetrics.objects.filter(
-                lead_score__gte=min_score,
-                lead_score__lt=max_score
-            ).count()
-            distribution.append({
-                'label': label,
-                'count': count,
-                'range': f"{min_score}-{max_score}"
-            })
-        
-        return distribution
+        return self._get_score_distribution('lead_score', ranges)
     
     def _get_engagement_score_distribution(self):
         """Get distribution of engagement scores"""
@@ -97,19 +102,23 @@ class AnalyticsAPIView(LoginRequiredMixin, TemplateView):
             (80, 100, 'Very High')
         ]
         
-        distribution = []
-        for min_score, max_score, label in ranges:
-            count = CustomerMetrics.objects.filter(
-                engagement_score__gte=min_score,
-                engagement_score__lt=max_score
-            ).count()
-            distribution.append({
+        return self._get_score_distribution('engagement_score', ranges)
+    
+    def _get_score_distribution(self, field, ranges):
+        """Count CustomerMetrics per score range, with every bucket counted in one query"""
+        counts = CustomerMetrics.objects.aggregate(**{
+            f'bucket_{index}': Count('id', filter=Q(**{f'{field}__gte': min_score, f'{field}__lt': max_score}))
+            for index, (min_score, max_score, label) in enumerate(ranges)
+        })
+        
+        return [
+            {
                 'label': label,
-                'count': count,
+                'count': counts[f'bucket_{index}'],
                 'range': f"{min_score}-{max_score}"
-            })
-        
-        return distribution
+            }
+            for index, (min_score, max_score, label) in enumerate(ranges)
+        ]
 
 
 class CustomerAnalyticsView(LoginRequiredMixin, TemplateView):
@@ -124,9 +133,12 @@ class CustomerAnalyticsView(LoginRequiredMixin, TemplateView):
         # Calculate or get customer metrics
         metrics = AnalyticsCalculator.calculate_customer_metrics(customer)
         
-        # Get recent events
+        # Get recent events, with the acting user joined in
         recent_events = AnalyticsEvent.objects.filter(
             customer=customer
+        ).select_related('user').only(
+            'event_type', 'timestamp', 'metadata',
+            'user__username', 'user__first_name', 'user__last_name',
         )[:20]
         
         # Get event timeline data
@@ -147,17 +159,18 @@ class CustomerAnalyticsView(LoginRequiredMixin, TemplateView):
         end_date = timezone.now().date()
         start_date = end_date - timedelta(days=days)
         
+        # A range on the raw timestamp lets the (customer, timestamp) index serve the filter
         events = AnalyticsEvent.objects.filter(
             customer=customer,
-            timestamp__date__gte=start_date
-        ).values('timestamp__date', 'event_type').annotate(
+            timestamp__gte=start_of_day(start_date)
+        ).annotate(day=TruncDate('timestamp')).values('day', 'event_type').annotate(
             count=Count('id')
-        ).order_by('timestamp__date')
+        ).order_by('day')
         
         # Group by date
         timeline = {}
         for event in events:
-            date_str = event['timestamp__date'].strftime('%Y-%m-%d')
+            date_str = event['day'].strftime('%Y-%m-%d')
             if date_str not in timeline:
                 timeline[date_str] = {}
             timeline[date_str][event['event_type']] = event['count']
@@ -175,6 +188,9 @@ class ReportsListView(LoginRequiredMixin, ListView):
     def get_queryset(self):
         return Report.objects.filter(
             Q(created_by=self.request.user) | Q(is_public=True)
+        ).select_related('created_by').only(
+            'name', 'description', 'report_type', 'created_at', 'is_scheduled', 'schedule_frequency',
+            'created_by__username',
         ).order_by('-created_at')
 
 
@@ -250,6 +266,7 @@ class EmailTemplateCreateView(LoginRequiredMixin, TemplateView):
                 template.html_content = html_content
                 template.is_active = is_active
                 template.available_variables = available_variables
+                template.save()
             else:
                 template = EmailTemplate.objects.create(
                     name=name,
@@ -261,8 +278,6 @@ class EmailTemplateCreateView(LoginRequiredMixin, TemplateView):
                     created_by=request.user
                 )
             
-            template.save()
-            
             # Validate template
             validation = EmailTemplateProcessor.validate_template(template)
             
@@ -300,6 +315,7 @@ class EmailSequenceCreateView(LoginRequiredMixin, TemplateView):
                 sequence.description = description
                 sequence.trigger_type = trigger_type
                 sequence.is_active = is_active
+                sequence.save()
                 # Clear existing steps
                 sequence.steps.all().delete()
             else:
@@ -311,19 +327,22 @@ class EmailSequenceCreateView(LoginRequiredMixin, TemplateView):
                     created_by=request.user
                 )
             
-            sequence.save()
-            
-            # Create sequence steps
+            # Create sequence steps, fetching their templates in one query
             from .models import EmailSequenceStep
-            for step_data in steps_data:
-                template = get_object_or_404(EmailTemplate, id=step_data['template_id'])
-                EmailSequenceStep.objects.create(
+            template_ids = {int(step_data['template_id']) for step_data in steps_data}
+            templates_by_id = EmailTemplate.objects.in_bulk(template_ids)
+            if len(templates_by_id) != len(template_ids):
+                raise Http404('No EmailTemplate matches the given query.')
+            EmailSequenceStep.objects.bulk_create([
+                EmailSequenceStep(
                     sequence=sequence,
-                    template=template,
+                    template=templates_by_id[int(step_data['template_id'])],
                     step_number=step_data['step_number'],
                     delay_days=step_data.get('delay_days', 0),
                     delay_hours=step_data.get('delay_hours', 0)
                 )
+                for step_data in steps_data
+            ])
             
             return JsonResponse({
                 'success': True,
@@ -359,10 +378,7 @@ class EmailTemplateAPIView(LoginRequiredMixin, TemplateView):
             })
         else:
             # List all templates
-            templates = EmailTemplate.objects.filter(is_active=True).values(
-                'id', 'name', 'subject', 'created_at'
-            )
-            return JsonResponse({'templates': list(templates)})
+            return JsonResponse({'templates': active_email_templates()})
     
     def delete(self, request, *args, **kwargs):
         template_id = kwargs.get('template_id')
@@ -472,19 +488,15 @@ class EmailStatsView(LoginRequiredMixin, TemplateView):
             end_date = timezone.now()
             start_date = end_date - timedelta(days=days)
             
-            total_sent = EmailDelivery.objects.filter(
-                sent_at__gte=start_date
-            ).count()
-            
-            total_opened = EmailDelivery.objects.filter(
-                sent_at__gte=start_date,
-                opened_at__isnull=False
-            ).count()
-            
-            total_clicked = EmailDelivery.objects.filter(
-                sent_at__gte=start_date,
-                clicked_at__isnull=False
-            ).count()
+            # Sent, opened and clicked counts in a single pass
+            totals = EmailDelivery.objects.filter(sent_at__gte=start_date).aggregate(
+                total_sent=Count('id'),
+                total_opened=Count('id', filter=Q(opened_at__isnull=False)),
+                total_clicked=Count('id', filter=Q(clicked_at__isnull=False)),
+            )
+            total_sent = totals['total_sent']
+            total_opened = totals['total_opened']
+            total_clicked = totals['total_clicked']
             
             stats = {
                 'total_sent': total_sent,
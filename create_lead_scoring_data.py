@@ -185,18 +185,24 @@ def create_lead_scoring_sample_data():
         }
     ]
     
-    created_rules = []
+    existing_rule_names = set(
+        LeadScoringRule.objects.filter(
+            name__in=[rule_data['name'] for rule_data in scoring_rules]
+        ).values_list('name', flat=True)
+    )
+    created_rules = LeadScoringRule.objects.bulk_create(
+        [
+            LeadScoringRule(**rule_data, created_by=admin_user)
+            for rule_data in scoring_rules
+            if rule_data['name'] not in existing_rule_names
+        ],
+        batch_size=500
+    )
     for rule_data in scoring_rules:
-        rule_data['created_by'] = admin_user  # Add created_by field
-        rule, created = LeadScoringRule.objects.get_or_create(
-            name=rule_data['name'],
-            defaults=rule_data
-        )
-        if created:
-            print(f"  ✅ Created rule: {rule.name}")
-            created_rules.append(rule)
+        if rule_data['name'] in existing_rule_names:
+            print(f"  ↻ Rule already exists: {rule_data['name']}")
         else:
-            print(f"  ↻ Rule already exists: {rule.name}")
+            print(f"  ✅ Created rule: {rule_data['name']}")
     
     # Create some sample tags
     print("🏷️ Creating sample tags...")
@@ -215,60 +221,78 @@ def create_lead_scoring_sample_data():
     
     # Add some analytics events and email deliveries for existing customers
     print("📊 Creating sample analytics events...")
-    customers = Customer.objects.all()[:10]  # Work with first 10 customers
+    customers = list(Customer.objects.all()[:10])  # Work with first 10 customers
+    
+    # Deliveries and tasks are only added once per customer, as get_or_create did
+    existing_deliveries = set(
+        EmailDelivery.objects.filter(
+            customer__in=customers, subject='Welcome to our service!'
+        ).values_list('customer_id', flat=True)
+    )
+    existing_tasks = set(
+        Task.objects.filter(customer__in=customers).values_list('customer_id', 'title')
+    )
     
+    events = []
+    deliveries = []
+    tasks = []
+    tag_links = []
     for i, customer in enumerate(customers):
         # Create some analytics events
         events_count = (i % 5) + 1  # 1-5 events per customer
         for j in range(events_count):
             event_date = timezone.now() - timedelta(days=(j * 3))
-            AnalyticsEvent.objects.get_or_create(
+            events.append(AnalyticsEvent(
                 customer=customer,
                 event_type='viewed',
                 timestamp=event_date,
-                defaults={
-                    'metadata': {
-                        'page': f'/customer/{customer.pk}/',
-                        'duration': 45 + (j * 10)
-                    }
+                metadata={
+                    'page': f'/customer/{customer.pk}/',
+                    'duration': 45 + (j * 10)
                 }
-            )
+            ))
         
         # Create email deliveries
-        if i % 2 == 0:  # Half the customers get email deliveries
-            EmailDelivery.objects.get_or_create(
+        if i % 2 == 0 and customer.pk not in existing_deliveries:  # Half the customers get email deliveries
+            deliveries.append(EmailDelivery(
                 customer=customer,
                 subject='Welcome to our service!',
-                defaults={
-                    'status': 'opened' if i % 3 == 0 else 'delivered',
-                    'sent_by': admin_user,
-                    'sent_at': timezone.now() - timedelta(days=5)
-                }
-            )
+                status='opened' if i % 3 == 0 else 'delivered',
+                sent_by=admin_user,
+                sent_at=timezone.now() - timedelta(days=5)
+            ))
         
         # Create some tasks
-        if i % 3 == 0:  # Third of customers get tasks
-            Task.objects.get_or_create(
-                title=f'Follow up with {customer.first_name}',
+        title = f'Follow up with {customer.first_name}'
+        if i % 3 == 0 and (customer.pk, title) not in existing_tasks:  # Third of customers get tasks
+            tasks.append(Task(
+                title=title,
                 customer=customer,
-                defaults={
-                    'description': f'Follow up call for {customer.full_name}',
-                    'status': 'completed' if i % 2 == 0 else 'pending',
-                    'priority': 'medium',
-                    'due_date': timezone.now() + timedelta(days=7),
-                    'assigned_to': admin_user,
-                    'created_by': admin_user,
-                    'completed_at': timezone.now() - timedelta(days=1) if i % 2 == 0 else None
-                }
-            )
+                description=f'Follow up call for {customer.full_name}',
+                status='completed' if i % 2 == 0 else 'pending',
+                priority='medium',
+                due_date=timezone.now() + timedelta(days=7),
+                assigned_to=admin_user,
+                created_by=admin_user,
+                completed_at=timezone.now() - timedelta(days=1) if i % 2 == 0 else None
+            ))
         
         # Add tags to some customers
         if i < 3:  # First 3 customers get VIP tag
-            customer.tags.add(vip_tag)
+            tag_links.append((customer.pk, vip_tag.pk))
         elif i < 6:  # Next 3 get Premium tag
-            customer.tags.add(premium_tag)
+            tag_links.append((customer.pk, premium_tag.pk))
         elif i < 8:  # Next 2 get Enterprise tag
-            customer.tags.add(enterprise_tag)
+            tag_links.append((customer.pk, enterprise_tag.pk))
+    
+    AnalyticsEvent.objects.bulk_create(events, batch_size=500)
+    EmailDelivery.objects.bulk_create(deliveries, batch_size=500)
+    Task.objects.bulk_create(tasks, batch_size=500)
+    CustomerTag = Customer.tags.through
+    CustomerTag.objects.bulk_create(
+        [CustomerTag(customer_id=customer_id, tag_id=tag_id) for customer_id, tag_id in tag_links],
+        ignore_conflicts=True
+    )
     
     print("🧮 Calculating lead scores for all customers...")
     
@@ -303,7 +327,7 @@ def create_lead_scoring_sample_data():
     
     print(f"\n🎯 Lead Scoring Sample Data Creation Complete!")
     print(f"   📏 Created {len(created_rules)} new scoring rules")
-    print(f"   📊 Processed {customers.count()} customers")
+    print(f"   📊 Processed {len(customers)} customers")
     print(f"   🎯 Lead scoring system is ready for testing!")
     
     return calc_log
@@ -62,15 +62,17 @@ customers_data = [
 ]
 
 print("Creating sample customers...")
+existing_emails = set(
+    Customer.objects.filter(email__in=[c['email'] for c in customers_data]).values_list('email', flat=True)
+)
+new_customers = [Customer(**c) for c in customers_data if c['email'] not in existing_emails]
+Customer.objects.bulk_create(new_customers, ignore_conflicts=True, batch_size=500)
 for customer_data in customers_data:
-    customer, created = Customer.objects.get_or_create(
-        email=customer_data['email'],
-        defaults=customer_data
-    )
-    if created:
-        print(f"Created customer: {customer.full_name}")
+    full_name = f"{customer_data['first_name']} {customer_data['last_name']}"
+    if customer_data['email'] in existing_emails:
+        print(f"Customer already exists: {full_name}")
     else:
-        print(f"Customer already exists: {customer.full_name}")
+        print(f"Created customer: {full_name}")
 
 # Create sample custom fields
 custom_fields_data = [
@@ -115,23 +117,28 @@ custom_fields_data = [
 ]
 
 print("\nCreating custom fields...")
+existing_fields = CustomField.objects.in_bulk([f['name'] for f in custom_fields_data], field_name='name')
+CustomField.objects.bulk_create(
+    [CustomField(**f) for f in custom_fields_data if f['name'] not in existing_fields],
+    ignore_conflicts=True,
+    batch_size=500
+)
 for field_data in custom_fields_data:
-    custom_field, created = CustomField.objects.get_or_create(
-        name=field_data['name'],
-        defaults=field_data
-    )
-    if created:
-        print(f"Created custom field: {custom_field.label}")
+    if field_data['name'] in existing_fields:
+        print(f"Custom field already exists: {existing_fields[field_data['name']].label}")
     else:
-        print(f"Custom field already exists: {custom_field.label}")
+        print(f"Created custom field: {field_data['label']}")
 
 # Add sample custom field values
 print("\nAdding sample custom field values...")
-customers = Customer.objects.all()
-company_field = CustomField.objects.get(name='company')
-company_size_field = CustomField.objects.get(name='company_size')
-industry_field = CustomField.objects.get(name='industry')
-preferred_contact_field = CustomField.objects.get(name='preferred_contact')
+customers = list(Customer.objects.all()[:3])
+fields_by_name = CustomField.objects.in_bulk(
+    ['company', 'company_size', 'industry', 'preferred_contact'], field_name='name'
+)
+company_field = fields_by_name['company']
+company_size_field = fields_by_name['company_size']
+industry_field = fields_by_name['industry']
+preferred_contact_field = fields_by_name['preferred_contact']
 
 sample_values = [
     {
@@ -163,16 +170,20 @@ sample_values = [
     }
 ]
 
-for sample in sample_values:
-    customer = sample['customer']
-    for field, value in sample['values'].items():
-        custom_value, created = CustomerCustomFieldValue.objects.get_or_create(
-            customer=customer,
-            custom_field=field,
-            defaults={'value': value}
-        )
-        if created:
-            print(f"Added {field.label} for {customer.full_name}: {value}")
+existing_values = set(
+    CustomerCustomFieldValue.objects.filter(
+        customer__in=[sample['customer'] for sample in sample_values]
+    ).values_list('customer_id', 'custom_field_id')
+)
+new_values = [
+    CustomerCustomFieldValue(customer=sample['customer'], custom_field=field, value=value)
+    for sample in sample_values
+    for field, value in sample['values'].items()
+    if (sample['customer'].pk, field.pk) not in existing_values
+]
+CustomerCustomFieldValue.objects.bulk_create(new_values, ignore_conflicts=True, batch_size=500)
+for custom_value in new_values:
+    print(f"Added {custom_value.custom_field.label} for {custom_value.customer.full_name}: {custom_value.value}")
 
 print("\nSample data creation completed!")
 print("\nYou can now:")
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-16 23:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0005_add_duplicate_merge_model'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='approved_quote_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0006_customer_approved_quote_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['is_active', 'created_at'], name='customers_c_is_acti_3160aa_idx'),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import DatabaseError, models, router, transaction
 from django.core.validators import RegexValidator
 from django.conf import settings
 from django.utils.text import slugify
@@ -40,12 +40,52 @@ class Customer(models.Model):
     )
     tags = models.ManyToManyField('Tag', blank=True, related_name='customers')
     
+    # Denormalized counters (maintained by analytics.signals with F() updates, so
+    # ordinary saves never write them back; see save())
+    approved_quote_count = models.PositiveIntegerField(default=0, editable=False)
+    COUNTER_FIELDS = ('approved_quote_count',)
+    NO_ROWS_UPDATED = 'Save with update_fields did not affect any rows.'
+    
     class Meta:
         ordering = ['last_name', 'first_name']
+        indexes = [
+            models.Index(fields=['is_active', 'created_at']),
+        ]
         
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
     
+    def save(self, *args, **kwargs):
+        """Save the customer without overwriting counters changed since it was loaded"""
+        deferred = self.get_deferred_fields()
+        counters_loaded = any(name not in deferred for name in self.COUNTER_FIELDS)
+        if (
+            self._state.adding or kwargs.get('force_insert') or kwargs.get('update_fields') is not None
+            or not counters_loaded
+        ):
+            # Deferred counters are already left out of Django's own UPDATE
+            super().save(*args, **kwargs)
+            return
+        
+        # Write back only the loaded, non-counter columns
+        update_fields = [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.attname not in deferred
+            and field.name not in self.COUNTER_FIELDS
+        ]
+        try:
+            super().save(*args, update_fields=update_fields, **kwargs)
+        except DatabaseError as e:
+            # update_fields refuses to fall back to an INSERT when the row has
+            # gone; keep the default behaviour of re-creating it. No SQL failed,
+            # so the surrounding transaction is still usable.
+            if str(e) != self.NO_ROWS_UPDATED:
+                raise
+            using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+            if transaction.get_connection(using).in_atomic_block:
+                transaction.set_rollback(False, using=using)
+            super().save(*args, force_insert=True, **kwargs)
+    
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
@@ -97,6 +97,20 @@ class NotesTests(TestCase):
 		self.assertEqual(data['note']['note_type'], 'call')
 		self.assertTrue(data['note']['is_important'])
 
+	def test_notes_list_reports_more_pages(self):
+		from customers.models import CustomerNote
+		for i in range(3):
+			CustomerNote.objects.create(customer=self.customer, note=f'Note {i}', created_by=self.user)
+		self.client.force_login(self.user)
+		resp = self.client.get(f'/customers/{self.customer.id}/notes/', {'offset': 0, 'limit': 2})
+		data = resp.json()
+		self.assertEqual(len(data['notes']), 2)
+		self.assertTrue(data['has_more'])
+		resp = self.client.get(f'/customers/{self.customer.id}/notes/', {'offset': 2, 'limit': 2})
+		data = resp.json()
+		self.assertEqual(len(data['notes']), 1)
+		self.assertFalse(data['has_more'])
+
 
 class DuplicateDetectionTests(TestCase):
 	"""Test suite for duplicate detection functionality"""
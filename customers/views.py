@@ -574,11 +574,12 @@ def customer_notes_list(request, pk):
     offset = int(request.GET.get('offset', 0))
     limit = int(request.GET.get('limit', 10))
     
-    notes = customer.notes.select_related('created_by').all()[offset:offset + limit]
-    has_more = customer.notes.count() > offset + limit
+    # Fetch one extra row to learn whether another page exists without counting
+    notes = list(customer.notes.select_related('created_by').all()[offset:offset + limit + 1])
+    has_more = len(notes) > limit
     
     notes_data = []
-    for note in notes:
+    for note in notes[:limit]:
         notes_data.append({
             'id': note.id,
             'note': note.note,
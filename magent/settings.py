@@ -98,7 +98,8 @@ DATABASES: Dict[str, Dict[str, Any]] = {
 # Configure PostgreSQL for production (Heroku)
 database_url = os.environ.get('DATABASE_URL')
 if database_url:
-    parsed_db = dj_database_url.parse(database_url, conn_max_age=600)
+    # Keep connections open between requests and re-validate them before reuse
+    parsed_db = dj_database_url.parse(database_url, conn_max_age=600, conn_health_checks=True)
     # Ensure type: cast to Dict[str, Any]
     if isinstance(parsed_db, dict):
         DATABASES['default'] = dict(parsed_db)